@@ -0,0 +1,165 @@
+import threading
+
+from wechat_backend import get_wechat_backend
+
+
+class AccountRegistry:
+    """已登录微信账号的缓存（pid、wxid、昵称等），所有需要账号列表或按 pid/wxid 查账号的地方共用。
+
+    读取账号信息要枚举进程并读取进程内存，比较慢；这里只在第一次使用、手动刷新，
+    或后台监视线程发现微信进程启动/退出时才重新读取，其余查询直接走字典。
+    账号变化时调用 add_listener 注册的回调 callback(accounts, added, removed)，
+    回调在刷新所在的线程（通常是监视线程）中执行，界面需自行转回界面线程。
+    """
+
+    WATCH_INTERVAL = 2.0
+    # 进程已启动但账号还没出现（微信未登录完成）时，每隔几轮重新读取一次账号
+    PENDING_RETRY_ROUNDS = 5
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._source = None
+        self._accounts = []
+        self._by_pid = {}
+        self._by_wxid = {}
+        self._processes = None
+        self._rounds = 0
+        self._loaded = False
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+
+    @property
+    def backend(self):
+        return self._backend or get_wechat_backend()
+
+    def add_listener(self, callback):
+        """注册账号变化回调 callback(accounts, added, removed)"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        try:
+            self._listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def _ensure_loaded(self):
+        # 全局微信接口被替换（测试、基准测试注入假微信）后缓存失效
+        if not self._loaded or self._source is not self.backend:
+            self.refresh()
+
+    def refresh(self, force=True):
+        """重新读取已登录账号，返回账号列表；账号有增减时通知回调"""
+        backend = self.backend
+        with self._refresh_lock:
+            accounts = [dict(account) for account in (backend.list_accounts(force_refresh=force) or [])
+                        if account.get('pid')]
+            with self._lock:
+                old_pids = set(self._by_pid)
+                old_accounts = self._by_pid
+                self._accounts = accounts
+                self._by_pid = {account['pid']: account for account in accounts}
+                self._by_wxid = {account['wxid']: account for account in accounts if account.get('wxid')}
+                if self._processes is None or self._source is not backend:
+                    self._processes = set(self._by_pid)
+                self._source = backend
+                first_load = not self._loaded
+                self._loaded = True
+                added = [dict(self._by_pid[pid]) for pid in self._by_pid if pid not in old_pids]
+                removed = [dict(old_accounts[pid]) for pid in old_pids if pid not in self._by_pid]
+                snapshot = [dict(account) for account in accounts]
+
+        if (added or removed) and not first_load:
+            for callback in list(self._listeners):
+                try:
+                    callback(snapshot, added, removed)
+                except Exception as e:
+                    print(f"账号变化回调失败: {e}")
+        return snapshot
+
+    def accounts(self):
+        """全部已登录账号（副本），顺序与上次读取时一致"""
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(account) for account in self._accounts]
+
+    def get(self, pid):
+        self._ensure_loaded()
+        with self._lock:
+            account = self._by_pid.get(pid)
+            return dict(account) if account else None
+
+    def by_wxid(self, wxid):
+        self._ensure_loaded()
+        with self._lock:
+            account = self._by_wxid.get(wxid)
+            return dict(account) if account else None
+
+    def pids(self):
+        self._ensure_loaded()
+        with self._lock:
+            return [account['pid'] for account in self._accounts]
+
+    def has_pid(self, pid):
+        self._ensure_loaded()
+        with self._lock:
+            return pid in self._by_pid
+
+    def default_pid(self, preferred=None):
+        """preferred 仍在线时返回它，否则返回第一个账号的 pid；没有账号时返回 None"""
+        self._ensure_loaded()
+        with self._lock:
+            if preferred and preferred in self._by_pid:
+                return preferred
+            return self._accounts[0]['pid'] if self._accounts else None
+
+    def check_processes(self):
+        """比较当前微信进程与上次记录的进程，有进程启动/退出时重新读取账号；返回是否刷新"""
+        self._ensure_loaded()
+        processes = set(self.backend.find_processes() or [])
+        with self._lock:
+            changed = processes != self._processes
+            pending = bool(processes - set(self._by_pid))
+            self._processes = processes
+            self._rounds += 1
+            retry = pending and self._rounds % self.PENDING_RETRY_ROUNDS == 0
+        if changed or retry:
+            self.refresh()
+            return True
+        return False
+
+    def start_watcher(self, interval=None):
+        """启动后台线程按间隔检查微信进程的启动与退出"""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        interval = interval or self.WATCH_INTERVAL
+        self._watch_stop.clear()
+
+        def watch():
+            while not self._watch_stop.wait(interval):
+                try:
+                    self.check_processes()
+                except Exception as e:
+                    print(f"检查微信进程失败: {e}")
+
+        self._watch_thread = threading.Thread(target=watch, daemon=True)
+        self._watch_thread.start()
+
+    def stop_watcher(self):
+        self._watch_stop.set()
+        self._watch_thread = None
+
+
+_account_registry = None
+_account_registry_lock = threading.Lock()
+
+
+def get_account_registry():
+    """获取全局共享的账号注册表"""
+    global _account_registry
+    with _account_registry_lock:
+        if _account_registry is None:
+            _account_registry = AccountRegistry()
+        return _account_registry
@@ -0,0 +1,162 @@
+"""本地 AI 服务桩：模拟 OpenAI 兼容的 /chat/completions 接口，便于离线调试自动回复。
+
+用法：
+    python ai_stub_server.py [端口]
+然后把 AIReplyWorker(provider={'base_url': 'http://127.0.0.1:端口/v1', 'model': 'stub'}) 指向它。
+请求体带 "stream": true 时按 SSE（text/event-stream）逐段返回，每段 token_size 个字、间隔 token_delay 秒。
+"""
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def echo_reply(messages):
+    """默认回复：复述最后一条用户消息"""
+    for message in reversed(messages or []):
+        if message.get('role') == 'user':
+            return f"收到：{message.get('content', '')}"
+    return "收到"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.stub.connection_count += 1
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            payload = {}
+
+        with stub.lock:
+            stub.request_count += 1
+            stub.requests.append(payload)
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        if stub.delay > 0:
+            time.sleep(stub.delay)
+
+        reply = stub.reply_func(payload.get('messages') or [])
+        if payload.get('stream'):
+            self._send_stream(stub, payload, reply)
+            return
+        self._send_json(200, {
+            'id': f"stub-{stub.request_count}",
+            'object': 'chat.completion',
+            'model': payload.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': reply},
+                'finish_reason': 'stop'
+            }]
+        })
+
+    def _send_stream(self, stub, payload, reply):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        step = max(1, stub.token_size)
+        for i in range(0, len(reply), step):
+            self._write_event({
+                'id': f"stub-{stub.request_count}",
+                'object': 'chat.completion.chunk',
+                'model': payload.get('model', 'stub'),
+                'choices': [{'index': 0, 'delta': {'content': reply[i:i + step]}, 'finish_reason': None}]
+            })
+            if stub.token_delay > 0:
+                time.sleep(stub.token_delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, data):
+        self._write_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, body):
+        self.wfile.write(f"{len(body):X}\r\n".encode('ascii') + body + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubAIServer:
+    """在后台线程运行的本地 AI 服务桩，记录请求数与 TCP 连接数（用于确认连接复用）"""
+
+    def __init__(self, host="127.0.0.1", port=0, reply_func=None, delay=0.0, token_size=2, token_delay=0.05):
+        self.host = host
+        self.port = port
+        self.reply_func = reply_func or echo_reply
+        self.delay = delay
+        self.token_size = token_size
+        self.token_delay = token_delay
+        self.request_count = 0
+        self.connection_count = 0
+        self.requests = []
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def provider(self, model="stub-model"):
+        return {'base_url': self.base_url, 'api_key': 'stub-key', 'model': model}
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="StubAIServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = StubAIServer(port=port).start()
+    print(f"AI服务桩已启动: {server.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
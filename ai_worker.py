@@ -0,0 +1,484 @@
+import os
+import json
+import asyncio
+import threading
+import concurrent.futures
+
+from reply_cache import ReplyCache, make_cache_key
+from reply_pipeline import ReplyChunker
+
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_REQUEST_TIMEOUT = 60
+# AIManager 的回复走 response_ready 信号时，_async_ai_reply 返回后最多再等这么久
+MANAGER_SIGNAL_GRACE = 5
+API_CONFIG_FILE = os.path.join("config", "api.json")
+
+_provider_cache = {'mtime': None, 'config': {}}
+
+
+def load_provider_config(config_file=API_CONFIG_FILE):
+    """读取 config/api.json 中当前服务商的 name / type / base_url / api_key / model，文件未变化时直接返回缓存。
+
+    只用于判断能否走连接池客户端；读不出 base_url 时回复交给 AIManager，由它按自己的配置请求。
+    """
+    try:
+        mtime = os.path.getmtime(config_file)
+    except OSError:
+        return {}
+    if _provider_cache['mtime'] == mtime:
+        return _provider_cache['config']
+
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    providers = data.get('providers') or data.get('services') or {}
+    if isinstance(providers, list):
+        providers = {p.get('name', ''): p for p in providers if isinstance(p, dict)}
+    current = data.get('current_provider') or data.get('current_service') or data.get('provider') or ''
+    provider = providers.get(current) if current in providers else next(iter(providers.values()), {})
+    if not isinstance(provider, dict):
+        provider = {}
+
+    models = provider.get('models') or []
+    model = (data.get('current_model') or provider.get('current_model') or provider.get('model')
+             or (models[0] if models and isinstance(models[0], str) else ''))
+
+    config = {
+        'name': current if isinstance(current, str) else '',
+        'type': provider.get('type') or provider.get('api_type') or provider.get('provider_type') or '',
+        'base_url': provider.get('base_url') or provider.get('api_base') or provider.get('url') or '',
+        'api_key': provider.get('api_key') or provider.get('key') or '',
+        'model': model
+    }
+    _provider_cache['mtime'] = mtime
+    _provider_cache['config'] = config
+    return config
+
+
+def build_system_prompt(settings):
+    """根据自动回复设置（风格/表情/长度）生成系统提示词；AIManager 自带提示词时以它为准（见 AIReplyWorker.system_prompt）"""
+    parts = ["你是微信客服助手，请直接回复对方的消息，不要解释你的身份。"]
+    if settings.get('rules_enabled', True):
+        style = settings.get('model_style', '友好亲切')
+        if style == '自定义回复':
+            custom_style = (settings.get('custom_style') or '').strip()
+            if custom_style:
+                parts.append(f"回复风格：{custom_style}。")
+        elif style:
+            parts.append(f"回复风格：{style}。")
+
+        emoji_level = settings.get('emoji_level') or ('添加适量表情' if settings.get('include_emoji', True) else '不添加表情')
+        parts.append({
+            '不添加表情': "不要使用表情符号。",
+            '添加适量表情': "可以适量使用表情符号。",
+            '丰富表情表达': "多使用表情符号让表达更生动。"
+        }.get(emoji_level, ''))
+
+    token_limit = settings.get('model_token_limit', 0) or 0
+    if token_limit > 0:
+        parts.append(f"回复控制在{token_limit}字以内。")
+    return "".join(parts)
+
+
+class ChatCompletionClient:
+    """OpenAI 兼容的 /chat/completions 客户端，复用同一个连接池（keep-alive）"""
+
+    # 这些服务商的原生接口不是 /chat/completions，交给 AIManager 处理
+    NATIVE_PROVIDERS = ('anthropic', 'claude', 'google', 'gemini', 'googleapis')
+
+    def __init__(self, base_url, api_key, model, max_connections=8, keepalive_timeout=75):
+        self.base_url = (base_url or '').rstrip('/')
+        self.api_key = api_key or ''
+        self.model = model or ''
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    @property
+    def endpoint(self):
+        if self.base_url.endswith('/chat/completions'):
+            return self.base_url
+        return f"{self.base_url}/chat/completions"
+
+    @classmethod
+    def supports(cls, provider):
+        """provider 是否为本客户端能直接请求的 OpenAI 兼容服务商（地址中带 openai 的兼容网关也算）"""
+        if not provider or not provider.get('base_url'):
+            return False
+        base_url = provider.get('base_url').lower()
+        if 'openai' in base_url:
+            return True
+        text = " ".join(str(provider.get(key) or '') for key in ('type', 'name')).lower() + " " + base_url
+        return not any(marker in text for marker in cls.NATIVE_PROVIDERS)
+
+    def matches(self, provider):
+        return (self.base_url == (provider.get('base_url') or '').rstrip('/')
+                and self.api_key == (provider.get('api_key') or '')
+                and self.model == (provider.get('model') or ''))
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _headers(self):
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        return headers
+
+    async def complete(self, messages, temperature=0.7):
+        session = await self._get_session()
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': temperature
+        }
+        async with session.post(self.endpoint, json=payload, headers=self._headers()) as resp:
+            if resp.status != 200:
+                text = await resp.text()
+                raise RuntimeError(f"AI接口返回 {resp.status}: {text[:200]}")
+            data = await resp.json(content_type=None)
+        choices = data.get('choices') or []
+        if not choices:
+            return ''
+        return ((choices[0].get('message') or {}).get('content') or '').strip()
+
+    async def stream(self, messages, temperature=0.7):
+        """以 stream=True 请求接口，逐个产出模型增量文本（SSE 的 data: 行）"""
+        session = await self._get_session()
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': temperature,
+            'stream': True
+        }
+        async with session.post(self.endpoint, json=payload, headers=self._headers()) as resp:
+            if resp.status != 200:
+                text = await resp.text()
+                raise RuntimeError(f"AI接口返回 {resp.status}: {text[:200]}")
+            if 'text/event-stream' not in resp.headers.get('Content-Type', ''):
+                data = await resp.json(content_type=None)
+                choices = data.get('choices') or []
+                if choices:
+                    yield (choices[0].get('message') or {}).get('content') or ''
+                return
+            done = False
+            async for raw_line in resp.content:
+                line = raw_line.decode('utf-8', errors='ignore').strip()
+                if done or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    # 继续读到响应结束，连接才能放回连接池复用
+                    done = True
+                    continue
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                for choice in chunk.get('choices') or []:
+                    delta = (choice.get('delta') or {}).get('content')
+                    if delta:
+                        yield delta
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class AIReplyWorker:
+    """常驻 asyncio 事件循环线程，持有共享的 AIManager 与 HTTP 连接池。
+
+    大模型直答时，OpenAI 兼容的服务商直接用连接池客户端请求；Claude、Google 原生接口等客户端不支持的服务商，
+    以及元宝客服转发，都交给 AIManager._async_ai_reply。
+    submit() 可在任意线程调用，返回 concurrent.futures.Future；
+    并发数由信号量限制，单次请求超过 request_timeout 秒会被取消。
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, request_timeout=DEFAULT_REQUEST_TIMEOUT, provider=None, cache=None,
+                 ai_manager_factory=None):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.request_timeout = request_timeout
+        self.provider = provider
+        self.cache = cache if cache is not None else ReplyCache()
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self.ai_manager_factory = ai_manager_factory
+        self._idle_managers = []
+        self._client = None
+        self._ai_manager = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="AIReplyWorker", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            try:
+                if self._client is not None:
+                    self._loop.run_until_complete(self._client.close())
+                self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            except Exception:
+                pass
+            self._loop.close()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _create_ai_manager(self):
+        try:
+            if self.ai_manager_factory is not None:
+                return self.ai_manager_factory()
+            from aizhuli_combined import AIManager
+            return AIManager()
+        except Exception:
+            return None
+
+    def get_ai_manager(self):
+        """共享的 AIManager 实例（只创建一次），用于读取自动回复设置和提示词；请求使用各自的实例（见 _manager_reply）"""
+        if self._ai_manager is None:
+            self._ai_manager = self._create_ai_manager()
+        return self._ai_manager
+
+    def get_settings(self):
+        ai_manager = self.get_ai_manager()
+        settings = getattr(ai_manager, 'auto_reply_settings', None) if ai_manager else None
+        return settings if isinstance(settings, dict) else {}
+
+    def system_prompt(self, settings):
+        """AIManager 提供 build_system_prompt(settings) 时用它的提示词，否则按同一份设置在本地生成"""
+        builder = getattr(self.get_ai_manager(), 'build_system_prompt', None)
+        if callable(builder):
+            try:
+                prompt = builder(settings)
+                if isinstance(prompt, str) and prompt.strip():
+                    return prompt
+            except Exception as e:
+                print(f"读取AIManager提示词失败: {e}")
+        return build_system_prompt(settings)
+
+    def get_provider(self):
+        return self.provider or load_provider_config()
+
+    def submit(self, sender_wxid, prompt, mode="model", timeout=None):
+        """提交一次 AI 回复请求，mode 为 "model"（大模型直答）或 "yuanbao"（元宝客服转发）。
+
+        大模型模式下先查回复缓存，命中时直接返回已完成的 Future，不占用事件循环和接口额度。
+        """
+        settings = dict(self.get_settings())
+        cache_key = None
+        if mode == "model" and settings.get('reply_cache_enabled', True):
+            cache_key = self._cache_key(prompt, settings)
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                future = concurrent.futures.Future()
+                future.set_result(cached)
+                return future
+
+        self.start()
+        coro = self._handle(sender_wxid, prompt, mode, settings, cache_key, timeout or self.request_timeout)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def submit_stream(self, sender_wxid, prompt, on_chunk, max_chunks=None, timeout=None):
+        """流式请求大模型，每凑满一句/一段就调用 on_chunk(text)，返回结果为完整回复的 Future。
+
+        on_chunk 总在事件循环线程中调用；缓存命中时也交给事件循环，按同样的规则切段后依次回调。
+        """
+        settings = dict(self.get_settings())
+        if max_chunks is None:
+            max_chunks = settings.get('stream_max_chunks', 5)
+        cache_key = None
+        if settings.get('reply_cache_enabled', True):
+            cache_key = self._cache_key(prompt, settings)
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                self.start()
+                return asyncio.run_coroutine_threadsafe(self._replay_cached(cached, on_chunk, max_chunks), self._loop)
+
+        self.start()
+        coro = self._handle_stream(sender_wxid, prompt, settings, on_chunk, max_chunks, cache_key, timeout or self.request_timeout)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _handle_stream(self, sender_wxid, prompt, settings, on_chunk, max_chunks, cache_key, timeout):
+        chunker = ReplyChunker(max_chunks=max_chunks)
+        parts = []
+
+        async def consume():
+            async for delta in self._stream_deltas(sender_wxid, prompt, settings):
+                parts.append(delta)
+                for chunk in chunker.feed(delta):
+                    on_chunk(chunk)
+
+        async with self._semaphore:
+            await asyncio.wait_for(consume(), timeout)
+        for chunk in chunker.finish():
+            on_chunk(chunk)
+
+        reply = ''.join(parts).strip()
+        if cache_key and reply:
+            self.cache.put(cache_key, prompt, reply)
+        return reply
+
+    @staticmethod
+    async def _replay_cached(reply, on_chunk, max_chunks):
+        chunker = ReplyChunker(max_chunks=max_chunks)
+        for chunk in chunker.feed(reply) + chunker.finish():
+            on_chunk(chunk)
+        return reply
+
+    async def _stream_deltas(self, sender_wxid, prompt, settings):
+        provider = self.get_provider()
+        if ChatCompletionClient.supports(provider):
+            client = self._get_client(provider)
+            async for delta in client.stream(self._build_messages(prompt, settings), temperature=self._temperature(settings)):
+                yield delta
+        else:
+            # 客户端不支持的服务商没有增量输出，拿到完整回复后同样按句切段
+            yield await self._manager_reply(sender_wxid, prompt)
+
+    def _cache_key(self, prompt, settings):
+        provider = self.get_provider()
+        model = provider.get('model') or provider.get('name') or ''
+        return make_cache_key(prompt, model, self.system_prompt(settings), settings.get('temperature', 0.7))
+
+    async def _handle(self, sender_wxid, prompt, mode, settings, cache_key, timeout):
+        async with self._semaphore:
+            reply = await asyncio.wait_for(self._request(sender_wxid, prompt, mode, settings), timeout)
+        if cache_key and reply:
+            self.cache.put(cache_key, prompt, reply)
+        return reply
+
+    async def _request(self, sender_wxid, prompt, mode, settings):
+        if mode == "model":
+            provider = self.get_provider()
+            if ChatCompletionClient.supports(provider):
+                client = self._get_client(provider)
+                return await client.complete(self._build_messages(prompt, settings), temperature=self._temperature(settings))
+        return await self._manager_reply(sender_wxid, prompt)
+
+    async def _manager_reply(self, sender_wxid, prompt):
+        """交给 AIManager._async_ai_reply，由它按自己的服务商配置和提示词请求。
+
+        AIManager 可能只通过 response_ready 信号给出回复，所以每个进行中的请求独占一个 AIManager 实例
+        （用完放回空闲列表复用），收到的信号只可能属于本请求，请求之间互不等待。
+        _async_ai_reply 有返回值时直接使用；超时或被取消的实例不再复用，以免迟到的信号串到下一个请求。
+        """
+        ai_manager = self._idle_managers.pop() if self._idle_managers else self._create_ai_manager()
+        if ai_manager is None:
+            raise RuntimeError("未配置 OpenAI 兼容的服务商，且 AIManager 不可用")
+
+        loop = asyncio.get_running_loop()
+        answer = loop.create_future()
+
+        def on_response(response):
+            if isinstance(response, str) and response.strip():
+                loop.call_soon_threadsafe(lambda: answer.done() or answer.set_result(response.strip()))
+
+        signal = getattr(ai_manager, 'response_ready', None)
+        connected = False
+        reusable = False
+        try:
+            signal.connect(on_response)
+            connected = True
+        except Exception:
+            pass
+        try:
+            result = await ai_manager._async_ai_reply(sender_wxid, prompt)
+            if isinstance(result, str) and result.strip():
+                reusable = True
+                return result.strip()
+            if not connected:
+                reusable = True
+                return ''
+            try:
+                reply = await asyncio.wait_for(answer, MANAGER_SIGNAL_GRACE)
+                reusable = True
+                return reply
+            except asyncio.TimeoutError:
+                return ''
+        finally:
+            if connected:
+                try:
+                    signal.disconnect(on_response)
+                except Exception:
+                    pass
+            if reusable:
+                self._idle_managers.append(ai_manager)
+
+    def _build_messages(self, prompt, settings):
+        return [
+            {'role': 'system', 'content': self.system_prompt(settings)},
+            {'role': 'user', 'content': prompt}
+        ]
+
+    @staticmethod
+    def _temperature(settings):
+        try:
+            return float(settings.get('temperature', 0.7))
+        except (TypeError, ValueError):
+            return 0.7
+
+    def _get_client(self, provider):
+        if self._client is None or not self._client.matches(provider):
+            old_client = self._client
+            self._client = ChatCompletionClient(
+                provider.get('base_url'),
+                provider.get('api_key'),
+                provider.get('model'),
+                max_connections=self.max_concurrency * 2
+            )
+            if old_client is not None:
+                asyncio.ensure_future(old_client.close())
+        return self._client
+
+    def shutdown(self, timeout=5):
+        self.cache.flush()
+        with self._lock:
+            if self._loop is None or self._thread is None:
+                return
+            try:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            except RuntimeError:
+                pass
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_ai_reply_worker = None
+_ai_reply_worker_lock = threading.Lock()
+
+
+def get_ai_reply_worker():
+    """获取全局共享的 AI 回复工作线程"""
+    global _ai_reply_worker
+    with _ai_reply_worker_lock:
+        if _ai_reply_worker is None:
+            _ai_reply_worker = AIReplyWorker()
+        return _ai_reply_worker
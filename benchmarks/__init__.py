@@ -0,0 +1,9 @@
+"""消息热路径基准测试。
+
+    python -m benchmarks.run              # 默认规模
+    python -m benchmarks.run --quick      # 小规模冒烟
+    python -m benchmarks.run --compare 旧结果.json 新结果.json
+
+无界面运行（Qt offscreen），微信接口由 fake_wechat 模拟（无真实客户端时），
+语料由固定随机种子生成，结果写入 benchmarks/results/ 并带上提交号，便于跨提交对比。
+"""
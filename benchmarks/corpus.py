@@ -0,0 +1,108 @@
+import random
+import time
+
+
+COMMON_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所"
+    "民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那"
+    "价格优惠活动发货退款订单快递客服会员积分咨询地址包邮尺码颜色库存售后保修安装预约报名课程资料链接二维码"
+)
+SAMPLE_ACCOUNT = {'wxid': 'wxid_bench_self', 'nickname': '基准测试号', 'pid': 4242}
+
+# 覆盖 parse_special_message 处理的主要 XML 消息类型
+XML_TEMPLATES = [
+    '<msg><img aeskey="{token}" cdnthumburl="{token}" length="{size}" md5="{token}" /></msg>',
+    '<msg><voicemsg endflag="1" length="{size}" voicelength="{seconds}000" clientmsgid="{token}" /></msg>',
+    '<msg><videomsg aeskey="{token}" length="{size}" playlength="{seconds}" md5="{token}" /></msg>',
+    '<msg><emoji fromusername="{sender}" type="2" md5="{token}" len="{size}" productid="" /></msg>',
+    '<msg><location x="31.2{seconds}" y="121.4{seconds}" scale="15" label="上海市{text}" poiname="{text}" /></msg>',
+    '<msg><appmsg appid="" sdkver="0"><title>{text}</title><des>{text}</des><type>5</type>'
+    '<url>https://example.com/{token}</url></appmsg></msg>',
+    '<msg><appmsg appid="" sdkver="0"><title>{text}.pdf</title><type>6</type>'
+    '<appattach><totallen>{size}</totallen><fileext>pdf</fileext></appattach></appmsg></msg>',
+    '<msg><appmsg appid="" sdkver="0"><title>微信转账</title><type>2000</type>'
+    '<wcpayinfo><paysubtype>1</paysubtype><feedesc>￥{seconds}.00</feedesc></wcpayinfo></appmsg></msg>',
+    '<msg><appmsg appid="" sdkver="0"><title>恭喜发财，大吉大利</title><type>2001</type>'
+    '<wcpayinfo><sendertitle>{text}</sendertitle></wcpayinfo></appmsg></msg>',
+]
+
+
+def random_text(rng, min_len=2, max_len=6):
+    return ''.join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_contacts(count, seed=1, group_ratio=0.05):
+    """生成 count 个联系人（约 group_ratio 为群），字段与 all_contacts 中的一致"""
+    rng = random.Random(seed)
+    contacts = []
+    for i in range(count):
+        if rng.random() < group_ratio:
+            contacts.append({'wxid': f"{1000000000 + i}@chatroom", 'nickname': random_text(rng, 3, 10) + "群"})
+            continue
+        contacts.append({
+            'wxid': f"wxid_{i:08x}",
+            'nickname': random_text(rng, 2, 6),
+            'remarks': random_text(rng, 2, 4) if rng.random() < 0.4 else '',
+            'tag': '',
+            'phone': f"1{rng.randint(3000000000, 9999999999)}" if rng.random() < 0.2 else ''
+        })
+    return contacts
+
+
+def make_rules(count, seed=2, pattern_ratio=0.0):
+    """生成 count 条不重复关键词的规则，pattern_ratio 比例的规则为正则/通配符"""
+    rng = random.Random(seed)
+    rules = []
+    seen = set()
+    while len(rules) < count:
+        keyword = random_text(rng, 2, 5)
+        if keyword in seen:
+            continue
+        seen.add(keyword)
+        rule = {'keyword': keyword, 'reply': f"自动回复：{random_text(rng, 6, 20)}", 'enabled': True}
+        if rng.random() < pattern_ratio:
+            if rng.random() < 0.5:
+                rule['match_type'] = 'wildcard'
+                rule['keyword'] = f"{keyword[:2]}*{keyword[2:] or random_text(rng, 1, 2)}"
+            else:
+                rule['match_type'] = 'regex'
+                rule['keyword'] = f"{keyword[:2]}\\d{{1,4}}{keyword[2:]}"
+        rules.append(rule)
+    return rules
+
+
+def make_messages(count, contacts, rules=(), seed=3, account=SAMPLE_ACCOUNT, hit_ratio=0.3):
+    """生成 count 条监听回调格式的消息：好友文本、群文本（部分 @ 自己）、XML 特殊消息混合。
+
+    hit_ratio 比例的文本消息包含某条规则的关键词。
+    """
+    rng = random.Random(seed)
+    friends = [c for c in contacts if '@chatroom' not in c['wxid']] or [{'wxid': 'wxid_unknown'}]
+    groups = [c for c in contacts if '@chatroom' in c['wxid']] or [{'wxid': '1000000000@chatroom'}]
+    keywords = [r['keyword'] for r in rules if not r.get('match_type')]
+    now = int(time.time())
+    messages = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.15:
+            content = rng.choice(XML_TEMPLATES).format(
+                token=f"{rng.getrandbits(64):016x}", size=rng.randint(1000, 900000),
+                seconds=rng.randint(1, 59), text=random_text(rng, 2, 12),
+                sender=rng.choice(friends)['wxid'])
+        else:
+            content = random_text(rng, 4, 40)
+            if keywords and rng.random() < hit_ratio:
+                keyword = rng.choice(keywords)
+                cut = rng.randint(0, len(content))
+                content = content[:cut] + keyword + content[cut:]
+        message = {'timestamp': now + i, 'content': content, 'account': dict(account)}
+        if roll > 0.75:
+            group = rng.choice(groups)
+            message['wxid'] = group['wxid']
+            message['member_id'] = rng.choice(friends)['wxid']
+            if rng.random() < 0.3:
+                message['content'] = f"@{account['nickname']} {message['content']}"
+        else:
+            message['wxid'] = rng.choice(friends)['wxid']
+        messages.append(message)
+    return messages
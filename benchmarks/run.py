@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from contextlib import redirect_stdout
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import make_contacts, make_rules, make_messages, SAMPLE_ACCOUNT
+from fake_wechat import FakeWeChatBackend
+from wechat_backend import RealWeChatBackend, get_wechat_backend, set_wechat_backend
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+PRESETS = {
+    'quick': {'rules': [1000], 'contacts': [10000], 'messages': 300, 'persist': 100, 'full_path': 100,
+              'template': 10000},
+    'default': {'rules': [1000, 10000, 100000], 'contacts': [10000, 100000], 'messages': 2000,
+                'persist': 500, 'full_path': 300, 'template': 100000},
+    'full': {'rules': [1000, 10000, 100000], 'contacts': [10000, 100000, 1000000], 'messages': 5000,
+             'persist': 2000, 'full_path': 1000, 'template': 100000},
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(case, params, func, items, warmup=20):
+    """逐条调用 func(item) 计时，返回吞吐量（条/秒）与 p50/p99 延迟（微秒）"""
+    for item in items[:warmup]:
+        func(item)
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for item in items:
+        t0 = clock()
+        func(item)
+        latencies.append(clock() - t0)
+    total = (clock() - start) / 1e9
+    latencies.sort()
+    return {
+        'case': case,
+        'params': params,
+        'n': len(items),
+        'total_s': round(total, 6),
+        'msgs_per_sec': round(len(items) / total, 1) if total > 0 else None,
+        'p50_us': round(percentile(latencies, 50) / 1000.0, 2),
+        'p99_us': round(percentile(latencies, 99) / 1000.0, 2),
+    }
+
+
+def skipped(case, params, reason):
+    return {'case': case, 'params': params, 'skipped': reason}
+
+
+def bench_rule_match(preset):
+    from rule_engine import ScopedRuleMatcher
+    results = []
+    for count in preset['rules']:
+        for pattern_ratio in (0.0, 0.01):
+            rules = make_rules(count, pattern_ratio=pattern_ratio)
+            matcher = ScopedRuleMatcher(rules)
+            texts = [m['content'] for m in make_messages(preset['messages'], make_contacts(200), rules)]
+            account = 'wxid_bench_self'
+            results.append(measure(
+                'rule_match', {'rules': count, 'pattern_ratio': pattern_ratio},
+                lambda text: matcher.match(text, exact=True, fuzzy=True, account=account, chat='wxid_00000001',
+                                           budget_ms=50),
+                texts))
+    return results
+
+
+def bench_template_render(preset):
+    from message_template import compile_template, contact_context
+    template = compile_template("{你好|您好|哈喽} {备注}，{今天|今日}是{日期} {星期}，{祝您{开心|顺利}|周末愉快}！")
+    contacts = make_contacts(preset['template'])
+    return [measure('template_render', {'contacts': len(contacts)},
+                    lambda contact: template.render(contact_context(contact)), contacts)]
+
+
+def bench_contact_resolution(preset, main):
+    results = []
+    for count in preset['contacts']:
+        contacts = make_contacts(count)
+        holder = type('ContactHolder', (), {})()
+        holder.all_contacts = contacts
+        # 均匀覆盖列表前中后段，另有 10% 查不到的 wxid
+        step = max(1, count // preset['messages'])
+        wxids = [contacts[i]['wxid'] for i in range(0, count, step)][:preset['messages']]
+        wxids += [f"wxid_missing_{i}" for i in range(len(wxids) // 10)]
+        results.append(measure('contact_resolution', {'contacts': count},
+                               lambda wxid: main.WeChatManagerApp._find_contact(holder, wxid), wxids, warmup=5))
+    return results
+
+
+def select_backend():
+    """真实的 wechat 模块可导入时使用真实接口并返回 'wechat'；否则换成假微信并返回 'fake'。
+
+    假微信的 parse_special_message 为简化实现，两种结果不可直接对比，结果文件会记录所用后端。
+    """
+    backend = RealWeChatBackend()
+    try:
+        backend.wechat
+    except Exception:
+        backend = FakeWeChatBackend(accounts=[SAMPLE_ACCOUNT], contacts=[])
+    set_wechat_backend(backend)
+    return backend.name
+
+
+def bench_parse_special_message(preset):
+    parse_special_message = get_wechat_backend().parse_special_message
+    messages = make_messages(preset['messages'], make_contacts(200))
+    return [measure('parse_special_message', {'messages': len(messages)},
+                    lambda m: parse_special_message(m['content']), messages)]
+
+
+def bench_persistence(preset, main, workdir):
+    os.chdir(workdir)
+    shutil.rmtree('config', ignore_errors=True)
+    manager = main.DataManager()
+    messages = make_messages(preset['persist'], make_contacts(200))
+    return [measure('save_message', {'messages': len(messages)}, manager.save_message, messages, warmup=0)]
+
+
+def bench_full_path(preset, main, workdir):
+    """在真实的 WeChatManagerApp 上执行 on_message_received（不启动事件循环，定时发送不会触发）"""
+    from PySide6.QtWidgets import QApplication
+    from config_store import get_rules_store
+
+    os.chdir(workdir)
+    shutil.rmtree('config', ignore_errors=True)
+    app = QApplication.instance() or QApplication([])
+    contacts = make_contacts(min(preset['contacts']))
+    rules = make_rules(min(preset['rules']))
+    previous = set_wechat_backend(FakeWeChatBackend(accounts=[SAMPLE_ACCOUNT], contacts=contacts))
+
+    window = main.WeChatManagerApp()
+    window._ensure_tab(window.auto_reply_tab)
+    window.all_contacts = contacts
+    store = get_rules_store()
+    store.set_rules(rules)
+    store.flush()
+    window.rules_model.set_rules(rules)
+    for switch in ('rule_reply_switch', 'reply_friend_switch', 'reply_group_switch', 'fuzzy_match_switch'):
+        getattr(window, switch).setChecked(True)
+    window.ai_reply_switch.setChecked(False)
+
+    messages = make_messages(preset['full_path'], contacts, rules)
+    params = {'contacts': len(contacts), 'rules': len(rules), 'messages': len(messages)}
+    result = measure('on_message_received', params, window.on_message_received, messages, warmup=0)
+    app.processEvents()
+    window.data_save_timer.stop()
+    window.rules_watch_timer.stop()
+    set_wechat_backend(previous)
+    return [result]
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except Exception:
+        return 'unknown'
+
+
+def run(preset_name, cases=None, output=None):
+    preset = PRESETS[preset_name]
+    backend_name = select_backend()
+    workdir = tempfile.mkdtemp(prefix='wechat-bench-')
+    cwd = os.getcwd()
+    results = []
+    try:
+        import main
+        main_error = None
+    except Exception as e:
+        main, main_error = None, f"无法导入 main: {e}"
+
+    def want(name):
+        return not cases or name in cases
+
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, redirect_stdout(devnull):
+            if want('rule_match'):
+                results.extend(bench_rule_match(preset))
+            if want('template_render'):
+                results.extend(bench_template_render(preset))
+            if want('parse_special_message'):
+                results.extend(bench_parse_special_message(preset))
+            for name, func in (('contact_resolution', bench_contact_resolution),
+                               ('save_message', bench_persistence),
+                               ('on_message_received', bench_full_path)):
+                if not want(name):
+                    continue
+                if main is None:
+                    results.append(skipped(name, {}, main_error))
+                    continue
+                try:
+                    args = (preset, main) if name == 'contact_resolution' else (preset, main, workdir)
+                    results.extend(func(*args))
+                except Exception as e:
+                    results.append(skipped(name, {}, f"{type(e).__name__}: {e}"))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'preset': preset_name,
+        'backend': backend_name,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    print(f"\n结果已写入 {output}")
+    return report
+
+
+def _case_label(result):
+    params = ', '.join(f"{k}={v}" for k, v in result['params'].items())
+    return f"{result['case']}[{params}]" if params else result['case']
+
+
+def print_report(report):
+    print(f"提交 {report['commit']}  预设 {report['preset']}  后端 {report['backend']}  Python {report['python']}")
+    print(f"{'用例':<64}{'条/秒':>12}{'p50(us)':>12}{'p99(us)':>12}")
+    for result in report['results']:
+        if 'skipped' in result:
+            print(f"{_case_label(result):<64}  跳过: {result['skipped']}")
+            continue
+        print(f"{_case_label(result):<64}{result['msgs_per_sec']:>12}{result['p50_us']:>12}{result['p99_us']:>12}")
+
+
+def compare(old_path, new_path):
+    """按用例与参数对齐两份结果，输出吞吐量与 p99 的变化倍数"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    if old.get('backend') != new.get('backend') or old.get('preset') != new.get('preset'):
+        print(f"注意：两份结果的后端/预设不同（{old.get('backend')}/{old.get('preset')} vs "
+              f"{new.get('backend')}/{new.get('preset')}），数字不可直接对比")
+    key = lambda r: (r['case'], json.dumps(r['params'], sort_keys=True))
+    old_results = {key(r): r for r in old['results'] if 'skipped' not in r}
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'用例':<64}{'吞吐量':>10}{'p99':>10}")
+    for result in new['results']:
+        base = old_results.get(key(result))
+        if 'skipped' in result or base is None:
+            continue
+        speedup = result['msgs_per_sec'] / base['msgs_per_sec'] if base['msgs_per_sec'] else 0
+        p99 = base['p99_us'] / result['p99_us'] if result['p99_us'] else 0
+        print(f"{_case_label(result):<64}{speedup:>9.2f}x{p99:>9.2f}x")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="消息热路径基准测试")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='default')
+    parser.add_argument('--quick', action='store_const', dest='preset', const='quick', help="等同于 --preset quick")
+    parser.add_argument('--case', action='append', dest='cases',
+                        help="只运行指定用例，可重复：rule_match / template_render / contact_resolution / "
+                             "parse_special_message / "
+                             "save_message / on_message_received")
+    parser.add_argument('--output', help="结果文件路径，默认写入 benchmarks/results/")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="对比两份结果文件")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    run(args.preset, args.cases, args.output)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from rule_engine import ScopedRuleMatcher, SCOPE_FIELDS, PATTERN_TYPES, diff_rules, rule_key
+
+
+RULES_FILE = os.path.join("config", "auto_reply_rules.json")
+
+DEFAULT_RULE_SETTINGS = {
+    'rule_reply_enabled': False,
+    'reply_friend_enabled': True,
+    'reply_group_enabled': True,
+    'specific_friend_enabled': False,
+    'specific_group_enabled': False,
+    'ai_reply_enabled': False,
+    'new_friend_reply_enabled': False,
+    'fuzzy_match_enabled': True,
+    'exact_match_enabled': False,
+    'min_interval': '1',
+    'max_interval': '5',
+    'coalesce_window': '3',
+    'match_mode': 'all',
+    'match_budget_ms': '50',
+    # 元宝客服的微信号：问题转发给它，它发来的消息作为回答回发给提问者
+    'yuanbao_wxid': 'wxid_wi_1d142z0zdj03'
+}
+
+
+def _normalize_rule(rule):
+    normalized = {
+        'keyword': str(rule.get('keyword', '') or ''),
+        'reply': str(rule.get('reply', '') or ''),
+        'enabled': bool(rule.get('enabled', True))
+    }
+    for field in SCOPE_FIELDS:
+        values = [str(v) for v in (rule.get(field) or ()) if v]
+        if values:
+            normalized[field] = values
+    if rule.get('match_type') in PATTERN_TYPES:
+        normalized['match_type'] = rule['match_type']
+    try:
+        priority = int(rule.get('priority') or 0)
+    except (TypeError, ValueError):
+        priority = 0
+    if priority:
+        normalized['priority'] = priority
+    return normalized
+
+
+class RulesConfigStore:
+    """auto_reply_rules.json 的内存配置服务。
+
+    规则按“关键词 + 适用范围”存放在 OrderedDict 中（重复的后者覆盖并移到末尾，与旧的去重规则一致），
+    设置项与其它顶层字段（ai_rules 等）原样保留。修改只标记脏字段并延迟 save_delay 秒
+    原子写盘；读取前检查文件 mtime，外部改动会被重新加载，尚未写盘的脏字段以内存为准。
+    规则变化按新增/删除/修改增量同步到 matcher，外部改动还会把差异通知给 add_listener 注册的回调。
+    """
+
+    def __init__(self, path=RULES_FILE, save_delay=1.0):
+        self.path = path
+        self.save_delay = save_delay
+        self.rules = OrderedDict()
+        self.settings = dict(DEFAULT_RULE_SETTINGS)
+        self.extra = {}
+        self.load_error = None
+        self._dirty = set()
+        self._mtime = None
+        self._loaded = False
+        self._save_timer = None
+        self._lock = threading.RLock()
+        self.matcher = ScopedRuleMatcher()
+        self._listeners = []
+        self.reload_stats = {'count': 0, 'last_ms': 0.0, 'max_ms': 0.0}
+
+    def add_listener(self, callback):
+        """注册规则文件被外部修改后的回调 callback(added, removed, modified)"""
+        self._listeners.append(callback)
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def load(self, force=False):
+        """从磁盘读取配置；文件未变化时直接返回 False。文件缺失、为空或格式错误时写入默认配置"""
+        start = time.perf_counter()
+        with self._lock:
+            first_load = not self._loaded
+            old_rules = self.rules
+            mtime = self._file_mtime()
+            if self._loaded and not force and mtime == self._mtime:
+                return False
+
+            self.load_error = None
+            data = None
+            if mtime is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        content = f.read().strip()
+                    data = json.loads(content) if content else None
+                except json.JSONDecodeError as e:
+                    self.load_error = e
+                except OSError:
+                    data = None
+
+            if not isinstance(data, dict) and self._loaded and not force:
+                # 外部编辑器可能正在写入，保留当前内存配置，等下一次文件变化再读取
+                self._mtime = mtime
+                return False
+
+            self._loaded = True
+            if not isinstance(data, dict):
+                if 'rules' not in self._dirty:
+                    self.rules = OrderedDict()
+                    self.matcher.rebuild(())
+                if 'settings' not in self._dirty:
+                    self.settings = dict(DEFAULT_RULE_SETTINGS)
+                self._dirty.update(('rules', 'settings'))
+                self.flush()
+                return True
+
+            diff = None
+            if 'chat_sets' not in self._dirty:
+                self.matcher.set_chat_sets(data.get('chat_sets') or {})
+            if 'rules' not in self._dirty:
+                self.rules = self._dedupe(data.get('rules') or [])
+                if first_load:
+                    self.matcher.rebuild(self.rules.values())
+                else:
+                    diff = diff_rules(old_rules, self.rules)
+                    self.matcher.apply_diff(*diff)
+            if 'settings' not in self._dirty:
+                settings = data.get('settings')
+                self.settings = dict(settings) if isinstance(settings, dict) else dict(DEFAULT_RULE_SETTINGS)
+            extra = {k: v for k, v in data.items() if k not in ('rules', 'settings', 'last_update')}
+            extra.update({k: v for k, v in self.extra.items() if k in self._dirty})
+            self.extra = extra
+            self._mtime = mtime
+
+        # 先记录耗时再通知回调，回调里读到的就是这次重新加载的统计
+        if not first_load:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.reload_stats['count'] += 1
+            self.reload_stats['last_ms'] = elapsed
+            self.reload_stats['max_ms'] = max(self.reload_stats['max_ms'], elapsed)
+        if diff and any(diff):
+            print(f"规则文件已重新加载：新增{len(diff[0])}条，删除{len(diff[1])}条，修改{len(diff[2])}条，"
+                  f"耗时 {self.reload_stats['last_ms']:.1f}ms（最长 {self.reload_stats['max_ms']:.1f}ms）")
+            for callback in list(self._listeners):
+                try:
+                    callback(*diff)
+                except Exception as e:
+                    print(f"规则热加载回调失败: {e}")
+        return True
+
+    def reload_if_changed(self):
+        return self.load()
+
+    @staticmethod
+    def _dedupe(rules):
+        unique = OrderedDict()
+        for rule in rules:
+            if not isinstance(rule, dict):
+                continue
+            rule = _normalize_rule(rule)
+            key = rule_key(rule)
+            unique.pop(key, None)
+            unique[key] = rule
+        return unique
+
+    def get_rules(self):
+        with self._lock:
+            self.reload_if_changed()
+            return [dict(rule) for rule in self.rules.values()]
+
+    def set_rules(self, rules):
+        """整体替换规则列表，内容没有变化时不标记为脏"""
+        with self._lock:
+            self.reload_if_changed()
+            unique = self._dedupe(rules)
+            if list(unique.items()) == list(self.rules.items()):
+                return False
+            self.matcher.apply_diff(*diff_rules(self.rules, unique))
+            self.rules = unique
+            self._mark_dirty('rules')
+            return True
+
+    def add_rules(self, rules):
+        """批量追加新规则（一次事务）：已存在的关键词跳过，只同步一次匹配器并写盘，返回实际追加的规则"""
+        with self._lock:
+            self.reload_if_changed()
+            added = []
+            for rule in rules:
+                rule = _normalize_rule(rule)
+                key = rule_key(rule)
+                if key in self.rules:
+                    continue
+                self.rules[key] = rule
+                added.append(rule)
+            if added:
+                self.matcher.apply_diff(added=added)
+                self._mark_dirty('rules')
+                self.flush()
+            return added
+
+    def match(self, content, exact=True, fuzzy=True, account='', chat='', mode='all', budget_ms=None):
+        """只匹配适用于该账号（wxid）和聊天（好友/群 wxid）的规则"""
+        return self.matcher.match(content, exact=exact, fuzzy=fuzzy, account=account, chat=chat,
+                                  mode=mode, budget_ms=budget_ms)
+
+    def pattern_issues(self):
+        """有问题的正则/通配符规则，见 ScopedRuleMatcher.pattern_issues"""
+        return self.matcher.pattern_issues()
+
+    @property
+    def budget_overruns(self):
+        """规则匹配超出单条消息时间上限（match_budget_ms）的次数"""
+        return self.matcher.budget_overruns
+
+    def get_settings(self):
+        with self._lock:
+            self.reload_if_changed()
+            return dict(self.settings)
+
+    def update_settings(self, updates):
+        """只合并有变化的设置项"""
+        with self._lock:
+            self.reload_if_changed()
+            changed = {k: v for k, v in (updates or {}).items() if self.settings.get(k, object()) != v}
+            if not changed:
+                return False
+            self.settings.update(changed)
+            self._mark_dirty('settings')
+            return True
+
+    def get_section(self, name, default=None):
+        with self._lock:
+            self.reload_if_changed()
+            return self.extra.get(name, default)
+
+    def set_section(self, name, value):
+        with self._lock:
+            self.reload_if_changed()
+            if self.extra.get(name) == value:
+                return False
+            self.extra[name] = value
+            self._mark_dirty(name)
+            return True
+
+    def get_chat_sets(self):
+        return dict(self.get_section('chat_sets', {}) or {})
+
+    def set_chat_sets(self, chat_sets):
+        """保存聊天分组 {分组名: [聊天wxid, ...]}，并只重建引用了变化分组的规则索引"""
+        with self._lock:
+            chat_sets = {name: list(members) for name, members in (chat_sets or {}).items() if name}
+            changed = self.set_section('chat_sets', chat_sets)
+            if changed:
+                self.matcher.set_chat_sets(chat_sets)
+            return changed
+
+    def is_dirty(self):
+        return bool(self._dirty)
+
+    def _mark_dirty(self, field):
+        self._dirty.add(field)
+        if self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_delay, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def flush(self):
+        """立即把脏数据写盘（临时文件 + 原子替换），没有改动时不写"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return False
+            data = dict(self.extra)
+            data['rules'] = list(self.rules.values())
+            data['settings'] = self.settings
+            data['last_update'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                temp_file = self.path + '.tmp'
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_file, self.path)
+            except Exception as e:
+                print(f"保存规则配置失败: {e}")
+                return False
+            self._dirty.clear()
+            self._mtime = self._file_mtime()
+            return True
+
+
+_rules_store = None
+_rules_store_lock = threading.Lock()
+
+
+def get_rules_store():
+    """获取全局共享的规则配置服务"""
+    global _rules_store
+    with _rules_store_lock:
+        if _rules_store is None:
+            _rules_store = RulesConfigStore()
+        return _rules_store
@@ -0,0 +1,1228 @@
+import os
+import time
+import uuid
+import threading
+import configparser
+from datetime import datetime
+from collections import deque
+
+from wechat_backend import get_wechat_backend
+from account_registry import get_account_registry
+from send_pacing import get_send_pacer
+from config_store import get_rules_store, DEFAULT_RULE_SETTINGS
+from reply_pipeline import MessageCoalescer, YuanbaoRouteTable
+from message_template import compile_template, contact_context
+from recurrence import next_fire_time
+from task_scheduler import TaskScheduler
+from task_store import get_task_store, is_missed
+from mass_send import shard_recipients, run_sharded
+
+
+YUANBAO_WXID = DEFAULT_RULE_SETTINGS['yuanbao_wxid']
+RATE_LIMIT_TEXT = "操作过于频繁，请稍后再试"
+
+
+def _timer_schedule(delay, callback):
+    """默认的延时执行：在定时器线程中 delay 秒后调用 callback"""
+    timer = threading.Timer(max(0.0, delay), callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def _number_setting(settings, key, default, cast=int, minimum=None):
+    try:
+        value = cast(settings.get(key, default))
+    except (TypeError, ValueError):
+        return default
+    return value if minimum is None else max(minimum, value)
+
+
+class DataManager:
+    def __init__(self):
+        self.messages_file = os.path.join("config", "messages.ini")
+        os.makedirs("config", exist_ok=True)
+
+        self.message_config = configparser.ConfigParser()
+        if os.path.exists(self.messages_file):
+            self.message_config.read(self.messages_file, encoding='utf-8')
+
+        self.account_data_cache = {}
+        self._lock = threading.RLock()
+
+    def save_account_data(self, account_info, contacts, friends, groups):
+        wxid = account_info.get('wxid')
+        if not wxid:
+            return False
+
+        self.account_data_cache[wxid] = {
+            'account_info': account_info,
+            'contacts': contacts,
+            'friends': friends,
+            'groups': groups,
+            'last_update': int(time.time())
+        }
+        return True
+
+    def update_account_remark(self, wxid, friend_wxid, new_remark):
+        account_data = self.account_data_cache.get(wxid)
+        if not account_data:
+            return False
+
+        for friend in account_data['friends']:
+            if friend.get('wxid') == friend_wxid:
+                friend['remarks'] = new_remark
+                break
+
+        for contact in account_data['contacts']:
+            if contact.get('wxid') == friend_wxid:
+                contact['remarks'] = new_remark
+                break
+
+        return True
+
+    def load_account_data(self, wxid):
+        return self.account_data_cache.get(wxid)
+
+    def save_message(self, message):
+        try:
+            message_id = str(uuid.uuid4())
+            timestamp = message.get('timestamp', int(time.time()))
+            time_str = datetime.fromtimestamp(timestamp).strftime('%Y%m%d%H%M%S')
+
+            with self._lock:
+                if 'Messages' not in self.message_config:
+                    self.message_config['Messages'] = {}
+
+                self.message_config['Messages'][message_id] = time_str
+                message_section = f"Message_{message_id}"
+
+                self.message_config[message_section] = {
+                    'timestamp': str(timestamp),
+                    'wxid': message.get('wxid', ''),
+                    'content': message.get('content', ''),
+                    'account_wxid': message.get('account', {}).get('wxid', ''),
+                    'account_nickname': message.get('account', {}).get('nickname', ''),
+                    'member_id': message.get('member_id', '')
+                }
+
+                with open(self.messages_file, 'w', encoding='utf-8') as f:
+                    self.message_config.write(f)
+            return True
+
+        except Exception:
+            return False
+
+    def save_reply(self, receiver_wxid, content, reply_type="auto_reply"):
+        """记录一条发出的自动回复（与收到的消息写在同一个 messages.ini 中）"""
+        try:
+            with self._lock:
+                next_id = sum(1 for s in self.message_config.sections() if s.startswith('message_'))
+                self.message_config[f"message_{next_id:06d}"] = {
+                    'content': content,
+                    'sender': 'system',
+                    'receiver': receiver_wxid,
+                    'timestamp': datetime.now().isoformat(),
+                    'type': reply_type,
+                    'direction': 'outgoing'
+                }
+                with open(self.messages_file, 'w', encoding='utf-8') as f:
+                    self.message_config.write(f)
+            return True
+        except Exception:
+            return False
+
+    def load_messages(self, limit=0):
+        if not os.path.exists(self.messages_file):
+            return []
+
+        try:
+            self.message_config = configparser.ConfigParser()
+            self.message_config.read(self.messages_file, encoding='utf-8')
+
+            if 'Messages' not in self.message_config:
+                return []
+
+            message_ids = [(msg_id, time_str) for msg_id, time_str in self.message_config['Messages'].items()]
+            message_ids.sort(key=lambda x: x[1], reverse=True)
+
+            if limit > 0:
+                message_ids = message_ids[:limit]
+
+            messages = []
+            for message_id, _ in message_ids:
+                section_name = f"Message_{message_id}"
+                if section_name in self.message_config:
+                    message = self._parse_message_section(section_name)
+                    if message:
+                        messages.append(message)
+
+            return messages
+        except Exception:
+            return []
+
+    def _parse_message_section(self, section_name):
+        try:
+            section = self.message_config[section_name]
+            message = {
+                'timestamp': int(section['timestamp']),
+                'wxid': section['wxid'],
+                'content': section['content'],
+                'account': {
+                    'wxid': section['account_wxid'],
+                    'nickname': section['account_nickname']
+                }
+            }
+
+            if section.get('member_id'):
+                message['member_id'] = section['member_id']
+
+            return message
+        except (KeyError, ValueError):
+            return None
+
+    def cleanup_old_messages(self, max_days=30):
+        if not os.path.exists(self.messages_file):
+            return 0
+
+        try:
+            cutoff_time = int(time.time()) - (max_days * 24 * 60 * 60)
+
+            if 'Messages' not in self.message_config:
+                return 0
+
+            message_ids = list(self.message_config['Messages'].keys())
+            deleted_count = 0
+
+            for message_id in message_ids:
+                section_name = f"Message_{message_id}"
+                if section_name in self.message_config:
+                    timestamp = int(self.message_config[section_name]['timestamp'])
+                    if timestamp < cutoff_time:
+                        self.message_config.remove_section(section_name)
+                        del self.message_config['Messages'][message_id]
+                        deleted_count += 1
+
+            if deleted_count > 0:
+                with open(self.messages_file, 'w', encoding='utf-8') as f:
+                    self.message_config.write(f)
+
+            return deleted_count
+        except Exception:
+            return 0
+
+    def load_all_accounts(self):
+        return self.account_data_cache.copy()
+
+
+class MessageMonitorManager:
+    """为每个已登录账号启动一个消息监听，收到的消息带上账号信息后交给 on_message。
+
+    on_message 在监听线程中被调用；界面传入 Qt 信号的 emit 把消息转回界面线程。
+    """
+
+    def __init__(self, on_message):
+        self.on_message = on_message
+        self.monitors = {}
+        self.is_running = False
+
+    def start_monitor_for_account(self, account):
+        pid = account['pid']
+
+        if pid in self.monitors:
+            return
+
+        get_send_pacer().bind(pid, account.get('wxid'))
+        try:
+            monitor = get_wechat_backend().create_message_monitor(pid)
+
+            def message_callback(msg_data):
+                msg_data['account'] = {
+                    'nickname': account['nickname'],
+                    'wxid': account['wxid'],
+                    'pid': pid
+                }
+
+                self.on_message(msg_data)
+
+            monitor.set_callback(message_callback)
+
+            monitor.start()
+
+            self.monitors[pid] = monitor
+
+            return True
+        except Exception as e:
+            return False
+
+    def start_monitor_all(self, accounts=None):
+        """accounts 为空时重新读取已登录账号；启动流程中传入刚发现的账号，避免重复枚举进程"""
+        if self.is_running:
+            return
+
+        if accounts is None:
+            accounts = get_account_registry().accounts()
+
+        if not accounts:
+            return
+
+        success_count = 0
+        for account in accounts:
+            if self.start_monitor_for_account(account):
+                success_count += 1
+
+        if success_count > 0:
+            self.is_running = True
+        else:
+            pass
+    def stop_monitor_all(self):
+        if not self.is_running:
+            return
+
+        for pid, monitor in list(self.monitors.items()):
+            try:
+                monitor.stop()
+            except Exception as e:
+                pass
+        self.monitors.clear()
+        self.is_running = False
+
+    def sync_accounts(self, added, removed):
+        """账号注册表通知账号变化时调用：为新登录的账号启动监听，停止已退出进程的监听"""
+        for account in removed:
+            monitor = self.monitors.pop(account['pid'], None)
+            if monitor is not None:
+                try:
+                    monitor.stop()
+                except Exception:
+                    pass
+        for account in added:
+            if self.start_monitor_for_account(account):
+                self.is_running = True
+    def get_contact_name(self, wxid):
+        return wxid
+
+
+def build_message_data(message, find_contact=None):
+    """把监听收到的原始消息整理成自动回复使用的 message_data：
+    解析 XML 特殊消息、按备注/昵称取发送者名称、识别群消息是否@了本账号（并去掉@部分）"""
+    find_contact = find_contact or (lambda wxid: None)
+    timestamp = message.get("timestamp", int(time.time()))
+    time_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+    wxid = message.get("wxid", "")
+    content = message.get("content", "")
+    original_content = content
+    account_info = message.get("account", {})
+    account_name = account_info.get("nickname", "未知账号")
+
+    parsed_content = get_wechat_backend().parse_special_message(content)
+    if parsed_content:
+        content = parsed_content
+
+    is_group_message = "@chatroom" in wxid
+    member_id = message.get("member_id", "")
+
+    contact_info = find_contact(wxid)
+    sender_name = wxid
+    if contact_info:
+        if contact_info.get("remarks") and contact_info.get("remarks").strip():
+            sender_name = contact_info.get("remarks")
+        else:
+            sender_name = contact_info.get("nickname", wxid)
+
+    is_at_me = False
+    if is_group_message:
+        self_nickname = account_info.get('nickname', '')
+        self_wxid = account_info.get('wxid', '')
+        if "<atuserlist>" in content:
+            is_at_me = True
+        elif self_nickname and f"@{self_nickname}" in content:
+            is_at_me = True
+            content = content.replace(f"@{self_nickname}", "").strip()
+        elif self_wxid and f"@{self_wxid}" in content:
+            is_at_me = True
+            content = content.replace(f"@{self_wxid}", "").strip()
+
+    message_data = {
+        'self_nickname': account_name,
+        'sender_nickname': sender_name,
+        'sender_wxid': wxid,
+        'content': content,
+        'original_content': original_content,
+        'receive_time': time_str,
+        'account': account_info,
+        'is_at_me': is_at_me
+    }
+
+    if is_group_message and member_id:
+        member_info = find_contact(member_id)
+        message_data['member_name'] = member_info.get("nickname", member_id) if member_info else member_id
+        message_data['member_id'] = member_id
+
+    return message_data
+
+
+def reply_allowed(message_data, settings):
+    """按好友/群开关与指定好友/群列表判断是否回复这条消息；群消息只回复@了本账号的"""
+    sender_wxid = message_data.get('sender_wxid', '')
+    if '@chatroom' in sender_wxid:
+        allowed = settings.get('reply_group_enabled') or (
+            settings.get('specific_group_enabled') and sender_wxid in (settings.get('specific_group_wxids') or ()))
+        if not allowed:
+            print("群消息未启用，且不在指定群列表，忽略")
+            return False
+        if not message_data.get('is_at_me', False):
+            print("收到群消息，但未被@，忽略")
+            return False
+        return True
+    allowed = settings.get('reply_friend_enabled') or (
+        settings.get('specific_friend_enabled') and sender_wxid in (settings.get('specific_friend_wxids') or ()))
+    if not allowed:
+        print("好友消息未启用，且不在指定好友列表，忽略")
+        return False
+    return True
+
+
+def format_ai_response(response, settings):
+    """AI 回复加上回复前缀并按字数上限截断"""
+    try:
+        prefix = settings.get('reply_prefix', '')
+        if settings.get('rules_enabled', True) and prefix:
+            response = f"{prefix} {response}"
+
+        token_limit = settings.get('model_token_limit', 0)
+        if token_limit > 0 and len(response) > token_limit:
+            response = response[:token_limit-3] + "..."
+
+        return response
+
+    except Exception as e:
+        return response
+
+
+def stored_reply_settings():
+    """auto_reply_rules.json 中保存的回复设置（缺少的项取默认值）"""
+    settings = dict(DEFAULT_RULE_SETTINGS)
+    settings.update(get_rules_store().get_settings())
+    return settings
+
+
+class ReplyEngine:
+    """自动回复引擎：规则匹配、模板渲染、按账号节奏延时发送、AI/元宝回复，不依赖界面。
+
+    - settings：返回当前回复设置的函数，默认读取 auto_reply_rules.json 的 settings（界面传入读取开关控件的函数）
+    - find_contact：wxid -> 联系人字典（找不到返回 None），用于发送者名称与回复模板变量
+    - schedule(delay, callback)：延时执行，默认用定时器线程（界面传入 QTimer.singleShot 的包装）
+    - sender(pid, wxid, content, reply_type)：实际发送一条回复，默认 send_reply
+    - on_ai_reply(wxid, response, pid) / on_ai_chunk(wxid, text, pid, index)：AI 结果在工作线程中回调，
+      默认直接 deliver_ai_reply / deliver_ai_chunk（界面改为发信号回到界面线程再调用）
+    """
+
+    def __init__(self, settings=None, find_contact=None, schedule=None, sender=None, data_manager=None):
+        self._settings = settings
+        self.find_contact = find_contact or (lambda wxid: None)
+        self.schedule = schedule or _timer_schedule
+        self.sender = sender or self.send_reply
+        self.data_manager = data_manager
+        self.on_ai_reply = self.deliver_ai_reply
+        self.on_ai_chunk = self.deliver_ai_chunk
+        self._chunk_queues = {}
+        self._chunk_lock = threading.Lock()
+        self.message_coalescer = MessageCoalescer(self._on_coalesced_message,
+                                                  schedule=lambda delay, callback: self.schedule(delay, callback))
+        self.yuanbao_routes = YuanbaoRouteTable()
+
+    def settings(self):
+        if self._settings is not None:
+            return self._settings()
+        return stored_reply_settings()
+
+    def _reply_interval(self, settings):
+        min_delay = _number_setting(settings, 'min_interval', 1, minimum=0)
+        max_delay = _number_setting(settings, 'max_interval', 5, minimum=min_delay)
+        return min_delay, max_delay
+
+    def handle_message(self, message):
+        """处理一条收到的消息：元宝客服的回答回发给提问者，其它消息整理后交给 process"""
+        try:
+            if message.get("wxid", "") == self.yuanbao_wxid():
+                self.forward_yuanbao_answer(message)
+                return None
+            message_data = build_message_data(message, self.find_contact)
+            self.process(message_data)
+            return message_data
+        except Exception as e:
+            print(f"处理自动回复失败: {e}")
+            return None
+
+    def process(self, message_data):
+        """按规则回复：匹配到的每条规则渲染模板后按节奏延时发送；没有匹配且开启 AI 回复时交给 AI。
+        返回已安排发送的规则回复条数"""
+        try:
+            settings = self.settings()
+            if not settings.get('rule_reply_enabled'):
+                return 0
+            content = message_data.get('content', '')
+            sender_wxid = message_data.get('sender_wxid', '')
+            if not content or not sender_wxid or sender_wxid == self.yuanbao_wxid(settings):
+                return 0
+            if not reply_allowed(message_data, settings):
+                return 0
+            account_info = message_data.get('account', {})
+            current_pid = account_info.get('pid')
+            receiver_wxid = sender_wxid
+            try:
+                matched_rules = get_rules_store().match(
+                    content,
+                    exact=bool(settings.get('exact_match_enabled')),
+                    fuzzy=bool(settings.get('fuzzy_match_enabled')),
+                    account=account_info.get('wxid', ''),
+                    chat=sender_wxid,
+                    mode=settings.get('match_mode') or 'all',
+                    budget_ms=_number_setting(settings, 'match_budget_ms', 50.0, cast=float, minimum=1.0)
+                )
+            except Exception as e:
+                matched_rules = []
+            if not matched_rules:
+                if settings.get('ai_reply_enabled'):
+                    coalesce_key = f"{current_pid}:{sender_wxid}:{message_data.get('member_id', '')}"
+                    self.request_ai_reply(receiver_wxid, content, current_pid, coalesce_key=coalesce_key,
+                                          settings=settings)
+                return 0
+            min_delay, max_delay = self._reply_interval(settings)
+            reply_context = self.template_context(message_data)
+            pacer = get_send_pacer()
+            for i, rule in enumerate(matched_rules):
+                reply = compile_template(rule['reply']).render(dict(reply_context))
+                delay = pacer.next_delay(current_pid, 'reply', min_delay, max_delay)
+                print(f"将在 {delay:.1f} 秒后发送第 {i+1} 条回复")
+                self.schedule(delay, lambda r=reply: self.sender(current_pid, receiver_wxid, r, "auto_reply"))
+            return len(matched_rules)
+        except Exception as e:
+            return 0
+
+    def template_context(self, message_data):
+        """规则回复模板的变量：好友消息取该好友，群消息取发言人，{群名} 为群昵称"""
+        sender_wxid = message_data.get('sender_wxid', '')
+        if '@chatroom' in sender_wxid:
+            member_id = message_data.get('member_id', '')
+            member = self.find_contact(member_id) or {'wxid': member_id,
+                                                      'nickname': message_data.get('member_name', '')}
+            return contact_context(member, group=message_data.get('sender_nickname', ''))
+        contact = self.find_contact(sender_wxid) or {'wxid': sender_wxid,
+                                                     'nickname': message_data.get('sender_nickname', '')}
+        return contact_context(contact)
+
+    def send_reply(self, pid, receiver_wxid, content, reply_type="auto_reply"):
+        """发送一条回复（内容是本地文件路径时发送该文件），结果反馈给该账号的发送节奏并记入消息记录"""
+        if not pid or not receiver_wxid or not receiver_wxid.strip():
+            return False
+        backend = get_wechat_backend()
+        start = time.perf_counter()
+        try:
+            file_path = content.strip()
+            if os.path.isfile(file_path):
+                success = backend.send_image_to_wxid(pid, receiver_wxid, file_path)
+            else:
+                print(f"正在发送回复消息到 {receiver_wxid}: '{content}'")
+                success = backend.send_message_to_wxid(pid, receiver_wxid, content)
+        except Exception as e:
+            print(f"发送自动回复失败: {e}")
+            success = False
+        if success is not None and not success:
+            get_send_pacer().record_failure(pid, 'reply')
+            return False
+        get_send_pacer().record_success(pid, 'reply', (time.perf_counter() - start) * 1000)
+        if self.data_manager is not None:
+            self.data_manager.save_reply(receiver_wxid, content, reply_type)
+        return True
+
+    # AI 回复
+    def request_ai_reply(self, receiver_wxid, content, pid=None, coalesce_key=None, settings=None):
+        """发起 AI 回复；开启合并窗口时先缓冲同一发送者的连续消息，窗口结束后合并为一次请求"""
+        try:
+            settings = settings if settings is not None else self.settings()
+            mode = "yuanbao" if settings.get('yuanbao_reply_enabled') else "model"
+            window = _number_setting(settings, 'coalesce_window', float(DEFAULT_RULE_SETTINGS['coalesce_window']),
+                                     cast=float, minimum=0.0)
+            if coalesce_key and window > 0:
+                self.message_coalescer.window = window
+                self.message_coalescer.max_wait = window * 5
+                self.message_coalescer.add(coalesce_key, content, {
+                    'receiver_wxid': receiver_wxid,
+                    'pid': pid,
+                    'mode': mode
+                })
+                return
+            self._submit_ai_reply(receiver_wxid, content, pid, mode)
+        except Exception as e:
+            print(f"提交AI回复请求失败: {e}")
+
+    def _on_coalesced_message(self, _key, content, context):
+        self._submit_ai_reply(context['receiver_wxid'], content, context['pid'], context['mode'])
+
+    def _submit_ai_reply(self, receiver_wxid, content, pid, mode):
+        """把 AI 回复请求交给常驻工作线程，结果通过 on_ai_reply 回调"""
+        if mode == "yuanbao" and pid:
+            self.forward_to_yuanbao(pid, receiver_wxid, content)
+            return
+
+        from ai_worker import get_ai_reply_worker
+        worker = get_ai_reply_worker()
+        if mode == "model" and worker.get_settings().get('stream_reply_enabled', False):
+            self._submit_stream_reply(worker, receiver_wxid, content, pid)
+            return
+
+        future = worker.submit(receiver_wxid, content, mode=mode)
+
+        def on_done(fut):
+            try:
+                response = fut.result()
+            except Exception as e:
+                print(f"AI回复失败: {e!r}")
+                return
+            if response:
+                self.on_ai_reply(receiver_wxid, response, pid)
+
+        future.add_done_callback(on_done)
+
+    def _submit_stream_reply(self, worker, receiver_wxid, content, pid):
+        """流式回复：每生成完整的一句/一段就通过 on_ai_chunk 回调立即发送"""
+        counter = {'index': 0}
+
+        def on_chunk(text):
+            self.on_ai_chunk(receiver_wxid, text, pid, counter['index'])
+            counter['index'] += 1
+
+        future = worker.submit_stream(receiver_wxid, content, on_chunk)
+
+        def on_done(fut):
+            try:
+                fut.result()
+            except Exception as e:
+                print(f"AI流式回复失败: {e!r}")
+
+        future.add_done_callback(on_done)
+
+    def deliver_ai_reply(self, receiver_wxid, response, pid):
+        """格式化 AI 回复后按该账号的回复节奏延时发送"""
+        try:
+            from ai_worker import get_ai_reply_worker
+            formatted = format_ai_response(response, get_ai_reply_worker().get_settings())
+            min_delay, max_delay = self._reply_interval(self.settings())
+            delay = get_send_pacer().next_delay(pid, 'reply', min_delay, max_delay)
+            self.schedule(delay, lambda: self.sender(pid, receiver_wxid, formatted, "ai_reply"))
+        except Exception as e:
+            pass
+
+    def deliver_ai_chunk(self, receiver_wxid, text, pid, index):
+        """流式回复的片段按到达顺序排队，每段按该账号的回复节奏经 schedule 延时发送，
+        不在 AI 工作线程中发送；回复前缀只加在第一段，不再按字数截断"""
+        try:
+            if index == 0:
+                from ai_worker import get_ai_reply_worker
+                settings = get_ai_reply_worker().get_settings()
+                prefix = settings.get('reply_prefix', '')
+                if settings.get('rules_enabled', True) and prefix:
+                    text = f"{prefix} {text}"
+            key = (pid, receiver_wxid)
+            with self._chunk_lock:
+                queue = self._chunk_queues.get(key)
+                if queue is not None:
+                    # 前面的片段还没发完，发完后接着发这一段
+                    queue.append(text)
+                    return
+                self._chunk_queues[key] = deque([text])
+            self._schedule_next_chunk(key)
+        except Exception as e:
+            print(f"安排发送流式回复失败: {e}")
+
+    def _schedule_next_chunk(self, key):
+        min_delay, max_delay = self._reply_interval(self.settings())
+        delay = get_send_pacer().next_delay(key[0], 'reply', min_delay, max_delay)
+        self.schedule(delay, lambda: self._send_next_chunk(key))
+
+    def _send_next_chunk(self, key):
+        pid, receiver_wxid = key
+        with self._chunk_lock:
+            queue = self._chunk_queues.get(key)
+            text = queue.popleft() if queue else None
+        if text is not None:
+            try:
+                self.sender(pid, receiver_wxid, text, "ai_reply")
+            except Exception as e:
+                print(f"发送流式回复失败: {e}")
+        with self._chunk_lock:
+            if not self._chunk_queues.get(key):
+                self._chunk_queues.pop(key, None)
+                return
+        self._schedule_next_chunk(key)
+
+    # 元宝客服
+    def yuanbao_wxid(self, settings=None):
+        """设置 yuanbao_wxid 指定的客服微信号"""
+        settings = self.settings() if settings is None else settings
+        return settings.get('yuanbao_wxid') or YUANBAO_WXID
+
+    def forward_to_yuanbao(self, pid, receiver_wxid, content):
+        """用收到消息的同一账号把问题转给元宝客服，并记录回答应回发到的好友/群"""
+        try:
+            self.yuanbao_routes.record(pid, receiver_wxid)
+            service_wxid = self.yuanbao_wxid()
+            backend = get_wechat_backend()
+            if not backend.send_message_simple(pid, service_wxid, content):
+                backend.send_message_simple(pid, service_wxid, content)
+        except Exception as e:
+            print(f"转发元宝客服失败: {e}")
+
+    def forward_yuanbao_answer(self, message):
+        """元宝客服的回答按路由表回发给原提问的好友/群，使用收到回答的账号发送"""
+        try:
+            answer = message.get('content', '')
+            current_pid = message.get('account', {}).get('pid')
+            if not answer or not current_pid:
+                return
+
+            route = self.yuanbao_routes.resolve(current_pid)
+            if not route:
+                print("元宝客服回答找不到对应的提问者，已忽略")
+                return
+            target = route['target']
+
+            backend = get_wechat_backend()
+            if not backend.send_message_simple(current_pid, target, answer):
+                backend.send_message_simple(current_pid, target, answer)
+        except Exception as e:
+            print(f"回发元宝客服回答失败: {e}")
+
+    def shutdown(self):
+        self.message_coalescer.cancel_all()
+        with self._chunk_lock:
+            self._chunk_queues.clear()
+
+
+# 群发
+def account_contact_wxids(account, data_manager=None):
+    """该账号的好友与群 wxid 集合，优先使用已缓存的联系人数据"""
+    data = data_manager.load_account_data(account['wxid']) if data_manager else None
+    if not data:
+        resources = get_wechat_backend().get_resources(account['pid']) or {}
+        data = {key: resources.get(key) or [] for key in ('contacts', 'friends', 'groups')}
+        if data_manager and any(data.values()):
+            data_manager.save_account_data(account, data['contacts'], data['friends'], data['groups'])
+    wxids = set()
+    for key in ('contacts', 'friends', 'groups'):
+        wxids.update(c.get('wxid') for c in data.get(key) or () if c.get('wxid'))
+    return wxids
+
+
+def send_messages(pid, contacts, message_text, image_path, min_delay, max_delay, task_store=None, task_id=None,
+                  on_progress=None):
+    """发送消息给多个联系人；传入 task_id 时逐个记录发送进度（联系人需带 _seq），
+    每个结果调用 on_progress(task_id, 'sent' / 'failed')。
+
+    message_text 按模板编译一次，逐个联系人代入昵称/备注/日期等变量。
+    """
+    success_count = 0
+    template = compile_template(message_text) if message_text.strip() else None
+    pacer = get_send_pacer()
+    backend = get_wechat_backend()
+    if task_id is not None and task_store is None:
+        task_store = get_task_store()
+
+    for contact in contacts:
+        wxid = contact.get('wxid')
+        if not wxid:
+            continue
+        seq = contact.get('_seq') if task_id is not None else None
+
+        start = time.perf_counter()
+        try:
+            if seq is not None:
+                task_store.mark_sending(task_id, seq)
+
+            # 发送文本消息（返回 False 视为失败，None 视为成功）
+            if template is not None:
+                result = backend.send_message_simple(pid, wxid, template.render(contact_context(contact)))
+                if result is not None and not result:
+                    raise RuntimeError("文本发送失败")
+
+            # 发送图片或文件
+            if image_path.strip() and os.path.exists(image_path):
+                result = backend.send_image_simple(pid, wxid, image_path)
+                if result is not None and not result:
+                    raise RuntimeError("文件发送失败")
+
+            success_count += 1
+            latency_ms = (time.perf_counter() - start) * 1000
+            pacer.record_success(pid, 'mass', latency_ms)
+            if seq is not None:
+                task_store.record_result(task_id, seq, 'sent', latency_ms=latency_ms)
+                if on_progress:
+                    on_progress(task_id, 'sent')
+
+        except Exception as e:
+            pacer.record_failure(pid, 'mass')
+            if seq is not None:
+                try:
+                    task_store.record_result(task_id, seq, 'failed', str(e),
+                                             latency_ms=(time.perf_counter() - start) * 1000)
+                except Exception:
+                    pass
+                if on_progress:
+                    on_progress(task_id, 'failed')
+
+        # 按该账号学到的节奏等待（成功后逐步提速，失败后放慢）
+        delay = pacer.next_delay(pid, 'mass', min_delay, max_delay)
+        if delay > 0:
+            if task_id is not None:
+                # 等待期间崩溃也不能让已送达的联系人停在 sending
+                task_store.flush_results()
+            time.sleep(delay)
+
+    if task_id is not None:
+        task_store.flush_results()
+    return success_count
+
+
+def send_messages_sharded(account_wxids, contacts, message_text, image_path, min_delay, max_delay,
+                          task_store=None, task_id=None, on_progress=None, data_manager=None):
+    """多账号分摊发送：按账号的好友/群列表分配对象，每个账号一个线程、各自按间隔发送"""
+    registry = get_account_registry()
+    accounts = [account for account in map(registry.by_wxid, account_wxids) if account]
+    for account in accounts:
+        get_send_pacer().bind(account['pid'], account['wxid'])
+    if not accounts:
+        raise RuntimeError("分摊发送的账号均未登录")
+    if task_id is not None and task_store is None:
+        task_store = get_task_store()
+
+    account_contacts = {account['pid']: account_contact_wxids(account, data_manager) for account in accounts}
+    shards, unreachable = shard_recipients(contacts, account_contacts)
+    for contact in unreachable:
+        if task_id is not None and contact.get('_seq') is not None:
+            task_store.mark_failed(task_id, contact['_seq'], '所选账号的好友/群列表中均没有该对象')
+            if on_progress:
+                on_progress(task_id, 'failed')
+    print(f"分摊群发: {len(accounts)} 个账号, 分配 " +
+          ", ".join(f"{pid}={len(items)}" for pid, items in shards.items()) +
+          f", 无账号可发 {len(unreachable)}")
+
+    return run_sharded(shards, lambda pid, shard: send_messages(
+        pid, shard, message_text, image_path, min_delay, max_delay, task_store=task_store, task_id=task_id,
+        on_progress=on_progress))
+
+
+def advance_recurring(task_store, task, now=None):
+    """重复任务本轮结束（或错过被跳过）后排到 now 之后的下一次：错过的多次合并为一次，
+    全部联系人恢复为待发送。没有下一次时返回 False"""
+    now = int(time.time()) if now is None else now
+    next_time = next_fire_time(task.get('repeat'), after=max(now, task['schedule_time']),
+                               anchor=task['schedule_time'])
+    if next_time is None:
+        return False
+    task['schedule_time'] = next_time
+    task['status'] = '等待中'
+    task['progress'] = {'pending': task_store.reset_contacts(task['id'])}
+    task_store.update_task(task)
+    return True
+
+
+def task_result_status(progress):
+    """按任务的发送记录得出执行结果：没有一个成功为“失败”，有失败对象为“部分失败”，否则为“已完成”"""
+    if progress.get('failed', 0):
+        return '失败' if not progress.get('sent', 0) else '部分失败'
+    return '已完成'
+
+
+class TaskRunner:
+    """定时群发的调度与执行：启动时从 scheduled_tasks.db 读取任务（恢复被中断的任务、按补发策略处理错过的任务），
+    用 TaskScheduler 按触发时间排队，一个后台线程睡到最早的触发时间再执行，重复任务执行完排到下一次。
+    每 RELOAD_SECONDS 秒重新读取一次任务库，其它进程新增/修改的任务随之生效；到点的任务先在任务库中
+    由“等待中”改为“执行中”（TaskStore.claim），界面和无界面进程共用任务库时同一任务只执行一次。
+
+    无界面运行时直接使用；界面（main.TaskTab）通过 add_task / update_task / delete_tasks / retry_failed 修改任务，
+    并通过回调渲染：on_task_changed(task) 任务状态或时间变化，on_progress(task_id, state) 每发完一个对象，
+    on_reload() 重新读取后任务有增删。回调都在后台线程中调用。
+    """
+
+    MAX_SLEEP_SECONDS = 60
+    RELOAD_SECONDS = 60
+
+    def __init__(self, task_store=None, data_manager=None, on_task_changed=None, on_progress=None,
+                 on_reload=None, default_pid=None):
+        self.task_store = task_store or get_task_store()
+        self.data_manager = data_manager
+        self.on_task_changed = on_task_changed
+        self.on_progress = on_progress
+        self.on_reload = on_reload
+        self.default_pid = default_pid
+        self.scheduler = TaskScheduler()
+        self.tasks = {}
+        self._last_task_id = 0
+        self._resume_task_ids = set()
+        self._running_ids = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_reload = 0.0
+
+    def start(self):
+        try:
+            settings = self.task_store.get_settings()
+            interrupted = set(self.task_store.recover())
+            for task in self.task_store.load_tasks():
+                if task['id'] not in interrupted:
+                    continue
+                if settings.get('catch_up_policy') == 'skip':
+                    if task.get('repeat') and advance_recurring(self.task_store, task):
+                        continue
+                    self.task_store.set_status(task['id'], '已中断')
+                else:
+                    self.task_store.set_status(task['id'], '等待中')
+                    self._resume_task_ids.add(task['id'])
+            if interrupted:
+                print(f"已恢复 {len(interrupted)} 个被中断的定时任务")
+            self.reload()
+        except Exception as e:
+            print(f"读取定时任务失败: {e}")
+        self._thread = threading.Thread(target=self._run, name="task-runner", daemon=True)
+        self._thread.start()
+
+    def reload(self):
+        """重新读取任务库，把等待中的任务放入调度队列（正在执行的任务不受影响）。
+        已有的任务原地更新，调用方持有的任务字典随之变化"""
+        self._last_reload = time.monotonic()
+        changed = []
+        with self._lock:
+            tasks = self.task_store.load_tasks()
+            removed = set(self.tasks) - {task['id'] for task in tasks}
+            added = False
+            merged = {}
+            for task in tasks:
+                current = self.tasks.get(task['id'])
+                if current is None:
+                    merged[task['id']] = task
+                    added = True
+                    continue
+                merged[task['id']] = current
+                if task['id'] not in self._running_ids and any(current.get(k) != v for k, v in task.items()):
+                    current.update(task)
+                    changed.append(current)
+            self.tasks = merged
+            if merged:
+                self._last_task_id = max(self._last_task_id, max(merged))
+            for task in merged.values():
+                if task['id'] in self._running_ids:
+                    continue
+                if task['status'] == '等待中':
+                    if self.scheduler.fire_time(task['id']) != task['schedule_time']:
+                        self.scheduler.schedule(task['id'], task['schedule_time'])
+                else:
+                    self.scheduler.cancel(task['id'])
+            for task_id in removed:
+                self.scheduler.cancel(task_id)
+        self._wake.set()
+        if added or removed:
+            if self.on_reload:
+                self.on_reload()
+        else:
+            for task in changed:
+                self._notify(task)
+        return len(tasks)
+
+    def get_tasks(self):
+        """按创建顺序返回全部任务"""
+        with self._lock:
+            return list(self.tasks.values())
+
+    def new_task_id(self):
+        with self._lock:
+            self._last_task_id = max(int(time.time()), self._last_task_id + 1)
+            return self._last_task_id
+
+    def add_task(self, task):
+        """保存新任务，等待中的任务按发送时间排队"""
+        with self._lock:
+            self.task_store.add_task(task)
+            self.tasks[task['id']] = task
+            self._last_task_id = max(self._last_task_id, task['id'])
+            if task['status'] == '等待中':
+                self.scheduler.schedule(task['id'], task['schedule_time'])
+        self._wake.set()
+
+    def update_task(self, task):
+        """保存修改后的任务：等待中的任务按新的发送时间重新排队，其它状态取消排队"""
+        with self._lock:
+            self.task_store.update_task(task)
+            self.tasks[task['id']] = task
+            if task['id'] not in self._running_ids:
+                if task['status'] == '等待中':
+                    self.scheduler.schedule(task['id'], task['schedule_time'])
+                else:
+                    self.scheduler.cancel(task['id'])
+        self._wake.set()
+
+    def delete_tasks(self, task_ids):
+        with self._lock:
+            for task_id in task_ids:
+                self.tasks.pop(task_id, None)
+                self.scheduler.cancel(task_id)
+                self._resume_task_ids.discard(task_id)
+            self.task_store.delete_tasks(task_ids)
+
+    def retry_failed(self, task):
+        """把任务中发送失败的对象重新排队并立即执行，返回重新排队的数量（执行中的任务不处理）"""
+        with self._lock:
+            if task['id'] in self._running_ids:
+                return 0
+            count = self.task_store.requeue_failed(task['id'])
+            if not count:
+                return 0
+            task['progress'] = self.task_store.progress(task['id'])
+            task['status'] = '等待中'
+            self.task_store.set_status(task['id'], task['status'])
+            self._resume_task_ids.add(task['id'])
+            self.scheduler.schedule(task['id'], int(time.time()))
+        self._wake.set()
+        return count
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _notify(self, task):
+        if self.on_task_changed:
+            try:
+                self.on_task_changed(task)
+            except Exception as e:
+                print(f"通知任务状态失败: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            next_time = self.scheduler.next_fire_time()
+            timeout = self.MAX_SLEEP_SECONDS if next_time is None else max(0.0, next_time - time.time())
+            self._wake.wait(min(timeout, self.MAX_SLEEP_SECONDS))
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                if time.monotonic() - self._last_reload >= self.RELOAD_SECONDS:
+                    self.reload()
+                self.check_due()
+            except Exception as e:
+                print(f"检查定时任务失败: {e}")
+
+    def check_due(self):
+        settings = self.task_store.get_settings()
+        for task_id in self.scheduler.pop_due(int(time.time())):
+            with self._lock:
+                task = self.tasks.get(task_id)
+            if task is None or task['status'] != '等待中':
+                continue
+            now = int(time.time())
+            missed = task_id not in self._resume_task_ids and is_missed(
+                task['schedule_time'], now, settings.get('catch_up_policy'), settings.get('catch_up_minutes'))
+            self._resume_task_ids.discard(task_id)
+            if missed and task.get('repeat') and advance_recurring(self.task_store, task, now):
+                print(f"重复任务 {task['name']} 错过发送时间，本次跳过，下次发送时间 "
+                      f"{datetime.fromtimestamp(task['schedule_time']).strftime('%Y-%m-%d %H:%M')}")
+                self.scheduler.schedule(task_id, task['schedule_time'])
+                self._notify(task)
+                continue
+            status = '已过期' if missed else '执行中'
+            if not self.task_store.claim(task_id, status):
+                # 另一个进程已经执行或修改了该任务，下次重新读取任务库时同步
+                continue
+            task['status'] = status
+            self._notify(task)
+            if missed:
+                print(f"定时任务 {task['name']} 已错过发送时间，标记为已过期")
+                continue
+            with self._lock:
+                self._running_ids.add(task_id)
+            threading.Thread(target=self.execute_task, args=(task,), daemon=True).start()
+
+    def _task_pid(self, task):
+        pid = task.get('pid')
+        if not pid and self.default_pid:
+            pid = self.default_pid()
+        if not pid:
+            pid = get_account_registry().default_pid()
+        return pid
+
+    def execute_task(self, task):
+        print(f"开始执行定时任务: {task['name']}")
+        # 本轮开始时间与成功数，界面据此计算发送速度
+        task['_run_started'] = time.monotonic()
+        task['_run_sent'] = 0
+        task.pop('_rate', None)
+        try:
+            pid = self._task_pid(task)
+            if not pid:
+                status = '失败'
+            else:
+                contacts = self.task_store.pending_contacts(task['id'])
+                if task.get('accounts'):
+                    send_messages_sharded(task['accounts'], contacts, task['message_text'], task['image_path'],
+                                          task['min_delay'], task['max_delay'], task_store=self.task_store,
+                                          task_id=task['id'], on_progress=self.on_progress,
+                                          data_manager=self.data_manager)
+                else:
+                    send_messages(pid, contacts, task['message_text'], task['image_path'],
+                                  task['min_delay'], task['max_delay'], task_store=self.task_store,
+                                  task_id=task['id'], on_progress=self.on_progress)
+                status = task_result_status(self.task_store.progress(task['id']))
+        except Exception as e:
+            print(f"定时任务 {task['name']} 执行失败: {e}")
+            status = '失败'
+        self.finish_task(task, status)
+
+    def finish_task(self, task, status):
+        task['status'] = status
+        try:
+            self.task_store.set_status(task['id'], status)
+            progress = self.task_store.progress(task['id'])
+            print(f"定时任务 {task['name']} {status}（成功 {progress.get('sent', 0)}，失败 {progress.get('failed', 0)}）")
+            if task.get('repeat') and advance_recurring(self.task_store, task):
+                print(f"重复任务 {task['name']} 下次发送时间 "
+                      f"{datetime.fromtimestamp(task['schedule_time']).strftime('%Y-%m-%d %H:%M')}")
+                self.scheduler.schedule(task['id'], task['schedule_time'])
+        except Exception as e:
+            print(f"保存任务状态失败: {e}")
+        with self._lock:
+            self._running_ids.discard(task['id'])
+        self._notify(task)
+        self._wake.set()
+
+
+class EngineService:
+    """无界面运行的完整服务：消息监听 → 消息记录 → 规则/AI 自动回复，加上定时群发。
+
+    配置全部来自 config/ 下的文件（auto_reply_rules.json、scheduled_tasks.db、send_pacing.json 等），
+    规则文件被界面或手工修改后自动重新加载。
+    """
+
+    RULES_WATCH_SECONDS = 2
+    MONITOR_CHECK_SECONDS = 60
+
+    def __init__(self, run_tasks=True):
+        self.data_manager = DataManager()
+        self.contacts = {}
+        self.reply_engine = ReplyEngine(find_contact=self.contacts.get, data_manager=self.data_manager)
+        self.monitor_manager = MessageMonitorManager(self.on_message)
+        self.task_runner = TaskRunner(data_manager=self.data_manager) if run_tasks else None
+        self.accounts = None
+        self.message_count = 0
+        self._message_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        # 与界面相同的启动顺序：规则加载完、账号和联系人读取完之后才开始监听消息
+        from startup_sequence import StartupSequence
+        store = get_rules_store()
+        sequence = StartupSequence()
+        sequence.add("加载规则", self.load_rules)
+        sequence.add("账号发现", self.load_contacts)
+        sequence.add("启动监听", self.start_monitors, after=("加载规则", "账号发现"))
+        if self.task_runner is not None:
+            sequence.add("定时群发", self.task_runner.start, after=("加载规则",))
+        sequence.start()
+        registry = get_account_registry()
+        registry.add_listener(self.on_accounts_changed)
+        registry.start_watcher()
+        self._start_loop(self.RULES_WATCH_SECONDS, store.reload_if_changed)
+        self._start_loop(self.MONITOR_CHECK_SECONDS, self.check_monitors)
+
+    def load_rules(self):
+        store = get_rules_store()
+        store.load(force=True)
+        settings = self.reply_engine.settings()
+        print(f"已加载 {len(store.get_rules())} 条规则，规则回复{'已开启' if settings.get('rule_reply_enabled') else '未开启'}，"
+              f"AI 回复{'已开启' if settings.get('ai_reply_enabled') else '未开启'}")
+
+    def start_monitors(self):
+        self.monitor_manager.start_monitor_all(self.accounts)
+        print(f"消息监听已启动: {len(self.monitor_manager.monitors)} 个账号")
+
+    def _start_loop(self, interval, callback):
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"后台检查失败: {e}")
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def load_contacts(self):
+        """读取各账号的好友/群，用于显示发送者名称和回复模板变量"""
+        self.accounts = get_account_registry().refresh()
+        self.load_account_contacts(self.accounts)
+
+    def load_account_contacts(self, accounts):
+        backend = get_wechat_backend()
+        for account in accounts:
+            try:
+                resources = backend.get_resources(account['pid']) or {}
+                contacts = resources.get('contacts') or []
+                self.data_manager.save_account_data(account, contacts, resources.get('friends') or [],
+                                                    resources.get('groups') or [])
+                for contact in contacts:
+                    if contact.get('wxid'):
+                        self.contacts[contact['wxid']] = contact
+                print(f"账号 {account.get('nickname', account['pid'])}: {len(contacts)} 个联系人")
+            except Exception as e:
+                print(f"读取账号 {account.get('pid')} 的联系人失败: {e}")
+
+    def on_accounts_changed(self, accounts, added, removed):
+        """账号注册表的监视线程中调用：新登录的账号读取联系人并开始监听，退出的账号停止监听"""
+        self.accounts = accounts
+        for account in removed:
+            print(f"微信账号已退出: {account.get('nickname', account['pid'])}")
+        self.load_account_contacts(added)
+        self.monitor_manager.sync_accounts(added, removed)
+
+    def check_monitors(self):
+        self.reply_engine.yuanbao_routes.purge_expired()
+        if not self.monitor_manager.is_running:
+            self.monitor_manager.start_monitor_all()
+
+    def on_message(self, message):
+        """监听线程中调用：逐条串行处理（记录消息、识别频繁提示、自动回复）"""
+        with self._message_lock:
+            try:
+                self.message_count += 1
+                self.data_manager.save_message(message)
+                if RATE_LIMIT_TEXT in (message.get('content') or ''):
+                    account = message.get('account', {})
+                    get_send_pacer().record_rate_limit(account.get('wxid') or account.get('pid'))
+                    return
+                message_data = self.reply_engine.handle_message(message)
+                if message_data:
+                    print(f"收到消息: {message_data['sender_nickname']}: {message_data['content'][:50]}")
+            except Exception as e:
+                print(f"处理消息失败: {e}")
+
+    def stop(self):
+        self._stop.set()
+        registry = get_account_registry()
+        registry.stop_watcher()
+        registry.remove_listener(self.on_accounts_changed)
+        self.monitor_manager.stop_monitor_all()
+        if self.task_runner is not None:
+            self.task_runner.stop()
+        self.reply_engine.shutdown()
+        try:
+            from ai_worker import get_ai_reply_worker
+            get_ai_reply_worker().shutdown()
+        except Exception:
+            pass
+        get_rules_store().flush()
+        get_send_pacer().flush()
+        if self.task_runner is not None:
+            self.task_runner.task_store.flush_results()
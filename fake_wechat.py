@@ -0,0 +1,288 @@
+import time
+import random
+import threading
+import xml.etree.ElementTree as ET
+
+from wechat_backend import WeChatBackend
+from engine import RATE_LIMIT_TEXT
+
+
+_NAME_CHARS = "张王李赵刘陈杨黄周吴徐孙马朱胡郭何林罗高小大明华丽强军伟芳娜敏静秀英国平"
+_TEXT_CHARS = "你好在吗价格优惠活动发货退款订单快递客服会员积分咨询地址包邮尺码颜色库存售后谢谢请问多少"
+
+_XML_LABELS = {
+    'img': '[图片]', 'voicemsg': '[语音]', 'videomsg': '[视频]', 'emoji': '[表情]', 'location': '[位置]'
+}
+_APPMSG_LABELS = {'5': '[链接]', '6': '[文件]', '2000': '[转账]', '2001': '[红包]', '3': '[音乐]'}
+
+
+def parse_special_message(content):
+    """简化的 XML 特殊消息解析（假微信使用），只识别常见类型，返回与真实接口相同形式的简短描述"""
+    if not content or not content.lstrip().startswith('<'):
+        return None
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return None
+    for child in root:
+        if child.tag in _XML_LABELS:
+            label = _XML_LABELS[child.tag]
+            poi = child.get('poiname') or child.get('label')
+            return f"{label} {poi}" if poi else label
+        if child.tag == 'appmsg':
+            label = _APPMSG_LABELS.get(child.findtext('type', ''), '[消息]')
+            title = child.findtext('title', '')
+            return f"{label} {title}".strip()
+    return None
+
+
+def _text(rng, chars, min_len, max_len):
+    return ''.join(rng.choice(chars) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_fake_contacts(count, seed=1, group_ratio=0.05):
+    """按随机种子生成 count 个联系人（约 group_ratio 为群），相同参数结果相同"""
+    rng = random.Random(seed)
+    contacts = []
+    for i in range(count):
+        if rng.random() < group_ratio:
+            contacts.append({'wxid': f"{1000000000 + i}@chatroom", 'nickname': _text(rng, _NAME_CHARS, 2, 6) + "群"})
+            continue
+        contacts.append({
+            'wxid': f"wxid_{i:08x}",
+            'nickname': _text(rng, _NAME_CHARS, 2, 4),
+            'remarks': _text(rng, _NAME_CHARS, 2, 3) if rng.random() < 0.4 else '',
+            'tag': '',
+            'phone': f"1{rng.randint(3000000000, 9999999999)}" if rng.random() < 0.2 else ''
+        })
+    return contacts
+
+
+class FakeMonitor:
+    """假的消息/联系人监听器：emit() 把消息交给回调"""
+
+    def __init__(self, backend, pid, kind):
+        self.backend = backend
+        self.pid = pid
+        self.kind = kind
+        self.callback = None
+        self.active = False
+
+    def set_callback(self, callback):
+        self.callback = callback
+
+    def start(self):
+        self.active = True
+        self.backend.monitors[(self.kind, self.pid)] = self
+        return True
+
+    def stop(self):
+        self.active = False
+        self.backend.monitors.pop((self.kind, self.pid), None)
+
+    def is_active(self):
+        return self.active
+
+    def emit(self, data):
+        if self.active and self.callback:
+            self.callback(data)
+
+
+class FakeWeChatBackend(WeChatBackend):
+    """内存中的假微信，结果只由参数和随机种子决定，可在 Linux 上无客户端运行。
+
+    - 账号：account_count 个，pid 从 4242 起；联系人由 make_fake_contacts 生成（也可直接传入），各账号共用
+    - 发送：只记录到 sent，不落地；send_latency 为固定秒数或 (最小, 最大) 区间，
+      failure_rate 为随机失败率，fail_every 为每 N 次失败一次
+    - 频率限制：rate_limit_per_minute 大于 0 时，同一账号一分钟内超过该次数的发送失败，
+      并通过消息监听推送一条“操作过于频繁”提示
+    - 进程：start_client()/login_account() 增加一个已登录账号，logout_account(pid) 模拟进程退出
+    - 消息流：start_message_stream() 按固定速率向各账号的消息监听推送好友/群消息
+    """
+
+    name = 'fake'
+
+    def __init__(self, accounts=None, contacts=None, contact_count=2000, account_count=1, seed=1,
+                 send_latency=0.0, failure_rate=0.0, fail_every=0, rate_limit_per_minute=0, members_per_group=50):
+        self.accounts = [dict(a) for a in accounts] if accounts else [
+            {'pid': 4242 + i, 'wxid': f"wxid_fake_self_{i}", 'nickname': f"测试号{i + 1}", 'phone': ''}
+            for i in range(account_count)]
+        self.contacts = list(contacts) if contacts is not None else make_fake_contacts(contact_count, seed)
+        self.send_latency = send_latency
+        self.failure_rate = failure_rate
+        self.fail_every = fail_every
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.members_per_group = members_per_group
+        self.seed = seed
+        self.sent = []
+        self.added_friends = []
+        self.monitors = {}
+        self._rng = random.Random(seed)
+        self._send_times = {}
+        self._lock = threading.Lock()
+        self._stream_stop = threading.Event()
+
+    # 发现
+    def list_accounts(self, force_refresh=False):
+        return [dict(a) for a in self.accounts]
+
+    def find_processes(self):
+        return [a['pid'] for a in self.accounts]
+
+    def start_client(self):
+        """模拟打开一个新微信并登录：增加一个账号，返回其 pid"""
+        return self.login_account()['pid']
+
+    def login_account(self, nickname=None):
+        with self._lock:
+            index = len(self.accounts)
+            pid = max([a['pid'] for a in self.accounts] or [4241]) + 1
+            account = {'pid': pid, 'wxid': f"wxid_fake_self_{pid}", 'nickname': nickname or f"测试号{index + 1}", 'phone': ''}
+            self.accounts.append(account)
+        return dict(account)
+
+    def logout_account(self, pid):
+        """模拟微信进程退出"""
+        with self._lock:
+            self.accounts = [a for a in self.accounts if a['pid'] != pid]
+
+    # 联系人
+    def get_resources(self, pid, progress_callback=None):
+        groups = [c for c in self.contacts if '@chatroom' in c['wxid']]
+        friends = [c for c in self.contacts if '@chatroom' not in c['wxid']]
+        if progress_callback:
+            progress_callback(len(self.contacts), len(self.contacts), None)
+        return {'contacts': list(self.contacts), 'friends': friends, 'groups': groups}
+
+    def get_group_members(self, pid, group_id, progress_callback=None):
+        friends = [c for c in self.contacts if '@chatroom' not in c['wxid']]
+        if not friends:
+            return []
+        rng = random.Random(f"{self.seed}:{group_id}")
+        members = rng.sample(friends, min(self.members_per_group, len(friends)))
+        if progress_callback:
+            progress_callback(len(members), len(members), None)
+        return [dict(m) for m in members]
+
+    def get_all_group_members(self, pid, groups):
+        members = {}
+        for group in groups or ():
+            group_id = group.get('wxid') if isinstance(group, dict) else group
+            members[group_id] = self.get_group_members(pid, group_id)
+        return members
+
+    # 发送
+    def _send(self, pid, wxid, content):
+        latency = self.send_latency
+        if isinstance(latency, (tuple, list)):
+            with self._lock:
+                latency = self._rng.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+        with self._lock:
+            now = time.monotonic()
+            self.sent.append((pid, wxid, content))
+            limited = False
+            if self.rate_limit_per_minute > 0:
+                recent = [t for t in self._send_times.get(pid, ()) if now - t < 60]
+                recent.append(now)
+                self._send_times[pid] = recent
+                limited = len(recent) > self.rate_limit_per_minute
+            failed = (self.fail_every and len(self.sent) % self.fail_every == 0) or \
+                (self.failure_rate and self._rng.random() < self.failure_rate)
+        if limited:
+            self.emit_message(pid, {'wxid': 'weixin', 'content': RATE_LIMIT_TEXT, 'timestamp': int(time.time())})
+            return False
+        return not failed
+
+    def send_message_simple(self, pid, wxid, content):
+        return self._send(pid, wxid, content)
+
+    def send_image_simple(self, pid, wxid, path):
+        return self._send(pid, wxid, path)
+
+    def send_message_to_wxid(self, pid, wxid, content):
+        return self._send(pid, wxid, content)
+
+    def send_image_to_wxid(self, pid, wxid, path):
+        return self._send(pid, wxid, path)
+
+    # 监听
+    def create_message_monitor(self, pid):
+        return FakeMonitor(self, pid, 'message')
+
+    def create_contact_monitor(self, pid):
+        return FakeMonitor(self, pid, 'contact')
+
+    def emit_message(self, pid, message):
+        """向 pid 账号的消息监听推送一条消息（监听未启动时丢弃）"""
+        monitor = self.monitors.get(('message', pid))
+        if monitor:
+            monitor.emit(dict(message))
+
+    def start_message_stream(self, rate_per_second=10.0, count=None, seed=None, group_ratio=0.25):
+        """后台线程按 rate_per_second 条/秒向各账号推送随机好友/群消息，count 条后停止（None 为一直推送）"""
+        rng = random.Random(self.seed if seed is None else seed)
+        friends = [c for c in self.contacts if '@chatroom' not in c['wxid']] or [{'wxid': 'wxid_unknown'}]
+        groups = [c for c in self.contacts if '@chatroom' in c['wxid']]
+        self._stream_stop.clear()
+
+        def run():
+            sent = 0
+            interval = 1.0 / rate_per_second if rate_per_second > 0 else 0
+            while not self._stream_stop.is_set() and (count is None or sent < count):
+                account = self.accounts[sent % len(self.accounts)]
+                message = {'content': _text(rng, _TEXT_CHARS, 2, 20), 'timestamp': int(time.time())}
+                if groups and rng.random() < group_ratio:
+                    message['wxid'] = rng.choice(groups)['wxid']
+                    message['member_id'] = rng.choice(friends)['wxid']
+                else:
+                    message['wxid'] = rng.choice(friends)['wxid']
+                self.emit_message(account['pid'], message)
+                sent += 1
+                if interval:
+                    self._stream_stop.wait(interval)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop_message_stream(self):
+        self._stream_stop.set()
+
+    # 加好友
+    def add_friend(self, pid, friend_id, greeting, scene=None):
+        with self._lock:
+            failed = self.failure_rate and self._rng.random() < self.failure_rate
+            if not failed:
+                self.added_friends.append((pid, friend_id, greeting))
+        return not failed
+
+    def open_process(self, pid):
+        return pid if pid in self.find_processes() else None
+
+    def close_process(self, handle):
+        return True
+
+    def get_base_address(self, pid):
+        return 0x10000000 + pid if pid in self.find_processes() else None
+
+    def add_friend_by_phone(self, handle, base_address, phone):
+        """约 80% 的手机号能搜到（由号码决定），搜到时向联系人监听推送一条带 v3 的结果"""
+        found = random.Random(f"{self.seed}:{phone}").random() < 0.8
+        if found:
+            monitor = self.monitors.get(('contact', handle))
+            if monitor:
+                monitor.emit({'phone': phone, 'v3': f"v3_fake_{phone}", 'nickname': f"用户{str(phone)[-4:]}"})
+        return found
+
+    # 备注
+    def modify_remark(self, pid, wxid, remark):
+        for contact in self.contacts:
+            if contact.get('wxid') == wxid:
+                contact['remarks'] = remark
+                return True
+        return False
+
+    def parse_special_message(self, content):
+        return parse_special_message(content)
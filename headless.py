@@ -0,0 +1,125 @@
+"""无界面运行：消息监听、规则/AI 自动回复、消息记录与定时群发，不需要 PySide6 界面和桌面会话。
+
+    python headless.py                       # 使用真实微信客户端
+    python headless.py --fake --stream 5     # 假微信，每秒推送 5 条消息（Linux 上演示/排查用）
+    python headless.py --no-tasks            # 只做自动回复，不执行定时群发
+
+规则与回复设置读取 config/auto_reply_rules.json（可以先用界面配置好再切换到无界面运行，
+文件修改后自动重新加载），定时任务读取 config/scheduled_tasks.db。输出按天写入 logs/ 下的日志文件。
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+from datetime import datetime
+
+
+class _LogStream:
+    """把 print 输出按行加上时间写入按天滚动的日志文件，同时保留原来的控制台输出"""
+
+    def __init__(self, log_dir, console):
+        self.log_dir = log_dir
+        self.console = console
+        self._date = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._at_line_start = True
+        os.makedirs(log_dir, exist_ok=True)
+
+    def _log_file(self):
+        today = datetime.now().strftime('%Y%m%d')
+        if today != self._date:
+            if self._file is not None:
+                self._file.close()
+            self._date = today
+            self._file = open(os.path.join(self.log_dir, f"headless_{today}.log"), 'a', encoding='utf-8')
+        return self._file
+
+    def write(self, text):
+        if not text:
+            return 0
+        with self._lock:
+            if self.console is not None:
+                try:
+                    self.console.write(text)
+                except Exception:
+                    pass
+            try:
+                f = self._log_file()
+                for line in text.splitlines(keepends=True):
+                    if self._at_line_start:
+                        f.write(datetime.now().strftime('[%Y-%m-%d %H:%M:%S] '))
+                    f.write(line)
+                    self._at_line_start = line.endswith('\n')
+                f.flush()
+            except Exception:
+                pass
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            if self.console is not None:
+                try:
+                    self.console.flush()
+                except Exception:
+                    pass
+            if self._file is not None:
+                self._file.flush()
+
+
+def setup_file_logging(log_dir):
+    sys.stdout = _LogStream(log_dir, sys.__stdout__)
+    sys.stderr = _LogStream(log_dir, sys.__stderr__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面运行自动回复与定时群发")
+    parser.add_argument('--fake', action='store_true', help="使用假微信（等同于环境变量 WECHAT_BACKEND=fake）")
+    parser.add_argument('--stream', type=float, default=0, metavar='条/秒', help="假微信按该速率推送测试消息")
+    parser.add_argument('--no-tasks', action='store_true', help="不执行定时群发任务")
+    parser.add_argument('--log-dir', default='logs', help="日志目录（默认 logs）")
+    parser.add_argument('--duration', type=float, default=0, metavar='秒', help="运行指定秒数后退出（默认一直运行）")
+    args = parser.parse_args(argv)
+
+    setup_file_logging(args.log_dir)
+    if args.fake:
+        os.environ['WECHAT_BACKEND'] = 'fake'
+
+    from wechat_backend import get_wechat_backend
+    from engine import EngineService
+    from startup_profile import get_startup_profile
+
+    backend = get_wechat_backend()
+    print(f"无界面模式启动（微信接口: {backend.name}，工作目录: {os.getcwd()}）")
+
+    service = EngineService(run_tasks=not args.no_tasks)
+    stop_event = threading.Event()
+
+    def request_stop(*_):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    started = time.monotonic()
+    service.start()
+    get_startup_profile().report()
+    if args.stream > 0 and hasattr(backend, 'start_message_stream'):
+        backend.start_message_stream(args.stream)
+
+    # 主线程只等待退出信号（用短超时等待，保证 Ctrl+C 在 Windows 上也能及时响应）
+    while not stop_event.wait(1.0):
+        if args.duration and time.monotonic() - started >= args.duration:
+            break
+
+    if hasattr(backend, 'stop_message_stream'):
+        backend.stop_message_stream()
+    service.stop()
+    print(f"无界面模式已退出，运行 {time.monotonic() - started:.0f} 秒，处理消息 {service.message_count} 条")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
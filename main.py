@@ -1,34 +1,43 @@
 import os
+import re
 import sys
 import time
 import json
 import threading
 import traceback
 from datetime import datetime
-import random
 import configparser
 import uuid
-import psutil
 import ctypes
-from PySide6.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget,
+from startup_profile import get_startup_profile
+from startup_sequence import StartupSequence
+
+# 启动分析从这里开始计时；psutil、openpyxl、AI 助手（aizhuli_combined）等较重的模块在用到时才导入
+_startup_profile = get_startup_profile()
+with _startup_profile.stage("导入 PySide6"):
+    from PySide6.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget,
     QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QTreeWidget,
     QTreeWidgetItem, QGroupBox, QMessageBox, QMenu, QDialog,
     QTextEdit, QFileDialog, QComboBox, QCheckBox, QTableWidget, QDialogButtonBox,
     QTableWidgetItem, QFormLayout, QDateEdit, QListWidget, QListWidgetItem,
-    QDateTimeEdit, QCalendarWidget, QHeaderView)
-from PySide6.QtCore import Qt, QTimer, Signal, QObject, QDateTime, QDate, QTime, QThread, QMetaObject, Q_ARG
-from styles import StyleSheet, apply_stylesheet
-from wechat import (
-    SimpleWeChatInfo, WeChatMessageMonitor, start_new_wechat,
-    send_message_to_wxid, send_image_to_wxid,
-    parse_special_message, add_wechat_friend, get_wechat_resources,
-    add_friend_by_phone, ContactInfoMonitor, 
-    send_message_simple, send_image_simple,
-    RemarkModifier, get_group_members, get_all_group_members,
-    OpenProcess, CloseHandle, get_wechat_base, detect_wechat_processes,
-    get_wechat_service
-)
-from aizhuli_combined import AIAssistantTab, get_last_yuanbao_sender
+        QDateTimeEdit, QCalendarWidget, QHeaderView, QTableView, QAbstractItemView)
+    from PySide6.QtCore import (Qt, QTimer, Signal, QObject, QDateTime, QDate, QTime, QThread, QMetaObject, Q_ARG,
+        QAbstractTableModel, QModelIndex)
+    from PySide6.QtGui import QColor
+with _startup_profile.stage("导入业务模块"):
+    from styles import StyleSheet, apply_stylesheet
+    from wechat_backend import get_wechat_backend
+    from account_registry import get_account_registry
+    from process_pool import get_process_pool, ProcessPoolError
+    from task_store import get_task_store
+    from send_pacing import get_send_pacer
+    from message_template import TEMPLATE_HELP
+    from recurrence import parse_recurrence, describe_recurrence, REPEAT_HELP
+    from config_store import get_rules_store, DEFAULT_RULE_SETTINGS
+    from rule_engine import (rule_key, format_scope, parse_scope, compile_rule_pattern, describe_pattern_issue,
+        SCOPE_FIELDS, MATCH_TYPES, PATTERN_TYPES)
+    from engine import (DataManager, MessageMonitorManager, ReplyEngine, TaskRunner,
+        stored_reply_settings, YUANBAO_WXID, RATE_LIMIT_TEXT)
 
 def _check_single_instance(name: str = "Global\\WeChatManagerAppMutex") -> bool:
     """检查程序是否已运行"""
@@ -66,17 +75,34 @@ def setup_tree_columns(tree, specs=None, default_size=150, stretch_last=True):
             header.resizeSection(i, 150)
 
 class TaskTab(QWidget):
+    task_changed = Signal(object)
+    task_progress = Signal(object, str)
+    tasks_reloaded = Signal()
+
+    # 预览重复任务时列出的触发次数
+    REPEAT_PREVIEW_COUNT = 10
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         self.selected_contacts = []
         self.scheduled_tasks = []
-        self.task_timer = QTimer()
-        self.task_timer.timeout.connect(self.check_scheduled_tasks)
-        self.task_timer.start(1000)
+        self._task_rows = {}
+        self.task_changed.connect(self._on_task_changed)
+        self.task_progress.connect(self._on_task_progress)
+        self.tasks_reloaded.connect(self._on_tasks_reloaded)
+        self.task_store = get_task_store()
+        # 任务的调度、执行与重复都由 engine.TaskRunner 完成（与无界面运行同一套逻辑），界面只渲染其回调
+        self.task_runner = TaskRunner(self.task_store, data_manager=getattr(parent, 'data_manager', None),
+                                      on_task_changed=self.task_changed.emit,
+                                      on_progress=self.task_progress.emit,
+                                      on_reload=self.tasks_reloaded.emit,
+                                      default_pid=lambda: getattr(self.parent, 'current_account_pid', None))
+        self.shard_accounts = []
 
         self.selected_wxids = set()
         self.init_ui()
+        self._load_saved_tasks()
 
 
 
@@ -118,8 +144,38 @@ class TaskTab(QWidget):
         self.select_time_btn.clicked.connect(self.show_time_dialog)
         self.select_time_btn.setEnabled(False)
         send_mode_layout.addWidget(self.select_time_btn)
+        send_mode_layout.addSpacing(15)
+        self.multi_account_check = QCheckBox("多账号分摊发送")
+        self.multi_account_check.setToolTip("把群发对象分给所选的多个微信账号同时发送，每个对象只由拥有该好友/群的账号发送")
+        self.multi_account_check.stateChanged.connect(self.on_multi_account_changed)
+        send_mode_layout.addWidget(self.multi_account_check)
+        self.shard_accounts_label = QLabel("")
+        send_mode_layout.addWidget(self.shard_accounts_label)
         send_mode_layout.addStretch()
         schedule_layout.addLayout(send_mode_layout)
+        repeat_layout = QHBoxLayout()
+        repeat_layout.addWidget(QLabel("重复:"))
+        self.repeat_combo = QComboBox()
+        self.repeat_combo.addItem("不重复", "")
+        self.repeat_combo.addItem("每天", "daily")
+        self.repeat_combo.addItem("每周", "weekly")
+        self.repeat_combo.addItem("每隔N分钟", "interval")
+        self.repeat_combo.addItem("自定义规则", "custom")
+        self.repeat_combo.setEnabled(False)
+        self.repeat_combo.currentIndexChanged.connect(self.on_repeat_mode_changed)
+        repeat_layout.addWidget(self.repeat_combo)
+        self.repeat_value = QLineEdit()
+        self.repeat_value.setFixedWidth(160)
+        self.repeat_value.setMaximumHeight(25)
+        self.repeat_value.setToolTip(REPEAT_HELP)
+        self.repeat_value.setEnabled(False)
+        repeat_layout.addWidget(self.repeat_value)
+        self.repeat_preview_btn = QPushButton("预览发送时间")
+        self.repeat_preview_btn.clicked.connect(self.preview_repeat)
+        self.repeat_preview_btn.setEnabled(False)
+        repeat_layout.addWidget(self.repeat_preview_btn)
+        repeat_layout.addStretch()
+        schedule_layout.addLayout(repeat_layout)
         delay_layout = QHBoxLayout()
         delay_layout.addWidget(QLabel("对象切换间隔:"))
         self.min_delay = QLineEdit("1")
@@ -132,6 +188,18 @@ class TaskTab(QWidget):
         self.max_delay.setMaximumHeight(25)
         delay_layout.addWidget(self.max_delay)
         delay_layout.addWidget(QLabel("秒"))
+        delay_layout.addSpacing(15)
+        delay_layout.addWidget(QLabel("错过发送时间的任务:"))
+        self.catch_up_combo = QComboBox()
+        self.catch_up_combo.addItem("超过时限则跳过", "window")
+        self.catch_up_combo.addItem("一律补发", "run")
+        self.catch_up_combo.addItem("一律跳过", "skip")
+        delay_layout.addWidget(self.catch_up_combo)
+        self.catch_up_minutes = QLineEdit("30")
+        self.catch_up_minutes.setFixedWidth(25)
+        self.catch_up_minutes.setMaximumHeight(25)
+        delay_layout.addWidget(self.catch_up_minutes)
+        delay_layout.addWidget(QLabel("分钟"))
         delay_layout.addStretch()
         schedule_layout.addLayout(delay_layout)
         schedule_group.setLayout(schedule_layout)
@@ -144,6 +212,7 @@ class TaskTab(QWidget):
         self.message_text = QTextEdit()
         self.message_text.setMaximumHeight(80)
         self.message_text.setPlaceholderText("请输入要发送的文本消息...")
+        self.message_text.setToolTip(TEMPLATE_HELP)
         text_layout.addWidget(self.message_text)
         content_layout.addLayout(text_layout)
         media_layout = QHBoxLayout()
@@ -180,9 +249,9 @@ class TaskTab(QWidget):
         self.task_table = QTableWidget()
         self.task_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         self.task_table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
-        self.task_table.setColumnCount(6)
+        self.task_table.setColumnCount(8)
         self.task_table.setHorizontalHeaderLabels([
-            "序号", "任务名称", "发送时间", "目标数量", "状态", "操作"
+            "序号", "任务名称", "发送时间", "目标数量", "状态", "进度", "速度", "操作"
         ])
         self.task_table.verticalHeader().setVisible(False)
         header = self.task_table.horizontalHeader()
@@ -198,18 +267,142 @@ class TaskTab(QWidget):
         self.delete_selected_btn = QPushButton("删除选中任务")
         self.delete_selected_btn.clicked.connect(self.delete_selected_tasks)
         task_buttons.addWidget(self.delete_selected_btn)
+        self.retry_failed_btn = QPushButton("重发失败对象")
+        self.retry_failed_btn.setToolTip("选中任务中发送失败的对象重新排队，立即重发（已发送成功的不会重复发送）")
+        self.retry_failed_btn.clicked.connect(self.retry_failed_contacts)
+        task_buttons.addWidget(self.retry_failed_btn)
+        self.delivery_log_btn = QPushButton("发送明细")
+        self.delivery_log_btn.clicked.connect(self.show_delivery_log)
+        task_buttons.addWidget(self.delivery_log_btn)
         task_buttons.addStretch()
         task_layout.addLayout(task_buttons)
         task_group.setLayout(task_layout)
         main_layout.addWidget(task_group)
 
+    def _load_saved_tasks(self):
+        """读取补发策略设置并启动任务调度：被中断的任务从未发送的联系人继续，错过时间的任务按补发策略处理"""
+        try:
+            settings = self.task_store.get_settings()
+            index = self.catch_up_combo.findData(settings.get('catch_up_policy', 'window'))
+            self.catch_up_combo.setCurrentIndex(max(0, index))
+            self.catch_up_minutes.setText(str(settings.get('catch_up_minutes', '30')))
+            self.catch_up_combo.currentIndexChanged.connect(self._save_task_settings)
+            self.catch_up_minutes.editingFinished.connect(self._save_task_settings)
+        except Exception as e:
+            print(f"读取定时任务设置失败: {e}")
+        self.task_runner.start()
+        self.scheduled_tasks = self.task_runner.get_tasks()
+        self.update_task_table()
+
+    def _save_task_settings(self, *_):
+        try:
+            self.task_store.update_settings({
+                'catch_up_policy': self.catch_up_combo.currentData(),
+                'catch_up_minutes': self.catch_up_minutes.text().strip() or '30'
+            })
+        except Exception as e:
+            print(f"保存定时任务设置失败: {e}")
+
     def on_send_mode_changed(self):
         is_scheduled = self.scheduled_check.isChecked()
         self.schedule_datetime.setEnabled(is_scheduled)
         self.select_time_btn.setEnabled(is_scheduled)
+        self.repeat_combo.setEnabled(is_scheduled)
+        self.repeat_preview_btn.setEnabled(is_scheduled)
+        self.on_repeat_mode_changed()
         if is_scheduled:
             self.show_time_dialog()
 
+    def on_repeat_mode_changed(self, *_):
+        mode = self.repeat_combo.currentData()
+        self.repeat_value.setEnabled(self.scheduled_check.isChecked() and mode in ('interval', 'custom'))
+        if mode == 'interval':
+            self.repeat_value.setPlaceholderText("间隔分钟数，如 60")
+        elif mode == 'custom':
+            self.repeat_value.setPlaceholderText("如 0 9 * * 1-5 或 @every 2h")
+        else:
+            self.repeat_value.setPlaceholderText("")
+
+    def _repeat_spec(self):
+        """由界面上的重复设置生成重复规则，“每天/每周”取发送时间的时分与星期；不重复返回空串，填写有误抛出 ValueError"""
+        if not self.scheduled_check.isChecked():
+            return ''
+        mode = self.repeat_combo.currentData()
+        at = datetime.fromtimestamp(self.schedule_datetime.dateTime().toSecsSinceEpoch())
+        value = self.repeat_value.text().strip()
+        if mode == 'daily':
+            spec = f"{at.minute} {at.hour} * * *"
+        elif mode == 'weekly':
+            spec = f"{at.minute} {at.hour} * * {(at.weekday() + 1) % 7}"
+        elif mode == 'interval':
+            if not value.isdigit() or int(value) <= 0:
+                raise ValueError("请输入有效的重复间隔分钟数")
+            spec = f"@every {int(value)}m"
+        elif mode == 'custom':
+            if not value:
+                raise ValueError("请输入重复规则")
+            spec = value
+        else:
+            return ''
+        parse_recurrence(spec)
+        return spec
+
+    def preview_repeat(self):
+        try:
+            spec = self._repeat_spec()
+        except ValueError as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
+        if not spec:
+            QMessageBox.information(self, "提示", "未设置重复，任务只在发送时间发送一次")
+            return
+        self._show_repeat_preview(spec, self.schedule_datetime.dateTime().toSecsSinceEpoch(), self)
+
+    def _show_repeat_preview(self, spec, start, parent):
+        """列出重复规则接下来的若干次发送时间"""
+        times = parse_recurrence(spec).preview(max(int(start), int(time.time())), self.REPEAT_PREVIEW_COUNT)
+        if not times:
+            QMessageBox.information(parent, "发送时间预览", f"规则“{spec}”不会再触发")
+            return
+        lines = []
+        for moment in map(datetime.fromtimestamp, times):
+            lines.append(f"{moment:%Y-%m-%d %H:%M} 星期{'一二三四五六日'[moment.weekday()]}")
+        QMessageBox.information(parent, "发送时间预览",
+                                f"{describe_recurrence(spec)}，接下来 {len(times)} 次发送时间：\n" + "\n".join(lines))
+
+    def on_multi_account_changed(self):
+        """勾选多账号分摊时选择参与发送的账号，未选够两个账号则取消勾选"""
+        if not self.multi_account_check.isChecked():
+            self.shard_accounts = []
+            self.shard_accounts_label.setText("")
+            return
+        accounts = []
+        try:
+            accounts = get_account_registry().accounts()
+        except Exception:
+            pass
+        selected = []
+        if len(accounts) >= 2:
+            dialog = WeChatAccountSelectionDialog(accounts, self, purpose="分摊群发")
+            if dialog.exec() == QDialog.DialogCode.Accepted:
+                selected = dialog.get_selected_accounts() or []
+        else:
+            QMessageBox.information(self, "提示", "至少需要登录两个微信账号才能分摊发送")
+        if len(selected) < 2:
+            self.multi_account_check.blockSignals(True)
+            self.multi_account_check.setChecked(False)
+            self.multi_account_check.blockSignals(False)
+            self.shard_accounts = []
+            self.shard_accounts_label.setText("")
+            return
+        self.shard_accounts = selected
+        self.shard_accounts_label.setText(f"已选 {len(selected)} 个账号")
+
+    def _shard_account_wxids(self):
+        if not self.multi_account_check.isChecked():
+            return []
+        return [account['wxid'] for account in self.shard_accounts if account.get('wxid')]
+
     def show_time_dialog(self):
         """显示时间选择对话框"""
         dialog = QDialog(self)
@@ -352,9 +545,7 @@ class TaskTab(QWidget):
     def check_wechat_login(self):
         """检查微信是否登录"""
         try:
-            wechat_info = SimpleWeChatInfo()
-            accounts = wechat_info.run()
-            return len(accounts) > 0
+            return bool(get_account_registry().pids())
         except Exception:
             return False
 
@@ -407,24 +598,19 @@ class TaskTab(QWidget):
             if reply == QMessageBox.StandardButton.Yes:
                 pid = self._get_current_pid()
                 if pid:
-                    try:
-                        min_delay = int(self.min_delay.text())
-                        max_delay = int(self.max_delay.text())
-                    except (ValueError, TypeError):
-                        min_delay, max_delay = 1, 3
-                    
-                    threading.Thread(
-                        target=self.send_messages, 
-                        args=(pid, list(self.selected_contacts), message_text, image_path, min_delay, max_delay), 
-                        daemon=True
-                    ).start()
-                    
+                    # 立即发送也建一条任务记录，同样有发送明细、实时计数和“重发失败对象”
+                    self.create_scheduled_task(task_name, list(self.selected_contacts), pid, run_now=True)
                     self.selected_contacts = []
                     self.selected_wxids.clear()
                     self.update_selected_contacts_list()
                     self.message_text.clear()
                     self.image_path.clear()
         else:
+            try:
+                self._repeat_spec()
+            except ValueError as e:
+                QMessageBox.warning(self, "提示", str(e))
+                return
             if self.schedule_datetime.dateTime() <= QDateTime.currentDateTime():
                 self.schedule_datetime.setDateTime(QDateTime.currentDateTime().addSecs(300))
             
@@ -441,12 +627,10 @@ class TaskTab(QWidget):
             pid = getattr(self.parent, 'current_account_pid', None)
             if pid:
                 return pid
-        wechat_info = SimpleWeChatInfo()
-        accounts = wechat_info.run()
-        return accounts[0]['pid'] if accounts else None
+        return get_account_registry().default_pid()
 
-    def create_scheduled_task(self, task_name, contacts, pid=None):
-        """创建定时任务"""
+    def create_scheduled_task(self, task_name, contacts, pid=None, run_now=False):
+        """创建定时任务；run_now 为 True 时不重复、发送时间为现在，由 TaskRunner 立即执行"""
         try:
             schedule_time = self.schedule_datetime.dateTime()
             message_text = self.message_text.toPlainText()
@@ -457,21 +641,33 @@ class TaskTab(QWidget):
             except (ValueError, TypeError):
                 min_delay, max_delay = 1, 3
             
+            repeat = '' if run_now else self._repeat_spec()
+            fire_time = int(time.time()) if run_now else schedule_time.toSecsSinceEpoch()
+            if repeat:
+                fire_time = parse_recurrence(repeat).first_at_or_after(fire_time)
+
             task = {
-                'id': int(time.time()),
+                'id': self.task_runner.new_task_id(),
                 'name': task_name,
-                'schedule_time': schedule_time.toSecsSinceEpoch(),
+                'schedule_time': fire_time,
                 'contacts': contacts,
                 'message_text': message_text,
                 'image_path': image_path,
                 'min_delay': min_delay,
                 'max_delay': max_delay,
                 'status': '等待中',
-                'pid': pid
+                'pid': pid,
+                'accounts': self._shard_account_wxids(),
+                'repeat': repeat
             }
+            task['progress'] = {'pending': len([c for c in contacts if c.get('wxid')])}
             
+            self.task_runner.add_task(task)
             self.scheduled_tasks.append(task)
-            self.refresh_task_table_async()
+            row = self.task_table.rowCount()
+            self.task_table.insertRow(row)
+            self._task_rows[task['id']] = row
+            self._populate_task_row(row, task)
         except Exception as e:
             QMessageBox.warning(self, "错误", f"创建定时任务失败: {str(e)}")
 
@@ -493,11 +689,35 @@ class TaskTab(QWidget):
         self.task_table.setSortingEnabled(False)
         self.task_table.setRowCount(0)
         
+        self.task_table.setRowCount(len(self.scheduled_tasks))
+        self._task_rows = {}
         for i, task in enumerate(self.scheduled_tasks):
-            self.task_table.insertRow(i)
+            self._task_rows[task['id']] = i
             self._populate_task_row(i, task)
             
         self.task_table.setSortingEnabled(prev_sort)
+
+    def _on_task_changed(self, task):
+        """TaskRunner 在后台线程改动任务后，在界面线程重绘该行。
+        该信号排在本轮所有 task_progress 之后，不在执行中时以任务库的计数为准，纠正增量计数的偏差"""
+        if task.get('status') != '执行中':
+            try:
+                task['progress'] = self.task_store.progress(task['id'])
+            except Exception as e:
+                print(f"读取任务进度失败: {e}")
+        self._refresh_task_row(task)
+
+    def _on_tasks_reloaded(self):
+        """TaskRunner 重新读取任务库后有任务增删（例如其它进程新建的任务），整表重绘"""
+        self.scheduled_tasks = self.task_runner.get_tasks()
+        self.update_task_table()
+
+    def _refresh_task_row(self, task):
+        """只重绘该任务所在的一行（状态、时间等变化后调用，必须在界面线程执行）"""
+        row = self._task_rows.get(task['id'])
+        if row is None:
+            return
+        self._populate_task_row(row, task)
     
     def _populate_task_row(self, row, task):
         self.task_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
@@ -505,25 +725,29 @@ class TaskTab(QWidget):
         
         schedule_time = datetime.fromtimestamp(task['schedule_time'])
         time_str = schedule_time.strftime('%Y-%m-%d %H:%M:%S')
+        if task.get('repeat'):
+            time_str = f"{time_str}（{describe_recurrence(task['repeat'])}）"
         self.task_table.setItem(row, 2, QTableWidgetItem(time_str))
         
         self.task_table.setItem(row, 3, QTableWidgetItem(str(len(task['contacts']))))
         
         raw_status = task.get('status', '等待中')
         display_status = str(raw_status).strip() if raw_status else '等待中'
-        if (display_status == '完成' or display_status.startswith('完成(') or
-            display_status == '执行中' or display_status.startswith('执行中(')):
+        if display_status == '完成' or display_status.startswith('完成('):
             display_status = '已完成'
             task['status'] = '已完成'
         self.task_table.setItem(row, 4, QTableWidgetItem(display_status))
+        self._set_progress_cells(row, task)
         
-        if task.get('status') in ('等待中', '已完成'):
+        if task.get('status') == '执行中':
+            self.task_table.removeCellWidget(row, 7)
+        elif self.task_table.cellWidget(row, 7) is None:
             cell_widget = QWidget()
             layout = QHBoxLayout(cell_widget)
             layout.setContentsMargins(0, 0, 0, 0)
             
             edit_btn = QPushButton("编辑")
-            edit_btn.clicked.connect(lambda: self.edit_task(row))
+            edit_btn.clicked.connect(lambda: self.edit_task(self._task_rows.get(task['id'], -1)))
             
             del_btn = QPushButton("删除")
             del_btn.clicked.connect(lambda: self.delete_task(task['id']))
@@ -532,14 +756,112 @@ class TaskTab(QWidget):
             layout.addWidget(del_btn)
             layout.addStretch()
             
-            self.task_table.setCellWidget(row, 5, cell_widget)
+            self.task_table.setCellWidget(row, 7, cell_widget)
+
+    def _set_progress_cells(self, row, task):
+        progress = task.get('progress') or {}
+        total = len(task.get('contacts') or ())
+        text = f"成功 {progress.get('sent', 0)} / 失败 {progress.get('failed', 0)} / 共 {total}"
+        self.task_table.setItem(row, 5, QTableWidgetItem(text))
+        rate = task.get('_rate')
+        self.task_table.setItem(row, 6, QTableWidgetItem(f"{rate:.1f} 条/分" if rate else ""))
+
+    def _on_task_progress(self, task_id, state):
+        """每发完一个对象增量更新计数与速度，只重绘进度两列"""
+        row = self._task_rows.get(task_id)
+        if row is None:
+            return
+        task = self.scheduled_tasks[row]
+        progress = task.setdefault('progress', {})
+        if progress.get('pending', 0) > 0:
+            progress['pending'] -= 1
+        progress[state] = progress.get(state, 0) + 1
+        if state == 'sent':
+            task['_run_sent'] = task.get('_run_sent', 0) + 1
+        elapsed = time.monotonic() - task.get('_run_started', time.monotonic())
+        if elapsed > 0:
+            task['_rate'] = task.get('_run_sent', 0) * 60.0 / elapsed
+        self._set_progress_cells(row, task)
+
+    def _selected_task_rows(self):
+        return sorted({idx.row() for idx in self.task_table.selectedIndexes()
+                       if 0 <= idx.row() < len(self.scheduled_tasks)})
+
+    def retry_failed_contacts(self):
+        """选中任务的失败对象重新排队并立即执行"""
+        rows = self._selected_task_rows()
+        if not rows:
+            QMessageBox.information(self, "提示", "请先选择要重发的任务")
+            return
+        total = 0
+        for row in rows:
+            task = self.scheduled_tasks[row]
+            if task.get('status') == '执行中':
+                continue
+            count = self.task_runner.retry_failed(task)
+            if not count:
+                continue
+            total += count
+            self._refresh_task_row(task)
+        QMessageBox.information(self, "提示", f"已重新排队 {total} 个发送失败的对象" if total else "选中的任务没有发送失败的对象")
+
+    def show_delivery_log(self):
+        """查看选中任务逐个对象的发送记录"""
+        rows = self._selected_task_rows()
+        if not rows:
+            QMessageBox.information(self, "提示", "请先选择任务")
+            return
+        task = self.scheduled_tasks[rows[0]]
+        log = self.task_store.delivery_log(task['id'])
+        states = {'pending': '待发送', 'sending': '发送中', 'sent': '已发送', 'failed': '失败'}
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"发送明细 - {task['name']}")
+        dialog.resize(700, 450)
+        layout = QVBoxLayout(dialog)
+        table = QTableWidget(len(log), 6)
+        table.setHorizontalHeaderLabels(["昵称", "wxid", "状态", "耗时(ms)", "时间", "错误"])
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setStretchLastSection(True)
+        for i, entry in enumerate(log):
+            latency = entry.get('latency_ms')
+            updated = entry.get('updated_at')
+            values = [
+                entry.get('nickname', ''), entry['wxid'], states.get(entry['state'], entry['state']),
+                f"{latency:.0f}" if latency is not None else "",
+                datetime.fromtimestamp(updated).strftime('%Y-%m-%d %H:%M:%S') if updated else "",
+                entry.get('error', '')
+            ]
+            for column, value in enumerate(values):
+                table.setItem(i, column, QTableWidgetItem(str(value)))
+        layout.addWidget(table)
+        btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        btns.rejected.connect(dialog.reject)
+        layout.addWidget(btns)
+        dialog.exec()
 
     def refresh_task_table_async(self):
         QTimer.singleShot(0, self.update_task_table)
 
     def delete_task(self, task_id):
-        self.scheduled_tasks = [task for task in self.scheduled_tasks if task['id'] != task_id]
-        self.update_task_table()
+        self._remove_tasks({task_id})
+
+    def _remove_tasks(self, ids):
+        """删除任务：取消调度并只移除对应的表格行，其后各行重新编号"""
+        rows = sorted((self._task_rows[i] for i in ids if i in self._task_rows), reverse=True)
+        if not rows:
+            return
+        try:
+            self.task_runner.delete_tasks(ids)
+        except Exception as e:
+            print(f"删除定时任务记录失败: {e}")
+        for row in rows:
+            self.task_table.removeRow(row)
+        self.scheduled_tasks = [t for t in self.scheduled_tasks if t['id'] not in ids]
+        self._task_rows = {task['id']: i for i, task in enumerate(self.scheduled_tasks)}
+        for row in range(rows[-1], len(self.scheduled_tasks)):
+            self.task_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
 
     def delete_selected_tasks(self):
         rows = sorted({idx.row() for idx in self.task_table.selectedIndexes()}, reverse=True)
@@ -552,16 +874,7 @@ class TaskTab(QWidget):
                 ids.append(self.scheduled_tasks[r]['id'])
         if not ids:
             return
-        self.scheduled_tasks = [t for t in self.scheduled_tasks if t['id'] not in ids]
-        self.update_task_table()
-
-    def check_scheduled_tasks(self):
-        current_time = int(time.time())
-        for task in self.scheduled_tasks:
-            if task['status'] == '等待中' and current_time >= task['schedule_time']:
-                task['status'] = '执行中'
-                self.refresh_task_table_async()
-                threading.Thread(target=self.execute_task, args=(task,), daemon=True).start()
+        self._remove_tasks(set(ids))
 
     def edit_task(self, row_index: int):
         if row_index < 0 or row_index >= len(self.scheduled_tasks):
@@ -578,6 +891,26 @@ class TaskTab(QWidget):
         time_edit.setCalendarPopup(True)
         time_edit.setDateTime(QDateTime.fromSecsSinceEpoch(int(task.get('schedule_time', int(time.time())+300))))
         form.addRow("发送时间:", time_edit)
+        repeat_edit = QLineEdit(task.get('repeat', ''))
+        repeat_edit.setPlaceholderText("留空为只发送一次")
+        repeat_edit.setToolTip(REPEAT_HELP)
+        repeat_preview_btn = QPushButton("预览")
+        def preview_edit_repeat():
+            try:
+                if parse_recurrence(repeat_edit.text()) is None:
+                    QMessageBox.information(dialog, "提示", "未设置重复，任务只在发送时间发送一次")
+                    return
+            except ValueError as e:
+                QMessageBox.warning(dialog, "提示", str(e))
+                return
+            self._show_repeat_preview(repeat_edit.text().strip(), time_edit.dateTime().toSecsSinceEpoch(), dialog)
+        repeat_preview_btn.clicked.connect(preview_edit_repeat)
+        repeat_row = QHBoxLayout()
+        repeat_row.addWidget(repeat_edit)
+        repeat_row.addWidget(repeat_preview_btn)
+        repeat_container = QWidget()
+        repeat_container.setLayout(repeat_row)
+        form.addRow("重复规则:", repeat_container)
         min_delay_edit = QLineEdit(str(task.get('min_delay', 1)))
         max_delay_edit = QLineEdit(str(task.get('max_delay', 3)))
         delay_row = QHBoxLayout()
@@ -621,14 +954,26 @@ class TaskTab(QWidget):
                 mx = int(max_delay_edit.text()) if max_delay_edit.text().isdigit() else mn
                 if mx < mn:
                     mx = mn
+                repeat = repeat_edit.text().strip()
+                recurrence = parse_recurrence(repeat)
+                fire_time = int(dt.toSecsSinceEpoch())
+                if recurrence is not None:
+                    fire_time = recurrence.first_at_or_after(fire_time)
 
                 task['name'] = name
-                task['schedule_time'] = int(dt.toSecsSinceEpoch())
+                task['schedule_time'] = fire_time
+                task['repeat'] = repeat
                 task['min_delay'] = mn
                 task['max_delay'] = mx
                 task['message_text'] = text_edit.toPlainText()
                 task['image_path'] = str(img_edit.text()).strip().strip('"')
-                self.update_task_table()
+                if task.get('status') in ('已过期', '已中断'):
+                    task['status'] = '等待中'
+                elif repeat and task.get('status') in ('已完成', '部分失败', '失败'):
+                    task['status'] = '等待中'
+                    task['progress'] = {'pending': self.task_store.reset_contacts(task['id'])}
+                self.task_runner.update_task(task)
+                self._refresh_task_row(task)
                 dialog.accept()
             except Exception as e:
                 QMessageBox.warning(dialog, "错误", f"保存失败: {e}")
@@ -636,43 +981,6 @@ class TaskTab(QWidget):
         btns.rejected.connect(dialog.reject)
         dialog.exec()
 
-    def execute_task(self, task):
-        """执行定时任务"""
-        try:
-            contacts = task['contacts']
-            message_text = task['message_text']
-            image_path = task['image_path']
-            min_delay = task['min_delay']
-            max_delay = task['max_delay']
-
-            # 获取进程ID
-            pid = self._get_task_pid(task)
-            if not pid:
-                task['status'] = '失败'
-                self.refresh_task_table_async()
-                return
-
-            # 执行发送
-            success_count = self.send_messages(pid, contacts, message_text, image_path, min_delay, max_delay)
-            
-            task['status'] = '已完成'
-            self.refresh_task_table_async()
-            
-        except Exception:
-            task['status'] = '失败'
-            self.refresh_task_table_async()
-    
-    def _get_task_pid(self, task):
-        pid = task.get('pid')
-        if not pid and self.parent and hasattr(self.parent, 'current_account_pid'):
-            pid = getattr(self.parent, 'current_account_pid', None)
-        if not pid:
-            wechat_info = SimpleWeChatInfo()
-            accounts = wechat_info.run()
-            if accounts:
-                pid = accounts[0]['pid']
-        return pid
-
     def start_mass_send(self, contacts):
         """开始群发消息"""
         message_text = self.message_text.toPlainText()
@@ -685,277 +993,250 @@ class TaskTab(QWidget):
         if not pid:
             return
 
-        try:
-            min_delay = int(self.min_delay.text())
-            max_delay = int(self.max_delay.text())
-        except (ValueError, TypeError):
-            min_delay, max_delay = 1, 3
-
-        threading.Thread(
-            target=self.send_messages, 
-            args=(pid, contacts, message_text, image_path, min_delay, max_delay), 
-            daemon=True
-        ).start()
+        self.create_scheduled_task("立即群发", contacts, pid, run_now=True)
 
-    def send_messages(self, pid, contacts, message_text, image_path, min_delay, max_delay):
-        """发送消息给多个联系人"""
-        success_count = 0
-        
-        for contact in contacts:
-            wxid = contact.get('wxid')
-            if not wxid:
-                continue
-                
-            try:
-                # 发送文本消息
-                if message_text.strip():
-                    send_message_simple(pid, wxid, message_text)
-                
-                # 发送图片或文件
-                if image_path.strip() and os.path.exists(image_path):
-                    send_image_simple(pid, wxid, image_path)
-                
-                success_count += 1
-                
-                # 随机延迟
-                if min_delay > 0 or max_delay > 0:
-                    delay = random.randint(min_delay, max_delay)
-                    time.sleep(delay)
-                    
-            except Exception:
-                continue
-                
-        return success_count
 
+class RulesTableModel(QAbstractTableModel):
+    """自动回复规则表的数据模型：序号由行号计算，启用状态用 CheckStateRole，批量操作只发一次变更信号；
+    有问题的正则/通配符规则（set_issues）关键词标红，悬停显示原因"""
 
-class DataManager:
-    def __init__(self):
-        self.messages_file = os.path.join("config", "messages.ini")
-        os.makedirs("config", exist_ok=True)
-        
-        self.message_config = configparser.ConfigParser()
-        if os.path.exists(self.messages_file):
-            self.message_config.read(self.messages_file, encoding='utf-8')
-        
-        self.account_data_cache = {}
+    HEADERS = ["序号", "启用", "关键词", "回复内容", "适用范围", "类型", "优先级"]
 
-    def save_account_data(self, account_info, contacts, friends, groups):
-        wxid = account_info.get('wxid')
-        if not wxid:
-            return False
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rules = []
+        self._issues = {}
 
-        self.account_data_cache[wxid] = {
-            'account_info': account_info,
-            'contacts': contacts,
-            'friends': friends,
-            'groups': groups,
-            'last_update': int(time.time())
-        }
-        return True
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rules)
 
-    def update_account_remark(self, wxid, friend_wxid, new_remark):
-        account_data = self.account_data_cache.get(wxid)
-        if not account_data:
-            return False
-            
-        for friend in account_data['friends']:
-            if friend.get('wxid') == friend_wxid:
-                friend['remarks'] = new_remark
-                break
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
 
-        for contact in account_data['contacts']:
-            if contact.get('wxid') == friend_wxid:
-                contact['remarks'] = new_remark
-                break
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
 
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        rule = self._rules[index.row()]
+        column = index.column()
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            if column == 0:
+                return str(index.row() + 1)
+            if column == 2:
+                return rule['keyword']
+            if column == 3:
+                return rule['reply']
+            if column == 4:
+                return format_scope(rule) if role == Qt.ItemDataRole.EditRole else (format_scope(rule) or "全部")
+            if column == 5:
+                return MATCH_TYPES.get(rule.get('match_type', 'keyword'), '关键词')
+            if column == 6:
+                return str(rule.get('priority', 0))
+        elif role == Qt.ItemDataRole.ToolTipRole and column == 2:
+            return self._issue_for(rule)
+        elif role == Qt.ItemDataRole.ForegroundRole and column == 2:
+            return QColor("#d9534f") if self._issue_for(rule) else None
+        elif role == Qt.ItemDataRole.ToolTipRole and column == 3:
+            return TEMPLATE_HELP
+        elif role == Qt.ItemDataRole.ToolTipRole and column == 4:
+            return "格式：账号=微信号1,微信号2; 聊天=好友或群wxid; 分组=聊天分组名，留空表示全部账号和聊天"
+        elif role == Qt.ItemDataRole.ToolTipRole and column == 5:
+            return "关键词 / 正则 / 通配符（* 任意字符，? 单个字符）"
+        elif role == Qt.ItemDataRole.ToolTipRole and column == 6:
+            return "数字越大越优先；只回复一条时取优先级最高的规则"
+        elif role == Qt.ItemDataRole.CheckStateRole and column == 1:
+            return Qt.CheckState.Checked if rule['enabled'] else Qt.CheckState.Unchecked
+        elif role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == 1:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        elif index.column() >= 2:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid():
+            return False
+        rule = self._rules[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.CheckStateRole and column == 1:
+            rule['enabled'] = Qt.CheckState(value) == Qt.CheckState.Checked
+        elif role == Qt.ItemDataRole.EditRole and column == 2:
+            if not self._pattern_valid(dict(rule, keyword=str(value))):
+                return False
+            rule['keyword'] = str(value)
+        elif role == Qt.ItemDataRole.EditRole and column == 3:
+            rule['reply'] = str(value)
+        elif role == Qt.ItemDataRole.EditRole and column == 5:
+            names = {name: code for code, name in MATCH_TYPES.items()}
+            match_type = names.get(str(value).strip(), str(value).strip())
+            if match_type not in MATCH_TYPES or not self._pattern_valid(dict(rule, match_type=match_type)):
+                return False
+            rule.pop('match_type', None)
+            if match_type in PATTERN_TYPES:
+                rule['match_type'] = match_type
+        elif role == Qt.ItemDataRole.EditRole and column == 6:
+            try:
+                priority = int(str(value).strip() or 0)
+            except ValueError:
+                return False
+            rule.pop('priority', None)
+            if priority:
+                rule['priority'] = priority
+        elif role == Qt.ItemDataRole.EditRole and column == 4:
+            try:
+                scope = parse_scope(str(value))
+            except ValueError:
+                return False
+            for field in SCOPE_FIELDS:
+                rule.pop(field, None)
+                if scope[field]:
+                    rule[field] = scope[field]
+        else:
+            return False
+        self.dataChanged.emit(index, index, [role])
         return True
 
-    def load_account_data(self, wxid):
-        return self.account_data_cache.get(wxid)
-
-    def save_message(self, message):
+    def rules(self):
+        return [dict(rule) for rule in self._rules]
+
+    def keys(self):
+        return {rule_key(rule) for rule in self._rules}
+
+    @staticmethod
+    def _copy_rule(rule):
+        copied = {'keyword': rule['keyword'], 'reply': rule['reply'], 'enabled': rule.get('enabled', True)}
+        for field in SCOPE_FIELDS:
+            if rule.get(field):
+                copied[field] = list(rule[field])
+        # 其余字段（match_type、priority 以及以后新增的字段）原样保留，避免写回时丢失
+        for field, value in rule.items():
+            if field not in copied and field not in SCOPE_FIELDS and value not in (None, '', [], ()):
+                copied[field] = value
+        return copied
+
+    @staticmethod
+    def _pattern_valid(rule):
+        if rule.get('match_type') not in PATTERN_TYPES:
+            return True
         try:
-            message_id = str(uuid.uuid4())
-            timestamp = message.get('timestamp', int(time.time()))
-            time_str = datetime.fromtimestamp(timestamp).strftime('%Y%m%d%H%M%S')
-
-            if 'Messages' not in self.message_config:
-                self.message_config['Messages'] = {}
-
-            self.message_config['Messages'][message_id] = time_str
-            message_section = f"Message_{message_id}"
-            
-            self.message_config[message_section] = {
-                'timestamp': str(timestamp),
-                'wxid': message.get('wxid', ''),
-                'content': message.get('content', ''),
-                'account_wxid': message.get('account', {}).get('wxid', ''),
-                'account_nickname': message.get('account', {}).get('nickname', ''),
-                'member_id': message.get('member_id', '')
-            }
-
-            with open(self.messages_file, 'w', encoding='utf-8') as f:
-                self.message_config.write(f)
+            compile_rule_pattern(rule)
             return True
-            
-        except Exception:
+        except re.error:
             return False
 
-    def load_messages(self, limit=0):
-        if not os.path.exists(self.messages_file):
-            return []
-
-        try:
-            self.message_config = configparser.ConfigParser()
-            self.message_config.read(self.messages_file, encoding='utf-8')
-
-            if 'Messages' not in self.message_config:
-                return []
-
-            message_ids = [(msg_id, time_str) for msg_id, time_str in self.message_config['Messages'].items()]
-            message_ids.sort(key=lambda x: x[1], reverse=True)
-
-            if limit > 0:
-                message_ids = message_ids[:limit]
-
-            messages = []
-            for message_id, _ in message_ids:
-                section_name = f"Message_{message_id}"
-                if section_name in self.message_config:
-                    message = self._parse_message_section(section_name)
-                    if message:
-                        messages.append(message)
-
-            return messages
-        except Exception:
-            return []
-    
-    def _parse_message_section(self, section_name):
-        try:
-            section = self.message_config[section_name]
-            message = {
-                'timestamp': int(section['timestamp']),
-                'wxid': section['wxid'],
-                'content': section['content'],
-                'account': {
-                    'wxid': section['account_wxid'],
-                    'nickname': section['account_nickname']
-                }
-            }
-            
-            if section.get('member_id'):
-                message['member_id'] = section['member_id']
-                
-            return message
-        except (KeyError, ValueError):
-            return None
+    def _issue_for(self, rule):
+        return self._issues.get((rule['keyword'], rule.get('match_type', 'keyword')))
 
-    def cleanup_old_messages(self, max_days=30):
-        if not os.path.exists(self.messages_file):
-            return 0
+    def set_issues(self, issues):
+        """issues 为规则库 pattern_issues() 的结果；有变化时刷新关键词列"""
+        issues = {(issue['keyword'], issue['match_type']): describe_pattern_issue(issue) for issue in issues}
+        if issues == self._issues:
+            return
+        self._issues = issues
+        if self._rules:
+            self.dataChanged.emit(self.index(0, 2), self.index(len(self._rules) - 1, 2),
+                                  [Qt.ItemDataRole.ToolTipRole, Qt.ItemDataRole.ForegroundRole])
+
+    def rule_at(self, row):
+        return dict(self._rules[row])
+
+    def set_rules(self, rules):
+        self.beginResetModel()
+        self._rules = [self._copy_rule(r) for r in rules]
+        self.endResetModel()
+
+    def append_rules(self, rules):
+        rules = [self._copy_rule(r) for r in rules]
+        if not rules:
+            return
+        first = len(self._rules)
+        self.beginInsertRows(QModelIndex(), first, first + len(rules) - 1)
+        self._rules.extend(rules)
+        self.endInsertRows()
+
+    def remove_rows(self, rows):
+        """删除多行：按连续区间从后往前删，每个区间只发一次信号；区间太零散时整体重置一次"""
+        rows = sorted(set(rows), reverse=True)
+        ranges = []
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            ranges.append((first, last))
+        if len(ranges) > 32:
+            removed = {row for first, last in ranges for row in range(first, last + 1)}
+            self.beginResetModel()
+            self._rules = [rule for row, rule in enumerate(self._rules) if row not in removed]
+            self.endResetModel()
+            return
+        for first, last in ranges:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rules[first:last + 1]
+            self.endRemoveRows()
+        self._emit_column_changed(0)
+
+    def set_enabled(self, rows=None, enabled=True):
+        """批量设置启用状态；rows 为 None 表示全部行，enabled 为 None 表示取反"""
+        targets = range(len(self._rules)) if rows is None else rows
+        for row in targets:
+            rule = self._rules[row]
+            rule['enabled'] = (not rule['enabled']) if enabled is None else enabled
+        self._emit_column_changed(1)
+
+    def checked_rows(self):
+        return [row for row, rule in enumerate(self._rules) if rule['enabled']]
+
+    def update_rule(self, row, rule):
+        self._rules[row].update({k: rule[k] for k in ('keyword', 'reply', 'enabled') if k in rule})
+        self.dataChanged.emit(self.index(row, 1), self.index(row, len(self.HEADERS) - 1))
+
+    def apply_diff(self, added, removed, modified):
+        """按新增/删除/修改增量更新模型，返回实际追加的规则数"""
+        rows = {rule_key(rule): row for row, rule in enumerate(self._rules)}
+        added = list(added)
+        for rule in modified:
+            row = rows.get(rule_key(rule))
+            if row is None:
+                added.append(rule)
+            else:
+                self._rules[row] = self._copy_rule(rule)
+        if modified:
+            self.dataChanged.emit(self.index(0, 1), self.index(len(self._rules) - 1, len(self.HEADERS) - 1))
+        removed_rows = [rows[rule_key(r)] for r in removed if rule_key(r) in rows]
+        if removed_rows:
+            self.remove_rows(removed_rows)
+        self.append_rules(added)
+        return len(added)
 
-        try:
-            cutoff_time = int(time.time()) - (max_days * 24 * 60 * 60)
-            
-            if 'Messages' not in self.message_config:
-                return 0
-
-            message_ids = list(self.message_config['Messages'].keys())
-            deleted_count = 0
-
-            for message_id in message_ids:
-                section_name = f"Message_{message_id}"
-                if section_name in self.message_config:
-                    timestamp = int(self.message_config[section_name]['timestamp'])
-                    if timestamp < cutoff_time:
-                        self.message_config.remove_section(section_name)
-                        del self.message_config['Messages'][message_id]
-                        deleted_count += 1
-
-            if deleted_count > 0:
-                with open(self.messages_file, 'w', encoding='utf-8') as f:
-                    self.message_config.write(f)
-
-            return deleted_count
-        except Exception:
-            return 0
+    def _emit_column_changed(self, column):
+        if self._rules:
+            self.dataChanged.emit(self.index(0, column), self.index(len(self._rules) - 1, column))
 
-    def load_all_accounts(self):
-        return self.account_data_cache.copy()
 
 class MessageReceiver(QObject):
     message_received = Signal(dict)
+    ai_reply_ready = Signal(str, str, object)
+    ai_reply_chunk = Signal(str, str, object, int)
+    rules_file_changed = Signal(object, object, object)
+    accounts_changed = Signal(object, object, object)
+    # 把后台线程中的回调转回界面线程执行（启动流程的阶段完成通知）
+    call_in_ui = Signal(object)
 
     def __init__(self):
         super().__init__()
         self.use_chinese = True
-
-class MessageMonitorManager:
-    def __init__(self, message_receiver):
-        self.message_receiver = message_receiver
-        self.monitors = {}
-        self.is_running = False
-
-    def start_monitor_for_account(self, account):
-        pid = account['pid']
-
-        if pid in self.monitors:
-            return
-
-        try:
-            monitor = WeChatMessageMonitor(pid)
-
-            def message_callback(msg_data):
-                msg_data['account'] = {
-                    'nickname': account['nickname'],
-                    'wxid': account['wxid'],
-                    'pid': pid
-                }
-
-                self.message_receiver.message_received.emit(msg_data)
-
-            monitor.set_callback(message_callback)
-
-            monitor.start()
-
-            self.monitors[pid] = monitor
-
-            return True
-        except Exception as e:
-            return False
-
-    def start_monitor_all(self):
-        if self.is_running:
-            return
-
-        wechat_info = SimpleWeChatInfo()
-        accounts = wechat_info.run()
-
-        if not accounts:
-            return
-
-        success_count = 0
-        for account in accounts:
-            if self.start_monitor_for_account(account):
-                success_count += 1
-
-        if success_count > 0:
-            self.is_running = True
-        else:
-            pass
-    def stop_monitor_all(self):
-        if not self.is_running:
-            return
-
-        for pid, monitor in list(self.monitors.items()):
-            try:
-                monitor.stop()
-            except Exception as e:
-                pass
-        self.monitors.clear()
-        self.is_running = False
-    def get_contact_name(self, wxid):
-        return wxid
+        self.call_in_ui.connect(lambda callback: callback())
 
 class SendMessageDialog(QDialog):
     def __init__(self, friend_name, parent=None, wxid=None, pid=None):
@@ -1098,30 +1379,35 @@ class WeChatManagerApp(QMainWindow):
         self.resize(1000, 800)
 
         self.data_manager = DataManager()
-        self.wechat_service = get_wechat_service()
-        self.wechat_info = SimpleWeChatInfo()  # 初始化wechat_info属性
 
         self.message_receiver = MessageReceiver()
-        self.monitor_manager = MessageMonitorManager(self.message_receiver)
+        self.monitor_manager = MessageMonitorManager(self.message_receiver.message_received.emit)
         self.message_receiver.message_received.connect(self.on_message_received)
+        self.message_receiver.ai_reply_ready.connect(self.on_ai_reply_ready)
+        self.message_receiver.ai_reply_chunk.connect(self.on_ai_reply_chunk)
+        self.message_receiver.rules_file_changed.connect(self.apply_rules_diff)
+        get_rules_store().add_listener(self.message_receiver.rules_file_changed.emit)
+        self.message_receiver.accounts_changed.connect(self.on_accounts_changed)
+        get_account_registry().add_listener(self.message_receiver.accounts_changed.emit)
 
         self.notebook = QTabWidget()
         self.setCentralWidget(self.notebook)
+        self._lazy_tabs = {}
 
         self.account_tab = QWidget()
         self.notebook.addTab(self.account_tab, "主界面")
 
-        self.add_friend_tab = QWidget()
-        self.notebook.addTab(self.add_friend_tab, "添加好友")
-
-        self.auto_reply_tab = QWidget()
-        self.notebook.addTab(self.auto_reply_tab, "自动回复")
+        # 添加好友、自动回复、AI助手三页在第一次切换到时才构建
+        self.add_friend_tab = self._add_lazy_tab("添加好友", self.init_add_friend_tab)
+        self.auto_reply_tab = self._add_lazy_tab("自动回复", self._build_auto_reply_tab)
 
-        self.task_tab = TaskTab(self)
+        # 定时群发页同时负责调度已保存的任务，启动时就要构建
+        with _startup_profile.stage("构建标签页: 定时群发"):
+            self.task_tab = TaskTab(self)
         self.notebook.addTab(self.task_tab, "定时群发")
 
-        self.ai_assistant_tab = AIAssistantTab()
-        self.notebook.addTab(self.ai_assistant_tab, "AI助手")
+        self.ai_assistant_tab = self._add_lazy_tab("AI助手", self.init_ai_assistant_tab)
+        self.notebook.currentChanged.connect(self._on_tab_changed)
 
         self.friend_id_input = QLineEdit()
         self.greeting_input = QLineEdit()
@@ -1146,6 +1432,9 @@ class WeChatManagerApp(QMainWindow):
         self.data_save_timer = QTimer()
         self.data_save_timer.setSingleShot(True)
         self.data_save_timer.timeout.connect(self.save_rules_data)
+        self.rules_watch_timer = QTimer()
+        self.rules_watch_timer.timeout.connect(lambda: get_rules_store().reload_if_changed())
+        self.rules_watch_timer.start(2000)
 
         self.opening_wechat = False
 
@@ -1153,26 +1442,87 @@ class WeChatManagerApp(QMainWindow):
 
         self.specific_friend_wxids = set()
         self.specific_group_wxids = set()
+        self.yuanbao_wxid = YUANBAO_WXID
+
+        # 自动回复与无界面模式共用同一个引擎：设置取自界面开关，延时发送回到界面线程执行
+        self.reply_engine = ReplyEngine(
+            settings=self._reply_settings_from_widgets,
+            find_contact=self._find_contact,
+            schedule=lambda delay, callback: QTimer.singleShot(int(delay * 1000), callback),
+            sender=self._engine_send,
+            data_manager=self.data_manager
+        )
+        self.reply_engine.on_ai_reply = self.message_receiver.ai_reply_ready.emit
+        self.reply_engine.on_ai_chunk = self.message_receiver.ai_reply_chunk.emit
 
-        self.init_account_tab()
-        self.init_add_friend_tab()
-        self.init_auto_reply_tab()
+        with _startup_profile.stage("构建标签页: 主界面"):
+            self.init_account_tab()
 
         self.all_contacts = []
 
         self.statusBar().showMessage("正在初始化...", 3000)
 
-        QTimer.singleShot(500, self.detect_wechat_accounts)
-
-        QTimer.singleShot(1000, self.start_message_monitoring)
+        self.startup_timestamp = int(time.time())
 
-        QTimer.singleShot(2500, self.load_rules_data)
+        # 启动顺序：规则加载完成、账号发现完成后立即启动消息监听，
+        # 避免监听先于规则启动导致开头几秒的消息按空规则处理
+        self.startup_sequence = StartupSequence(dispatch=self.message_receiver.call_in_ui.emit)
+        self.startup_sequence.add("加载规则", self.load_rules_data)
+        self.startup_sequence.add("账号发现", self._discover_accounts, background=True,
+                                  on_done=self._show_accounts)
+        self.startup_sequence.add("启动监听", self._start_monitors_with_discovered_accounts,
+                                  after=("加载规则", "账号发现"), background=True,
+                                  on_done=self._on_monitoring_started)
+        self.startup_sequence.start()
+        # 账号发现完成后由后台线程监视微信进程的启动与退出，账号变化通过 accounts_changed 通知
+        self.startup_sequence.when_done(("账号发现",), get_account_registry().start_watcher)
+
+    def _add_lazy_tab(self, title, builder):
+        """添加一个空白标签页，第一次切换到（或其它功能需要它的控件）时才调用 builder 构建内容"""
+        tab = QWidget()
+        self.notebook.addTab(tab, title)
+        self._lazy_tabs[tab] = (title, builder)
+        return tab
+
+    def _tab_built(self, tab):
+        return tab not in self._lazy_tabs
+
+    def _ensure_tab(self, tab):
+        """确保标签页已构建，返回该标签页"""
+        entry = self._lazy_tabs.pop(tab, None)
+        if entry is not None:
+            title, builder = entry
+            with _startup_profile.stage(f"构建标签页: {title}"):
+                builder()
+        return tab
+
+    def _on_tab_changed(self, index):
+        self._ensure_tab(self.notebook.widget(index))
+
+    def _build_auto_reply_tab(self):
+        self.init_auto_reply_tab()
+        self.load_rules_data()
+        pending, self.auto_reply_history_data = self.auto_reply_history_data, []
+        for message_data in pending:
+            self.add_message_to_auto_reply_history(message_data)
 
-        self.startup_timestamp = int(time.time())
+    def init_ai_assistant_tab(self):
+        from aizhuli_combined import AIAssistantTab
+        layout = QVBoxLayout(self.ai_assistant_tab)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.ai_assistant = AIAssistantTab()
+        layout.addWidget(self.ai_assistant)
 
     def closeEvent(self, event):
         """确保应用关闭时干净地停止所有监控、线程与定时器。"""
         try:
+            try:
+                registry = get_account_registry()
+                registry.stop_watcher()
+                registry.remove_listener(self.message_receiver.accounts_changed.emit)
+                get_process_pool().close_all()
+            except Exception:
+                pass
             try:
                 if hasattr(self, 'monitor_manager') and self.monitor_manager:
                     try:
@@ -1183,6 +1533,20 @@ class WeChatManagerApp(QMainWindow):
                     self.monitor_manager.stop_monitor_all()
             except Exception as e:
                 pass
+            try:
+                self.reply_engine.shutdown()
+                if 'ai_worker' in sys.modules:
+                    from ai_worker import get_ai_reply_worker
+                    get_ai_reply_worker().shutdown()
+            except Exception:
+                pass
+            try:
+                if self.data_changed:
+                    self.save_rules_data()
+                get_rules_store().flush()
+                get_send_pacer().flush()
+            except Exception:
+                pass
             try:
                 contact_monitors = getattr(self, 'contact_monitors', {}) or {}
                 for pid, mon in list(contact_monitors.items()):
@@ -1197,7 +1561,7 @@ class WeChatManagerApp(QMainWindow):
                 pass
             # 3) 停止所有定时器（包含 monitor_check_timer、data_save_timer、任务定时器等）
             try:
-                for name in ('monitor_check_timer', 'data_save_timer'):
+                for name in ('monitor_check_timer', 'data_save_timer', 'rules_watch_timer'):
                     t = getattr(self, name, None)
                     if t:
                         try:
@@ -1209,10 +1573,9 @@ class WeChatManagerApp(QMainWindow):
                     if hasattr(self, 'notebook'):
                         for i in range(self.notebook.count()):
                             w = self.notebook.widget(i)
-                            if hasattr(w, 'task_timer') and getattr(w, 'task_timer'):
+                            if getattr(w, 'task_runner', None):
                                 try:
-                                    w.task_timer.stop()
-                                    w.task_timer.deleteLater()
+                                    w.task_runner.stop()
                                 except Exception:
                                     pass
                 except Exception:
@@ -1547,7 +1910,8 @@ class WeChatManagerApp(QMainWindow):
 
         self.load_add_friend_data()
 
-        QTimer.singleShot(500, self.start_monitoring)
+        # 账号发现完成后再启动联系人监听（启动流程已完成时立即启动）
+        self.startup_sequence.when_done(("账号发现",), self.start_monitoring)
 
 
     def _init_simple_add_friend_tab(self):
@@ -1690,6 +2054,24 @@ class WeChatManagerApp(QMainWindow):
         self.exact_match_switch.stateChanged.connect(self.on_exact_match_switch)
         match_layout.addWidget(self.exact_match_switch)
 
+        match_layout.addSpacing(15)
+        match_layout.addWidget(QLabel("命中多条时："))
+        self.match_mode_combo = QComboBox()
+        self.match_mode_combo.addItem("全部回复", "all")
+        self.match_mode_combo.addItem("只回复优先级最高的一条", "first")
+        self.match_mode_combo.currentIndexChanged.connect(lambda *_: self.mark_data_changed())
+        match_layout.addWidget(self.match_mode_combo)
+
+        match_layout.addSpacing(15)
+        match_layout.addWidget(QLabel("正则匹配限时："))
+        self.match_budget = QLineEdit("50")
+        self.match_budget.setFixedWidth(25)
+        self.match_budget.setMaximumHeight(25)
+        self.match_budget.setToolTip("每条消息执行正则/通配符规则的总时长上限，超出后跳过剩余规则；多次超时的规则会被暂停")
+        self.match_budget.textChanged.connect(lambda *_: self.mark_data_changed())
+        match_layout.addWidget(self.match_budget)
+        match_layout.addWidget(QLabel("毫秒"))
+
         match_layout.addStretch()
         switch_layout.addLayout(match_layout)
 
@@ -1708,6 +2090,16 @@ class WeChatManagerApp(QMainWindow):
         self.max_interval.setMaximumHeight(25)
         interval_layout.addWidget(self.max_interval)
 
+        interval_layout.addWidget(QLabel("秒"))
+
+        interval_layout.addSpacing(15)
+        interval_layout.addWidget(QLabel("连续消息合并等待："))
+        self.coalesce_window = QLineEdit(DEFAULT_RULE_SETTINGS['coalesce_window'])
+        self.coalesce_window.setFixedWidth(25)
+        self.coalesce_window.setMaximumHeight(25)
+        self.coalesce_window.setToolTip("同一人连续发来的多条消息在该时间内合并为一次AI回复，0 表示不合并")
+        self.coalesce_window.textChanged.connect(lambda *_: self.mark_data_changed())
+        interval_layout.addWidget(self.coalesce_window)
         interval_layout.addWidget(QLabel("秒"))
         interval_layout.addStretch()
         switch_layout.addLayout(interval_layout)
@@ -1718,15 +2110,13 @@ class WeChatManagerApp(QMainWindow):
         rules_group = QGroupBox("自动回复规则")
         rules_layout = QVBoxLayout()
 
-        self.rules_table = QTableWidget()
-        self.rules_table.setColumnCount(4)
-        self.rules_table.setHorizontalHeaderLabels([
-            "序号", "启用", "关键词", "回复内容"
-        ])
+        self.rules_model = RulesTableModel(self)
+        self.rules_table = QTableView()
+        self.rules_table.setModel(self.rules_model)
 
-        self.rules_table.setEditTriggers(QTableWidget.EditTrigger.DoubleClicked)
-        self.rules_table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
-        self.rules_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.rules_table.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
+        self.rules_table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.rules_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.rules_table.verticalHeader().setVisible(False)
         self.rules_table.setAlternatingRowColors(True)
 
@@ -1736,17 +2126,25 @@ class WeChatManagerApp(QMainWindow):
         header = self.rules_table.horizontalHeader()
         header.setDefaultSectionSize(150)
         header.setStretchLastSection(True)
-        for i in range(self.rules_table.columnCount()):
+        for i in range(self.rules_model.columnCount()):
             header.setSectionResizeMode(i, QHeaderView.ResizeMode.Interactive)
         header.resizeSection(0, 50)
         header.resizeSection(1, 50)  
-        for i in range(2, self.rules_table.columnCount()):
+        for i in range(2, self.rules_model.columnCount()):
             header.resizeSection(i, 150)
 
-        self.rules_table.itemChanged.connect(self.on_data_changed)
+        self.rules_model.dataChanged.connect(self.on_data_changed)
+        self.rules_model.rowsInserted.connect(self.on_data_changed)
+        self.rules_model.rowsRemoved.connect(self.on_data_changed)
 
         rules_layout.addWidget(self.rules_table)
 
+        self.rule_warning_label = QLabel()
+        self.rule_warning_label.setStyleSheet("color: #d9534f;")
+        self.rule_warning_label.setWordWrap(True)
+        self.rule_warning_label.setVisible(False)
+        rules_layout.addWidget(self.rule_warning_label)
+
         button_layout = QHBoxLayout()
         add_rule_btn = QPushButton("添加规则")
         import_rules_btn = QPushButton("导入规则")
@@ -1822,25 +2220,47 @@ class WeChatManagerApp(QMainWindow):
         self.detect_button.setEnabled(False)
 
         try:
-            self.account_tree.clear()
-            accounts = self.wechat_service.get_all_accounts(force_refresh=True)
-
-            if accounts:
-                for i, account in enumerate(accounts):
-                    item = QTreeWidgetItem([
-                        str(i + 1),
-                        account["nickname"],
-                        account["wxid"],
-                        account["phone"]
-                    ])
-                    self.account_tree.addTopLevelItem(item)
-            else:
-                QMessageBox.information(self, "提示", "未能获取到微信账号信息", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
+            self._show_accounts(self._discover_accounts())
         except Exception as e:
             QMessageBox.critical(self, "错误", f"检测微信账号失败: {str(e)}", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
         finally:
             self.detect_button.setEnabled(True)
 
+    def _discover_accounts(self):
+        """重新枚举已登录账号（启动时在后台线程中执行）"""
+        return get_account_registry().refresh()
+
+    def _show_accounts(self, accounts):
+        self._fill_account_tree(accounts)
+        if not accounts:
+            QMessageBox.information(self, "提示", "未能获取到微信账号信息", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
+
+    def _fill_account_tree(self, accounts):
+        self.account_tree.clear()
+        for i, account in enumerate(accounts or []):
+            item = QTreeWidgetItem([
+                str(i + 1),
+                account["nickname"],
+                account["wxid"],
+                account.get("phone", "")
+            ])
+            self.account_tree.addTopLevelItem(item)
+
+    def on_accounts_changed(self, accounts, added, removed):
+        """微信进程启动/退出导致已登录账号变化：刷新账号列表，为新账号启动监听、停止已退出账号的监听"""
+        try:
+            self._fill_account_tree(accounts)
+            self.monitor_manager.sync_accounts(added, removed)
+            if getattr(self, 'current_account_pid', None) in {account['pid'] for account in removed}:
+                self.current_account_pid = None
+            if self._tab_built(self.add_friend_tab):
+                self.start_monitoring()
+            changes = [f"{account.get('nickname', account['pid'])} 已登录" for account in added]
+            changes += [f"{account.get('nickname', account['pid'])} 已退出" for account in removed]
+            self.statusBar().showMessage("微信账号变化: " + "，".join(changes), 5000)
+        except Exception as e:
+            print(f"处理账号变化失败: {e}")
+
     def open_new_wechat_instance(self):
         if self.opening_wechat:
             QMessageBox.information(self, "提示", "正在启动微信，请稍候...", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
@@ -1851,7 +2271,7 @@ class WeChatManagerApp(QMainWindow):
             self.open_button.setEnabled(False)
             self.open_button.setText("正在启动...")
 
-            start_new_wechat()
+            get_wechat_backend().start_client()
 
         except Exception as e:
             QMessageBox.critical(self, "错误", f"打开新微信失败: {str(e)}", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
@@ -2023,7 +2443,7 @@ class WeChatManagerApp(QMainWindow):
             return
 
         try:
-            wechat_pids = self.wechat_info.find_all_wechat_processes()
+            wechat_pids = get_account_registry().pids()
             if not wechat_pids:
                 status_label.setText("未找到微信进程，请确保微信已启动")
                 status_label.setStyleSheet(f"color: {StyleSheet.ERROR_COLOR}")
@@ -2033,23 +2453,19 @@ class WeChatManagerApp(QMainWindow):
             status_label.setStyleSheet(f"color: {StyleSheet.INFO_COLOR}")
             QApplication.processEvents()
 
-            remark_modifier = RemarkModifier()
-
             selected_pid = getattr(self, 'current_account_pid', None)
             if selected_pid not in (wechat_pids or []):
                 selected_pid = wechat_pids[0]
 
-            result = remark_modifier.modify_remark(selected_pid, wxid, new_remark)
+            result = get_wechat_backend().modify_remark(selected_pid, wxid, new_remark)
 
             if result:
                 status_label.setText("备注修改成功！")
                 status_label.setStyleSheet(f"color: {StyleSheet.SUCCESS_COLOR}")
 
-                wechat_info = SimpleWeChatInfo()
-                accounts = wechat_info.run()
-                if accounts:
-                    matched = next((acc for acc in accounts if acc.get('pid') == selected_pid), None) or accounts[0]
-
+                registry = get_account_registry()
+                matched = registry.get(selected_pid) or registry.get(registry.default_pid())
+                if matched:
                     self.data_manager.update_account_remark(
                         matched.get('wxid', ''),
                         wxid,
@@ -2073,7 +2489,7 @@ class WeChatManagerApp(QMainWindow):
                 print(f"备注修改失败：参数无效 wxid={wxid}, remark={new_remark}")
                 return False
             
-            wechat_pids = self.wechat_info.find_all_wechat_processes()
+            wechat_pids = get_account_registry().pids()
             if not wechat_pids:
                 print("备注修改失败：未找到微信进程")
                 return False
@@ -2089,17 +2505,16 @@ class WeChatManagerApp(QMainWindow):
                 selected_pid = wechat_pids[0]
                 print(f"回退到第一个微信进程PID: {selected_pid}")
             
-            modifier = RemarkModifier()
             print(f"开始修改备注：wxid={wxid}, remark={new_remark.strip()}, pid={selected_pid}")
             
-            ok = modifier.modify_remark(selected_pid, wxid, new_remark.strip())
+            ok = get_wechat_backend().modify_remark(selected_pid, wxid, new_remark.strip())
             
             if ok:
                 print(f"备注修改成功：{wxid} -> {new_remark.strip()}")
                 try:
-                    accounts = SimpleWeChatInfo().run()
-                    if accounts:
-                        matched = next((acc for acc in accounts if acc.get('pid') == selected_pid), None) or accounts[0]
+                    registry = get_account_registry()
+                    matched = registry.get(selected_pid) or registry.get(registry.default_pid())
+                    if matched:
                         self.data_manager.update_account_remark(
                             matched.get('wxid', ''),
                             wxid,
@@ -2108,7 +2523,7 @@ class WeChatManagerApp(QMainWindow):
                 except Exception as e:
                     print(f"更新数据管理器失败: {e}")
             else:
-                print(f"备注修改失败：RemarkModifier.modify_remark返回False")
+                print(f"备注修改失败：modify_remark返回False")
             
             return ok
         except Exception as e:
@@ -2217,7 +2632,9 @@ class WeChatManagerApp(QMainWindow):
                     resolved = self.resolve_sender_nickname(sender_wxid)
                     if resolved:
                         sender_nickname = resolved
-                        
+
+            # 添加好友页还没打开过时，先构建它以读取保存的添加记录
+            self._ensure_tab(self.add_friend_tab)
             if not hasattr(self, 'add_friend_table') or self.add_friend_table is None:
                 print("添加好友表格不存在，跳过")
                 return
@@ -2356,14 +2773,17 @@ class WeChatManagerApp(QMainWindow):
             if index < 0:
                 return
 
-            wechat_info = SimpleWeChatInfo()
-            accounts = wechat_info.run()
+            registry = get_account_registry()
+            account = registry.by_wxid(item.text(2))
+            if account is None:
+                accounts = registry.accounts()
+                account = accounts[index] if index < len(accounts) else None
 
-            if not accounts or index >= len(accounts):
+            if not account:
                 QMessageBox.warning(self, "获取失败", "无法获取选中账号信息", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
                 return
 
-            selected_pid = accounts[index]['pid']
+            selected_pid = account['pid']
 
             try:
                 self.current_account_pid = selected_pid
@@ -2376,7 +2796,7 @@ class WeChatManagerApp(QMainWindow):
             self.friend_tree.clear()
             self.group_tree.clear()
 
-            self.statusBar().showMessage(f"正在加载账号 {accounts[index]['nickname']} 的联系人数据，请稍候...")
+            self.statusBar().showMessage(f"正在加载账号 {account['nickname']} 的联系人数据，请稍候...")
 
             try:
                 def update_progress(current, total, contact):
@@ -2388,7 +2808,7 @@ class WeChatManagerApp(QMainWindow):
                             self.statusBar().showMessage(f"读取联系人完成 {percent}%")
                     QApplication.processEvents()
 
-                resources = get_wechat_resources(selected_pid, update_progress)
+                resources = get_wechat_backend().get_resources(selected_pid, update_progress)
 
                 if resources:
                     filtered_contacts = [contact for contact in resources['contacts']
@@ -2504,11 +2924,13 @@ class WeChatManagerApp(QMainWindow):
             self.handle_scheduled_message_for_friends(selected_items)
         elif action == specify_reply_action:
             try:
+                self._ensure_tab(self.auto_reply_tab)
                 for item in selected_items:
                     wxid_item = item.text(2)
                     if wxid_item:
                         self.specific_friend_wxids.add(wxid_item)
                 self.update_specific_selected_lists()
+                self.mark_data_changed()
 
                 self.notebook.setCurrentWidget(self.auto_reply_tab)
                 self.statusBar().showMessage(f"已添加{len(selected_items)}个好友到指定回复", 3000)
@@ -2547,11 +2969,13 @@ class WeChatManagerApp(QMainWindow):
             self.handle_scheduled_message_for_groups(selected_items)
         elif action == specify_reply_action:
             try:
+                self._ensure_tab(self.auto_reply_tab)
                 for item in selected_items:
                     group_wxid = item.text(2)
                     if group_wxid:
                         self.specific_group_wxids.add(group_wxid)
                 self.update_specific_selected_lists()
+                self.mark_data_changed()
 
                 self.notebook.setCurrentWidget(self.auto_reply_tab)
                 self.statusBar().showMessage(f"已添加{len(selected_items)}个群到指定回复", 3000)
@@ -2568,7 +2992,7 @@ class WeChatManagerApp(QMainWindow):
             def progress_callback(current, total, member):
                 pass
 
-            members = get_group_members(pid, group_id, progress_callback)
+            members = get_wechat_backend().get_group_members(pid, group_id, progress_callback)
 
             for i, member in enumerate(members, 1):
                 nickname = member.get("nickname", "无昵称")
@@ -2589,30 +3013,17 @@ class WeChatManagerApp(QMainWindow):
             QMessageBox.critical(self, "错误", f"获取群成员失败: {str(e)}", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
 
     def _get_wechat_pid(self):
-        wechat_info = SimpleWeChatInfo()
-        accounts = wechat_info.run()
+        pid = get_account_registry().default_pid(getattr(self, 'current_account_pid', None))
 
-        if not accounts:
+        if not pid:
             QMessageBox.warning(self, "发送失败", "未找到已登录的微信账号", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
             return None
 
-        try:
-            selected_pid = getattr(self, 'current_account_pid', None)
-            if selected_pid:
-                for acc in accounts:
-                    if acc.get('pid') == selected_pid:
-                        return selected_pid
-        except Exception:
-            pass
-
-        if len(accounts) == 1:
-            return accounts[0]['pid']
-
-        return accounts[0]['pid']
+        return pid
 
     def _handle_send_failure_simple(self, current_pid, target_id, content, is_group=False):
         try:
-            retry_result = send_message_simple(current_pid, target_id, content)
+            retry_result = get_wechat_backend().send_message_simple(current_pid, target_id, content)
             if retry_result:
                 pass
             else:
@@ -2624,7 +3035,7 @@ class WeChatManagerApp(QMainWindow):
             current_pid = pid if pid else self._get_wechat_pid()
             if not current_pid:
                 return False
-            return send_message_to_wxid(current_pid, wxid, content)
+            return get_wechat_backend().send_message_to_wxid(current_pid, wxid, content)
         except Exception as e:
             QMessageBox.warning(self, "发送失败", f"发送消息时出错: {str(e)}", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
             return False
@@ -2635,7 +3046,7 @@ class WeChatManagerApp(QMainWindow):
             if not current_pid:
                 return False
 
-            return send_image_to_wxid(current_pid, wxid, image_path)
+            return get_wechat_backend().send_image_to_wxid(current_pid, wxid, image_path)
         except Exception as e:
             QMessageBox.warning(self, "发送失败", f"发送图片时出错: {str(e)}", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
             return False
@@ -2664,6 +3075,7 @@ class WeChatManagerApp(QMainWindow):
             self.friend_id_input.setText(member_wxid)
             self.greeting_input.setText(f"您好，我是通过群聊认识您的，想添加您为好友")
 
+            self._ensure_tab(self.add_friend_tab)
             self.notebook.setCurrentWidget(self.add_friend_tab)
 
             reply = QMessageBox.question(self, "添加好友",
@@ -2681,6 +3093,7 @@ class WeChatManagerApp(QMainWindow):
 
     def detect_wechat_for_add_friend(self):
         try:
+            import psutil
             wechat_pids = [p.pid for p in psutil.process_iter() if 'WeChat.exe' in p.name()]
 
             if wechat_pids:
@@ -2688,8 +3101,7 @@ class WeChatManagerApp(QMainWindow):
                 self.log_add_friend(f"找到微信进程: {wechat_pids}")
 
                 try:
-                    wechat_info = SimpleWeChatInfo()
-                    accounts = wechat_info.run()
+                    accounts = get_account_registry().accounts()
                     if accounts:
                         account = accounts[0]
                         self.log_add_friend(f"当前登录账号: {account['nickname']} ({account['wxid']})")
@@ -2729,7 +3141,7 @@ class WeChatManagerApp(QMainWindow):
 
         try:
             start_time = time.time()
-            result = add_wechat_friend(self.wechat_pid, friend_id, greeting, scene)
+            result = get_wechat_backend().add_friend(self.wechat_pid, friend_id, greeting, scene)
             end_time = time.time()
 
             self.log_add_friend(f"\n操作完成，耗时 {end_time - start_time:.2f} 秒")
@@ -2748,7 +3160,7 @@ class WeChatManagerApp(QMainWindow):
 
     def auto_fetch_contacts(self):
         try:
-            wechat_pids = self.wechat_info.find_all_wechat_processes()
+            wechat_pids = get_account_registry().pids()
             if not wechat_pids:
                 return
 
@@ -2771,7 +3183,7 @@ class WeChatManagerApp(QMainWindow):
                             self.statusBar().showMessage(f"读取联系人完成 {percent}%")
                     QApplication.processEvents()
 
-                resources = get_wechat_resources(pid, update_progress)
+                resources = get_wechat_backend().get_resources(pid, update_progress)
 
                 if resources:
                     filtered_contacts = [contact for contact in resources['contacts']
@@ -2828,7 +3240,7 @@ class WeChatManagerApp(QMainWindow):
 
                     def fetch_group_members():
                         try:
-                            all_members = get_all_group_members(pid, filtered_groups)
+                            all_members = get_wechat_backend().get_all_group_members(pid, filtered_groups)
 
                             if all_members:
                                 with_duplicates = len(self.all_contacts)
@@ -2968,7 +3380,7 @@ class WeChatManagerApp(QMainWindow):
                 account_info = message.get('account', {})
                 account_name = account_info.get('nickname', '未知账号')
 
-                parsed_content = parse_special_message(content)
+                parsed_content = get_wechat_backend().parse_special_message(content)
                 if parsed_content:
                     content = parsed_content
 
@@ -3021,8 +3433,7 @@ class WeChatManagerApp(QMainWindow):
 
     def load_all_accounts_data(self):
         try:
-            wechat_info = SimpleWeChatInfo()
-            accounts = wechat_info.run()
+            accounts = get_account_registry().accounts()
 
             if not accounts:
                 self.statusBar().showMessage("未找到已登录的微信账号", 5000)
@@ -3108,7 +3519,7 @@ class WeChatManagerApp(QMainWindow):
                         self.statusBar().showMessage(f"读取联系人完成 {percent}%")
                 QApplication.processEvents()
 
-            resources = get_wechat_resources(pid, update_progress)
+            resources = get_wechat_backend().get_resources(pid, update_progress)
 
             if resources:
                 filtered_contacts = [contact for contact in resources['contacts']
@@ -3145,62 +3556,23 @@ class WeChatManagerApp(QMainWindow):
     def save_rules_data(self):
         if hasattr(self, '_is_saving') and self._is_saving:
             return
+        if not self._tab_built(self.auto_reply_tab):
+            return
 
         try:
             self._is_saving = True
 
-            config_dir = "config"
-            os.makedirs(config_dir, exist_ok=True)
-            temp_file = os.path.join(config_dir, 'auto_reply_rules.json.tmp')
-            target_file = os.path.join(config_dir, 'auto_reply_rules.json')
-
-            rules = []
-            keywords_set = set()
-
-            for row in range(self.rules_table.rowCount()):
-                checkbox_widget = self.rules_table.cellWidget(row, 1)
-                enabled = False
-                if checkbox_widget:
-                    checkbox = checkbox_widget.findChild(QCheckBox)
-                    if checkbox:
-                        enabled = checkbox.isChecked()
-
-                keyword = self.rules_table.item(row, 2)
-                reply = self.rules_table.item(row, 3)
+            rules = {}
+            for rule in self.rules_model.rules():
+                key = rule_key(rule)
+                rules.pop(key, None)
+                rules[key] = rule
 
-                if keyword and reply:
-                    keyword_text = keyword.text()
-
-                    if keyword_text in keywords_set:
-                        rules = [r for r in rules if r['keyword'] != keyword_text]
-
-                    keywords_set.add(keyword_text)
-
-                    rule = {
-                        'keyword': keyword_text,
-                        'reply': reply.text(),
-                        'enabled': enabled
-                    }
-                    rules.append(rule)
-
-            yuanbao_enabled = getattr(self, 'yuanbao_reply_switch', None) and self.yuanbao_reply_switch.isChecked()
-            model_enabled = getattr(self, 'model_reply_switch', None) and self.model_reply_switch.isChecked()
-
-            settings = {
-                'rule_reply_enabled': self.rule_reply_switch.isChecked(),
-                'reply_friend_enabled': self.reply_friend_switch.isChecked(),
-                'reply_group_enabled': self.reply_group_switch.isChecked(),
-                'specific_friend_enabled': self.specific_friend_switch.isChecked(),
-                'specific_group_enabled': self.specific_group_switch.isChecked(),
-                'ai_reply_enabled': self.ai_reply_switch.isChecked(),
-                'yuanbao_reply_enabled': yuanbao_enabled,
-                'model_reply_enabled': model_enabled,
-                'new_friend_reply_enabled': getattr(self, 'new_friend_reply_switch', None) and self.new_friend_reply_switch.isChecked(),
-                'fuzzy_match_enabled': self.fuzzy_match_switch.isChecked(),
-                'exact_match_enabled': self.exact_match_switch.isChecked(),
-                'min_interval': self.min_interval.text(),
-                'max_interval': self.max_interval.text()
-            }
+            settings = self._reply_settings_from_widgets()
+            settings['specific_friend_wxids'] = sorted(settings['specific_friend_wxids'])
+            settings['specific_group_wxids'] = sorted(settings['specific_group_wxids'])
+            yuanbao_enabled = settings['yuanbao_reply_enabled']
+            model_enabled = settings['model_reply_enabled']
 
             try:
                 from aizhuli_combined import AIManager
@@ -3212,184 +3584,128 @@ class WeChatManagerApp(QMainWindow):
                     ai_manager.auto_reply_settings['ai_reply_mode'] = 0
             except Exception as e:
                 pass
-            new_friend_reply_content = ""
-            for rule in rules:
-                if rule['keyword'] == "我通过了你的朋友验证请求":
-                    new_friend_reply_content = rule['reply']
-                    break
-
-            if new_friend_reply_content:
-                settings['new_friend_reply_content'] = new_friend_reply_content
-
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'rules': rules,
-                    'settings': settings,
-                    'last_update': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }, f, ensure_ascii=False, indent=2)
-
-            if os.path.exists(target_file):
-                os.replace(temp_file, target_file)
-            else:
-                os.rename(temp_file, target_file)
-
-            self.statusBar().showMessage(f"规则数据已保存，共 {len(rules)} 条规则", 3000)
+            new_friend_rule = rules.get("我通过了你的朋友验证请求")
+            if new_friend_rule and new_friend_rule['reply']:
+                settings['new_friend_reply_content'] = new_friend_rule['reply']
+
+            store = get_rules_store()
+            changed = store.set_rules(rules.values())
+            changed = store.update_settings(settings) or changed
+            self.data_changed = False
+            self.refresh_rule_warnings()
+            if changed:
+                self.statusBar().showMessage(f"规则数据已保存，共 {len(rules)} 条规则", 3000)
 
         except Exception as e:
             pass
         finally:
             self._is_saving = False
 
+    def _reply_settings_from_widgets(self):
+        """当前界面上的自动回复设置（与 auto_reply_rules.json 的 settings 同名），自动回复引擎按它处理消息；
+        自动回复页还没打开过时直接使用已保存的设置"""
+        if not self._tab_built(self.auto_reply_tab):
+            return stored_reply_settings()
+        return {
+            'rule_reply_enabled': self.rule_reply_switch.isChecked(),
+            'reply_friend_enabled': self.reply_friend_switch.isChecked(),
+            'reply_group_enabled': self.reply_group_switch.isChecked(),
+            'specific_friend_enabled': self.specific_friend_switch.isChecked(),
+            'specific_group_enabled': self.specific_group_switch.isChecked(),
+            'specific_friend_wxids': self.specific_friend_wxids,
+            'specific_group_wxids': self.specific_group_wxids,
+            'ai_reply_enabled': self.ai_reply_switch.isChecked(),
+            'yuanbao_reply_enabled': bool(getattr(self, 'yuanbao_reply_switch', None) and self.yuanbao_reply_switch.isChecked()),
+            'model_reply_enabled': bool(getattr(self, 'model_reply_switch', None) and self.model_reply_switch.isChecked()),
+            'new_friend_reply_enabled': bool(getattr(self, 'new_friend_reply_switch', None) and self.new_friend_reply_switch.isChecked()),
+            'fuzzy_match_enabled': self.fuzzy_match_switch.isChecked(),
+            'exact_match_enabled': self.exact_match_switch.isChecked(),
+            'min_interval': self.min_interval.text(),
+            'max_interval': self.max_interval.text(),
+            'coalesce_window': self.coalesce_window.text(),
+            'match_mode': self.match_mode_combo.currentData(),
+            'match_budget_ms': self.match_budget.text(),
+            'yuanbao_wxid': self.yuanbao_wxid
+        }
+
     def load_rules_data(self):
         try:
-            self.rules_table.setRowCount(0)
-
-            config_dir = "config"
-            os.makedirs(config_dir, exist_ok=True)
-            rules_file = os.path.join(config_dir, 'auto_reply_rules.json')
-
-            if not os.path.exists(rules_file):
-                with open(rules_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'rules': [],
-                        'settings': {
-                            'rule_reply_enabled': False,
-                            'reply_friend_enabled': True,
-                            'reply_group_enabled': True,
-                            'specific_friend_enabled': False,
-                            'specific_group_enabled': False,
-                            'ai_reply_enabled': False,
-                            'new_friend_reply_enabled': False,
-                            'fuzzy_match_enabled': True,
-                            'exact_match_enabled': False,
-                            'min_interval': '1',
-                            'max_interval': '5'
-                        },
-                        'last_update': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }, f, ensure_ascii=False, indent=2)
-                return
+            store = get_rules_store()
+            store.load(force=True)
+            if store.load_error is not None:
+                self.statusBar().showMessage("规则配置文件格式错误，已重新初始化", 3000)
 
-            try:
-                with open(rules_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if not content:
-                        with open(rules_file, 'w', encoding='utf-8') as f:
-                            json.dump({
-                                'rules': [],
-                                'settings': {
-                                    'rule_reply_enabled': False,
-                                    'reply_friend_enabled': True,
-                                    'reply_group_enabled': True,
-                                    'specific_friend_enabled': False,
-                                    'specific_group_enabled': False,
-                                    'ai_reply_enabled': False,
-                                    'new_friend_reply_enabled': False,
-                                    'fuzzy_match_enabled': True,
-                                    'exact_match_enabled': False,
-                                    'min_interval': '1',
-                                    'max_interval': '5'
-                                },
-                                'last_update': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            }, f, ensure_ascii=False, indent=2)
-                        return
-
-                    data = json.loads(content)
-
-                    rules = data.get('rules', [])
-
-                    unique_rules = []
-                    keywords_set = set()
-
-                    for rule in rules:
-                        keyword = rule.get('keyword', '')
-                        if keyword in keywords_set:
-                            unique_rules = [r for r in unique_rules if r.get('keyword') != keyword]
-
-                        keywords_set.add(keyword)
-                        unique_rules.append(rule)
-
-                    for rule in unique_rules:
-                        keyword = rule.get('keyword', '')
-                        reply = rule.get('reply', '')
-                        enabled = rule.get('enabled', True)
-                        self.add_rule_to_table(keyword, reply, enabled)
-
-                    settings = data.get('settings', {})
-                    if settings:
-                        self.rule_reply_switch.setChecked(settings.get('rule_reply_enabled', False))
-                        self.reply_friend_switch.setChecked(settings.get('reply_friend_enabled', True))
-                        self.reply_group_switch.setChecked(settings.get('reply_group_enabled', True))
-                        self.specific_friend_switch.setChecked(settings.get('specific_friend_enabled', False))
-                        self.specific_group_switch.setChecked(settings.get('specific_group_enabled', False))
-
-                        self.ai_reply_switch.stateChanged.disconnect()
-
-                        ai_enabled = settings.get('ai_reply_enabled', False)
-                        self.ai_reply_switch.setChecked(ai_enabled)
-
-                        self.ai_reply_switch.stateChanged.connect(self.on_ai_reply_switch)
+            self.yuanbao_wxid = store.get_settings().get('yuanbao_wxid') or YUANBAO_WXID
 
-                        try:
-                            from aizhuli_combined import AIManager
-                            ai_manager = AIManager()
-                            ai_reply_mode = ai_manager.auto_reply_settings.get('ai_reply_mode', 1)
-
-                            if hasattr(self, 'yuanbao_reply_switch'):
-                                if not ai_enabled:
-                                    self.yuanbao_reply_switch.setChecked(False)
-                                    self.yuanbao_reply_switch.setEnabled(False)
-                                else:
-                                    yuanbao_enabled = settings.get('yuanbao_reply_enabled', ai_reply_mode == 1)
-                                    self.yuanbao_reply_switch.setChecked(yuanbao_enabled)
-                                    self.yuanbao_reply_switch.setEnabled(True)
-
-                            if hasattr(self, 'model_reply_switch'):
-                                if not ai_enabled:
-                                    self.model_reply_switch.setChecked(False)
-                                    self.model_reply_switch.setEnabled(False)
-                                else:
-                                    model_enabled = settings.get('model_reply_enabled', ai_reply_mode == 0)
-                                    self.model_reply_switch.setChecked(model_enabled)
-                                    self.model_reply_switch.setEnabled(True)
+            if not self._tab_built(self.auto_reply_tab):
+                return
 
-                            pass
-                        except Exception as e:
-                            if hasattr(self, 'yuanbao_reply_switch'):
-                                self.yuanbao_reply_switch.setChecked(False)
-                                self.yuanbao_reply_switch.setEnabled(False)
-                            if hasattr(self, 'model_reply_switch'):
-                                self.model_reply_switch.setChecked(False)
-                                self.model_reply_switch.setEnabled(False)
-                        if hasattr(self, 'new_friend_reply_switch'):
-                            self.new_friend_reply_switch.setChecked(settings.get('new_friend_reply_enabled', False))
-
-                        self.fuzzy_match_switch.setChecked(settings.get('fuzzy_match_enabled', True))
-                        self.exact_match_switch.setChecked(settings.get('exact_match_enabled', False))
-                        self.min_interval.setText(settings.get('min_interval', '1'))
-                        self.max_interval.setText(settings.get('max_interval', '5'))
-
-                    self.statusBar().showMessage(f"已加载 {len(unique_rules)} 条规则", 3000)
-
-            except json.JSONDecodeError:
-                with open(rules_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'rules': [],
-                        'settings': {
-                            'rule_reply_enabled': False,
-                            'reply_friend_enabled': True,
-                            'reply_group_enabled': True,
-                            'specific_friend_enabled': False,
-                            'specific_group_enabled': False,
-                            'ai_reply_enabled': False,
-                            'new_friend_reply_enabled': False,
-                            'fuzzy_match_enabled': True,
-                            'exact_match_enabled': False,
-                            'min_interval': '2',
-                            'max_interval': '5'
-                        },
-                        'last_update': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }, f, ensure_ascii=False, indent=2)
-                self.statusBar().showMessage("规则配置文件格式错误，已重新初始化", 3000)
+            rules = store.get_rules()
+            self.rules_model.set_rules(rules)
+            self.refresh_rule_warnings()
+
+            settings = store.get_settings()
+            if settings:
+                self.rule_reply_switch.setChecked(settings.get('rule_reply_enabled', False))
+                self.reply_friend_switch.setChecked(settings.get('reply_friend_enabled', True))
+                self.reply_group_switch.setChecked(settings.get('reply_group_enabled', True))
+                self.specific_friend_switch.setChecked(settings.get('specific_friend_enabled', False))
+                self.specific_group_switch.setChecked(settings.get('specific_group_enabled', False))
+                self.specific_friend_wxids = set(settings.get('specific_friend_wxids') or ())
+                self.specific_group_wxids = set(settings.get('specific_group_wxids') or ())
+                self.update_specific_selected_lists()
+
+                self.ai_reply_switch.stateChanged.disconnect()
+
+                ai_enabled = settings.get('ai_reply_enabled', False)
+                self.ai_reply_switch.setChecked(ai_enabled)
+
+                self.ai_reply_switch.stateChanged.connect(self.on_ai_reply_switch)
+
+                try:
+                    from aizhuli_combined import AIManager
+                    ai_manager = AIManager()
+                    ai_reply_mode = ai_manager.auto_reply_settings.get('ai_reply_mode', 1)
+
+                    if hasattr(self, 'yuanbao_reply_switch'):
+                        if not ai_enabled:
+                            self.yuanbao_reply_switch.setChecked(False)
+                            self.yuanbao_reply_switch.setEnabled(False)
+                        else:
+                            yuanbao_enabled = settings.get('yuanbao_reply_enabled', ai_reply_mode == 1)
+                            self.yuanbao_reply_switch.setChecked(yuanbao_enabled)
+                            self.yuanbao_reply_switch.setEnabled(True)
+
+                    if hasattr(self, 'model_reply_switch'):
+                        if not ai_enabled:
+                            self.model_reply_switch.setChecked(False)
+                            self.model_reply_switch.setEnabled(False)
+                        else:
+                            model_enabled = settings.get('model_reply_enabled', ai_reply_mode == 0)
+                            self.model_reply_switch.setChecked(model_enabled)
+                            self.model_reply_switch.setEnabled(True)
+
+                    pass
+                except Exception as e:
+                    if hasattr(self, 'yuanbao_reply_switch'):
+                        self.yuanbao_reply_switch.setChecked(False)
+                        self.yuanbao_reply_switch.setEnabled(False)
+                    if hasattr(self, 'model_reply_switch'):
+                        self.model_reply_switch.setChecked(False)
+                        self.model_reply_switch.setEnabled(False)
+                if hasattr(self, 'new_friend_reply_switch'):
+                    self.new_friend_reply_switch.setChecked(settings.get('new_friend_reply_enabled', False))
+
+                self.fuzzy_match_switch.setChecked(settings.get('fuzzy_match_enabled', True))
+                self.exact_match_switch.setChecked(settings.get('exact_match_enabled', False))
+                self.min_interval.setText(settings.get('min_interval', '1'))
+                self.max_interval.setText(settings.get('max_interval', '5'))
+                self.coalesce_window.setText(str(settings.get('coalesce_window', DEFAULT_RULE_SETTINGS['coalesce_window'])))
+                mode_index = self.match_mode_combo.findData(settings.get('match_mode', 'all'))
+                self.match_mode_combo.setCurrentIndex(max(0, mode_index))
+                self.match_budget.setText(str(settings.get('match_budget_ms', '50')))
+
+            self.statusBar().showMessage(f"已加载 {len(rules)} 条规则", 3000)
 
         except Exception as e:
             error_msg = f"加载规则数据失败: {str(e)}"
@@ -3791,14 +4107,10 @@ class WeChatManagerApp(QMainWindow):
                         reply_content = "我通过了你的朋友验证请求，现在我们可以开始聊天了"
 
                     rule_exists = False
-                    for row in range(self.rules_table.rowCount()):
-                        keyword_item = self.rules_table.item(row, 2)
-                        if keyword_item and keyword_item.text() == "我通过了你的朋友验证请求":
+                    for row in range(self.rules_model.rowCount()):
+                        if self.rules_model.rule_at(row)['keyword'] == "我通过了你的朋友验证请求":
                             rule_exists = True
-
-                            reply_item = self.rules_table.item(row, 3)
-                            if reply_item:
-                                reply_item.setText(reply_content)
+                            self.rules_model.update_rule(row, {'reply': reply_content})
                             break
 
                     if not rule_exists:
@@ -3854,7 +4166,8 @@ class WeChatManagerApp(QMainWindow):
             ("反向选择", self.invert_selection),
             ("勾选选中", self.check_selected),
             ("删除选中", self.delete_selected_rules),
-            ("清空列表", self.clear_rules)
+            ("清空列表", self.clear_rules),
+            ("管理聊天分组", self.show_chat_sets_dialog)
         ]
 
         for text, slot in actions:
@@ -3863,51 +4176,70 @@ class WeChatManagerApp(QMainWindow):
 
         menu.exec(self.rules_table.viewport().mapToGlobal(pos))
 
+    def show_chat_sets_dialog(self):
+        """编辑规则适用范围中引用的聊天分组，每行一个：分组名=好友或群wxid1,wxid2"""
+        try:
+            store = get_rules_store()
+            dialog = QDialog(self)
+            dialog.setWindowTitle("管理聊天分组")
+            dialog.setMinimumSize(450, 300)
+            dialog.setWindowFlag(Qt.WindowType.WindowContextHelpButtonHint, False)
+            layout = QVBoxLayout(dialog)
+            layout.addWidget(QLabel("每行一个分组，格式：分组名=好友或群wxid1,wxid2\n规则的适用范围中填写“分组=分组名”即可引用"))
+
+            edit = QTextEdit()
+            edit.setPlainText("\n".join(f"{name}={','.join(members)}" for name, members in store.get_chat_sets().items()))
+            layout.addWidget(edit)
+
+            button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+            button_box.accepted.connect(dialog.accept)
+            button_box.rejected.connect(dialog.reject)
+            layout.addWidget(button_box)
+
+            if dialog.exec() != QDialog.DialogCode.Accepted:
+                return
+
+            chat_sets = {}
+            for line in edit.toPlainText().splitlines():
+                name, sep, members = line.partition('=')
+                if not sep or not name.strip():
+                    continue
+                chat_sets[name.strip()] = [m.strip() for m in members.replace('，', ',').split(',') if m.strip()]
+            if store.set_chat_sets(chat_sets):
+                self.statusBar().showMessage(f"已保存 {len(chat_sets)} 个聊天分组", 3000)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"保存聊天分组失败: {str(e)}",
+                              QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
+
     def select_all_rules(self):
         try:
-            for row in range(self.rules_table.rowCount()):
-                checkbox = self.rules_table.cellWidget(row, 1).findChild(QCheckBox)
-                if checkbox:
-                    checkbox.setChecked(True)
+            self.rules_model.set_enabled(None, True)
             self.statusBar().showMessage("已全部选择规则", 3000)
         except Exception as e:
             pass
     def invert_selection(self):
         try:
-            for row in range(self.rules_table.rowCount()):
-                checkbox = self.rules_table.cellWidget(row, 1).findChild(QCheckBox)
-                if checkbox:
-                    checkbox.setChecked(not checkbox.isChecked())
+            self.rules_model.set_enabled(None, None)
             self.statusBar().showMessage("已反向选择规则", 3000)
         except Exception as e:
             pass
+    def _selected_rule_rows(self):
+        return sorted(index.row() for index in self.rules_table.selectionModel().selectedRows())
+
     def check_selected(self):
         try:
-            selected_rows = set(item.row() for item in self.rules_table.selectedItems())
-            for row in selected_rows:
-                checkbox = self.rules_table.cellWidget(row, 1).findChild(QCheckBox)
-                if checkbox:
-                    checkbox.setChecked(True)
+            selected_rows = self._selected_rule_rows()
+            self.rules_model.set_enabled(selected_rows, True)
             self.statusBar().showMessage(f"已勾选 {len(selected_rows)} 条选中规则", 3000)
         except Exception as e:
             pass
     def delete_selected_rules(self):
         try:
-            checked_rows = []
-            for row in range(self.rules_table.rowCount()):
-                cell_widget = self.rules_table.cellWidget(row, 1)
-                if cell_widget:
-                    checkbox = cell_widget.findChild(QCheckBox)
-                    if checkbox and checkbox.isChecked():
-                        checked_rows.append(row)
-
-            target_rows = checked_rows if checked_rows else list(set(item.row() for item in self.rules_table.selectedItems()))
+            target_rows = self.rules_model.checked_rows() or self._selected_rule_rows()
 
             if not target_rows:
                 return
 
-            target_rows = sorted(set(target_rows), reverse=True)
-
             reply = QMessageBox.question(
                 self,
                 "确认删除",
@@ -3917,10 +4249,7 @@ class WeChatManagerApp(QMainWindow):
             )
 
             if reply == QMessageBox.StandardButton.Yes:
-                for row in target_rows:
-                    self.rules_table.removeRow(row)
-
-                self.update_row_numbers()
+                self.rules_model.remove_rows(target_rows)
 
                 self.save_rules_data()
 
@@ -3930,7 +4259,7 @@ class WeChatManagerApp(QMainWindow):
             pass
     def clear_rules(self):
         try:
-            if self.rules_table.rowCount() == 0:
+            if self.rules_model.rowCount() == 0:
                 return
 
             reply = QMessageBox.question(
@@ -3942,22 +4271,16 @@ class WeChatManagerApp(QMainWindow):
             )
 
             if reply == QMessageBox.StandardButton.Yes:
-                self.rules_table.setRowCount(0)
+                self.rules_model.set_rules([])
                 self.save_rules_data()
                 self.statusBar().showMessage("已清空所有规则", 3000)
 
         except Exception as e:
             pass
-    def update_row_numbers(self):
-        try:
-            for row in range(self.rules_table.rowCount()):
-                item = QTableWidgetItem(str(row + 1))
-                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                item.setFlags(Qt.ItemFlag.ItemIsEnabled)
-                self.rules_table.setItem(row, 0, item)
-        except Exception as e:
-            pass
-    def on_data_changed(self, _):
+    def on_data_changed(self, *_):
+        # 热加载带来的变化本来就来自文件，不需要写回
+        if getattr(self, '_applying_rules_diff', False):
+            return
         try:
             self.data_save_timer.start(1000)
         except Exception as e:
@@ -4013,136 +4336,87 @@ class WeChatManagerApp(QMainWindow):
             pass
     def add_rule_to_table(self, keyword="", reply="", enabled=True):
         try:
-            row = self.rules_table.rowCount()
-            self.rules_table.insertRow(row)
-
-            number_item = QTableWidgetItem(str(row + 1))
-            number_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            number_item.setFlags(Qt.ItemFlag.ItemIsEnabled)
-            self.rules_table.setItem(row, 0, number_item)
-
-            checkbox_widget = self.create_rule_checkbox(row, enabled)
-            self.rules_table.setCellWidget(row, 1, checkbox_widget)
-
-            keyword_item = QTableWidgetItem(str(keyword))
-            keyword_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.rules_table.setItem(row, 2, keyword_item)
-
-            reply_item = QTableWidgetItem(str(reply))
-            reply_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.rules_table.setItem(row, 3, reply_item)
-
+            self.rules_model.append_rules([{'keyword': str(keyword), 'reply': str(reply), 'enabled': enabled}])
         except Exception as e:
             pass
-    def create_rule_checkbox(self, row, enabled=True):
-        container = QWidget()
-        layout = QHBoxLayout(container)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        checkbox = QCheckBox()
-        checkbox.setChecked(enabled)
-        checkbox.stateChanged.connect(lambda state, r=row: self.on_checkbox_changed(r, state))
-        layout.addWidget(checkbox)
-
-        return container
 
-    def on_checkbox_changed(self, *_):
+    def apply_rules_diff(self, added, removed, modified):
+        """规则文件被外部修改后，按新增/删除/修改增量更新规则模型，不整表重建"""
+        if not self._tab_built(self.auto_reply_tab):
+            return
         try:
-            self.save_rules_data()
+            self._applying_rules_diff = True
+            try:
+                self.rules_model.apply_diff(added, removed, modified)
+            finally:
+                self._applying_rules_diff = False
+            stats = get_rules_store().reload_stats
+            self.statusBar().showMessage(
+                f"规则文件已更新：新增{len(added)}条，删除{len(removed)}条，修改{len(modified)}条"
+                f"（重新加载耗时 {stats['last_ms']:.1f}ms，第 {stats['count']} 次）", 3000)
+            self.refresh_rule_warnings()
         except Exception as e:
             pass
+
+    def refresh_rule_warnings(self):
+        """在规则表中标出有问题的正则/通配符规则，表格下方显示问题规则数和匹配超时次数"""
+        if not self._tab_built(self.auto_reply_tab):
+            return
+        try:
+            store = get_rules_store()
+            issues = store.pattern_issues()
+            self.rules_model.set_issues(issues)
+            parts = []
+            if issues:
+                parts.append(f"{len(issues)} 条正则/通配符规则有问题（关键词标红，鼠标悬停查看原因）")
+            if store.budget_overruns:
+                parts.append(f"{store.budget_overruns} 条消息的规则匹配超出时间上限，剩余规则已跳过")
+            self.rule_warning_label.setText("规则提醒：" + "；".join(parts) if parts else "")
+            self.rule_warning_label.setVisible(bool(parts))
+        except Exception as e:
+            print(f"刷新规则提醒失败: {e}")
+
     def import_rules(self):
         try:
             file_path, _ = QFileDialog.getOpenFileName(
                 self,
                 "导入规则",
                 "",
-                "Excel Files (*.xlsx)"
+                "规则文件 (*.xlsx *.csv *.jsonl);;Excel Files (*.xlsx);;CSV Files (*.csv);;JSON Lines (*.jsonl)"
             )
 
             if not file_path:
                 return
 
-            if file_path.endswith('.xlsx'):
-                from openpyxl import load_workbook
-                wb = load_workbook(file_path)
-                ws = wb.active
-
-                data = []
-                headers = []
-                for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-                    if row_idx == 1:  # 表头行
-                        headers = [str(cell) if cell else '' for cell in row]
-                    else:  # 数据行
-                        row_data = {}
-                        for col_idx, cell in enumerate(row):
-                            if col_idx < len(headers):
-                                row_data[headers[col_idx]] = str(cell) if cell else ''
-                        if row_data:
-                            data.append(row_data)
-
-                required_columns = ['关键词', '回复内容']
-                if not all(col in headers for col in required_columns):
-                    QMessageBox.warning(self, "导入失败", "Excel文件必须包含'关键词'和'回复内容'列", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
-                    return
-
-                processed_data = []
-                for row_data in data:
-                    keyword = str(row_data.get('关键词', '')).strip()
-                    reply = str(row_data.get('回复内容', '')).strip()
-                    enabled = bool(row_data.get('启用状态', True)) if '启用状态' in row_data else True
-
-                    if keyword and reply:
-                        processed_data.append({
-                            '关键词': keyword,
-                            '回复内容': reply,
-                            '启用状态': enabled
-                        })
-
-                before_drop = len(processed_data)
-                unique_data = {}
-                for item in processed_data:
-                    if item['关键词'] not in unique_data:
-                        unique_data[item['关键词']] = item
-                processed_data = list(unique_data.values())
-                dup_in_file = before_drop - len(processed_data)
-
-                existing_keywords = set()
-                try:
-                    for row in range(self.rules_table.rowCount()):
-                        item = self.rules_table.item(row, 2)
-                        if item:
-                            existing_keywords.add(item.text().strip())
-                except Exception:
-                    pass
-
-                final_data = [item for item in processed_data if item['关键词'] not in existing_keywords]
-                dup_exists = len(processed_data) - len(final_data)
-
-                imported_count = 0
-                for item in final_data:
-                    self.add_rule_to_table(item['关键词'], item['回复内容'], item['启用状态'])
-                    imported_count += 1
+            from rule_import import read_rules_file
+            try:
+                self.save_rules_data()
+                new_rules, stats = read_rules_file(file_path, self.rules_model.keys())
+            except ValueError as e:
+                QMessageBox.warning(self, "导入失败", str(e), QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
+                return
 
-                try:
-                    self.save_rules_data()
-                except Exception:
-                    pass
-                skipped_total = dup_in_file + dup_exists
-                self.statusBar().showMessage(
-                    f"已从{file_path}导入{imported_count}条规则，跳过重复{skipped_total}条（文件内重复{dup_in_file}，与现有重复{dup_exists}）",
-                    5000
-                )
-                QMessageBox.information(
-                    self,
-                    "导入完成",
-                    f"成功导入{imported_count}条规则\n跳过重复{skipped_total}条\n（文件内重复{dup_in_file}，与现有重复{dup_exists}）",
-                    QMessageBox.StandardButton.Ok,
-                    QMessageBox.StandardButton.Ok
-                )
-            else:
-                QMessageBox.warning(self, "导入失败", "仅支持Excel格式(.xlsx)的规则导入", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
+            imported = get_rules_store().add_rules(new_rules)
+            self.rules_model.append_rules(imported)
+            self.refresh_rule_warnings()
+            self.data_changed = False
+
+            imported_count = len(imported)
+            dup_in_file = stats['dup_in_file']
+            dup_exists = stats['dup_exists'] + len(new_rules) - imported_count
+            skipped_total = dup_in_file + dup_exists
+            invalid_text = f"，无效{stats['invalid']}条" if stats['invalid'] else ""
+            self.statusBar().showMessage(
+                f"已从{file_path}导入{imported_count}条规则，跳过重复{skipped_total}条（文件内重复{dup_in_file}，与现有重复{dup_exists}）{invalid_text}",
+                5000
+            )
+            QMessageBox.information(
+                self,
+                "导入完成",
+                f"成功导入{imported_count}条规则\n跳过重复{skipped_total}条\n（文件内重复{dup_in_file}，与现有重复{dup_exists}）{invalid_text}",
+                QMessageBox.StandardButton.Ok,
+                QMessageBox.StandardButton.Ok
+            )
 
         except Exception as e:
             QMessageBox.warning(self, "导入失败", f"导入规则失败: {str(e)}", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
@@ -4159,25 +4433,16 @@ class WeChatManagerApp(QMainWindow):
             if not file_path:
                 return
 
-            rules_data = []
-            for row in range(self.rules_table.rowCount()):
-                checkbox_widget = self.rules_table.cellWidget(row, 1)
-                enabled = False
-                if checkbox_widget:
-                    checkbox = checkbox_widget.findChild(QCheckBox)
-                    if checkbox:
-                        enabled = checkbox.isChecked()
-
-                keyword = self.rules_table.item(row, 2)
-                reply = self.rules_table.item(row, 3)
-
-                if keyword and reply:
-                    rule_data = {
-                        '关键词': keyword.text(),
-                        '回复内容': reply.text(),
-                        '启用状态': enabled
-                    }
-                    rules_data.append(rule_data)
+            rules_data = [{
+                '关键词': rule['keyword'],
+                '回复内容': rule['reply'],
+                '启用状态': rule['enabled'],
+                '适用账号': ','.join(rule.get('accounts', [])),
+                '适用聊天': ','.join(rule.get('chats', [])),
+                '聊天分组': ','.join(rule.get('chat_sets', [])),
+                '匹配类型': MATCH_TYPES.get(rule.get('match_type', 'keyword'), '关键词'),
+                '优先级': rule.get('priority', 0)
+            } for rule in self.rules_model.rules()]
 
             settings_data = [{
                 '设置项': '规则回复启用',
@@ -4285,6 +4550,8 @@ class WeChatManagerApp(QMainWindow):
             pass
 
             if not hasattr(self, 'auto_reply_history_table') or self.auto_reply_history_table is None:
+                # 自动回复页构建时再补进接收记录表
+                self.auto_reply_history_data.append(message_data)
                 return
 
             row = self.auto_reply_history_table.rowCount()
@@ -4325,201 +4592,15 @@ class WeChatManagerApp(QMainWindow):
         except Exception as e:
             pass
     def process_message_for_auto_reply(self, message):
+        """交给自动回复引擎处理，返回引擎整理好的 message_data（元宝客服的回答返回 None）"""
         try:
-            timestamp = message.get("timestamp", int(time.time()))
-            time_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-
-            wxid = message.get("wxid", "")
-            content = message.get("content", "")
-
-            if wxid == "wxid_wi_1d142z0zdj03":
-                pass
-
-                try:
-                    import psutil
-                    current_pid = None
-                    for proc in psutil.process_iter(['pid', 'name']):
-                        if proc.info['name'].lower() == 'wechat.exe':
-                            current_pid = proc.info['pid']
-                            break
-
-                    if not current_pid:
-                        pass
-                        return
-
-                    found_sender, found_chatroom = get_last_yuanbao_sender()
-
-                    if not found_sender:
-                        pass
-                        return
-
-                    yuanbao_content = message.get('content', '')
-
-                    pass
-                    if found_chatroom:
-                        pass
-                    else:
-                        pass
-
-                    if found_sender:
-                        pass
-
-                        if found_chatroom and '@chatroom' in found_chatroom:
-                            pass
-
-                            send_result = send_message_simple(current_pid, found_chatroom, yuanbao_content)
-
-                            if send_result:
-                                pass
-                            else:
-                                self._handle_send_failure_simple(current_pid, found_chatroom, yuanbao_content, is_group=True)
-                        elif '@chatroom' in found_sender:
-                            pass
-
-                            send_result = send_message_simple(current_pid, found_sender, yuanbao_content)
-
-                            if send_result:
-                                pass
-                            else:
-                                self._handle_send_failure_simple(current_pid, found_sender, yuanbao_content, is_group=True)
-                        else:
-                            pass
-
-                            send_result = send_message_simple(current_pid, found_sender, yuanbao_content)
-
-                            if send_result:
-                                pass
-                            else:
-                                self._handle_send_failure_simple(current_pid, found_sender, yuanbao_content, is_group=False)
-                    else:
-                        pass
-                except Exception as e:
-                    pass
-                return
-
-            content = message.get("content", "")
-            original_content = content
-            account_info = message.get("account", {})
-            account_name = account_info.get("nickname", "未知账号")
-
-            parsed_content = parse_special_message(content)
-            if parsed_content:
-                content = parsed_content
-
-            is_group_message = "@chatroom" in wxid
-            member_id = message.get("member_id", "")
-
-            is_at_me = False
-
-            contact_info = None
-            if hasattr(self, 'all_contacts') and self.all_contacts:
-                for contact in self.all_contacts:
-                    if contact.get("wxid") == wxid:
-                        contact_info = contact
-                        break
-
-            sender_name = wxid
-            if contact_info:
-                if contact_info.get("remarks") and contact_info.get("remarks").strip():
-                    sender_name = contact_info.get("remarks")
-                else:
-                    sender_name = contact_info.get("nickname", wxid)
-
-            if is_group_message and member_id:
-                member_info = None
-                if hasattr(self, 'all_contacts') and self.all_contacts:
-                    for contact in self.all_contacts:
-                        if contact.get("wxid") == member_id:
-                            member_info = contact
-                            break
-
-                member_name = member_id
-                if member_info:
-                    member_name = member_info.get("nickname", member_id)
-
-            if is_group_message:
-                self_nickname = account_info.get('nickname', '')
-                self_wxid = account_info.get('wxid', '')
-                if "<atuserlist>" in content:
-                    is_at_me = True
-                elif self_nickname and f"@{self_nickname}" in content:
-                    is_at_me = True
-                    content = content.replace(f"@{self_nickname}", "").strip()
-                elif self_wxid and f"@{self_wxid}" in content:
-                    is_at_me = True
-                    content = content.replace(f"@{self_wxid}", "").strip()
-
-            message_data = {
-                'self_nickname': account_name,
-                'sender_nickname': sender_name,
-                'sender_wxid': wxid,
-                'content': content,
-                'original_content': original_content,
-                'receive_time': time_str,
-                'account': account_info,
-                'is_at_me': is_at_me if is_group_message else False
-            }
-
-            if is_group_message and member_id:
-                member_name = member_id
-                if member_info:
-                    member_name = member_info.get("nickname", member_id)
-                message_data['member_name'] = member_name
-                message_data['member_id'] = member_id
-
-            self.process_auto_reply(message_data)
-
-            self.statusBar().showMessage(f"收到新消息: {content[:20]}...", 3000)
-
-        except Exception as e:
-            pass
-
-    def format_ai_response(self, response, settings):
-        try:
-            rules_enabled = settings.get('rules_enabled', True)
-            prefix = settings.get('reply_prefix', '')
-            if rules_enabled and prefix:
-                response = f"{prefix} {response}"
-
-            token_limit = settings.get('model_token_limit', 0)
-            if token_limit > 0 and len(response) > token_limit:
-                response = response[:token_limit-3] + "..."
-
-            return response
-
+            return self.reply_engine.handle_message(message)
         except Exception as e:
-            return response
-
-    def send_delayed_reply(self, receiver_wxid, response, reply_type="ai_reply", pid=None):
-        try:
-            try:
-                min_delay = max(0, int(self.min_interval.text()))
-                max_delay = max(min_delay, int(self.max_interval.text()))
-            except ValueError:
-                min_delay = 1
-                max_delay = 5
-
-            if min_delay == max_delay:
-                delay = min_delay
-            else:
-                import random
-                delay = random.randint(min_delay, max_delay)
-
-
-
-            if pid:
-                pass
-
-            QTimer.singleShot(
-                delay * 1000,
-                lambda: self.send_auto_reply_with_type(receiver_wxid, response, reply_type, pid=pid)
-            )
+            return None
 
-        except Exception as e:
-            pass
     def send_auto_reply_with_type(self, receiver_wxid, content, reply_type="auto_reply", pid=None):
         try:
-            success = self.send_auto_reply(pid, receiver_wxid, content)
+            success = self._send_paced_reply(pid, receiver_wxid, content)
 
             if success:
                 self.save_reply_message_to_ini(receiver_wxid, content, reply_type)
@@ -4531,35 +4612,24 @@ class WeChatManagerApp(QMainWindow):
             return False
 
     def save_reply_message_to_ini(self, receiver_wxid, content, reply_type="auto_reply"):
-        try:
-            import configparser
-            from datetime import datetime
-
-            config_dir = "config"
-            os.makedirs(config_dir, exist_ok=True)
-            messages_file = os.path.join(config_dir, "messages.ini")
-
-            config = configparser.ConfigParser()
-            if os.path.exists(messages_file):
-                config.read(messages_file, encoding='utf-8')
-
-            existing_sections = [s for s in config.sections() if s.startswith('message_')]
-            next_id = len(existing_sections)
-            section_name = f"message_{next_id:06d}"
-
-            config[section_name] = {
-                'content': content,
-                'sender': 'system',
-                'receiver': receiver_wxid,
-                'timestamp': datetime.now().isoformat(),
-                'type': reply_type,
-                'direction': 'outgoing'
-            }
+        self.data_manager.save_reply(receiver_wxid, content, reply_type)
+
+    def _engine_send(self, pid, receiver_wxid, content, reply_type):
+        """自动回复引擎的发送入口：规则回复只记录一次，AI 回复另外按 ai_reply 类型记录"""
+        if reply_type == "auto_reply":
+            return self._send_paced_reply(pid, receiver_wxid, content)
+        return self.send_auto_reply_with_type(receiver_wxid, content, reply_type, pid=pid)
+
+    def _send_paced_reply(self, pid, receiver_wxid, content):
+        """发送自动回复，并把结果反馈给该账号的发送节奏"""
+        start = time.perf_counter()
+        success = self.send_auto_reply(pid, receiver_wxid, content)
+        if success:
+            get_send_pacer().record_success(pid, 'reply', (time.perf_counter() - start) * 1000)
+        else:
+            get_send_pacer().record_failure(pid, 'reply')
+        return success
 
-            with open(messages_file, 'w', encoding='utf-8') as f:
-                config.write(f)
-        except Exception as e:
-            pass
     def send_auto_reply(self, pid, receiver_wxid, content):
         try:
             current_pid = pid if pid else self._get_wechat_pid()
@@ -4580,7 +4650,7 @@ class WeChatManagerApp(QMainWindow):
                 image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
 
                 if file_extension in image_extensions:
-                    success = send_image_to_wxid(current_pid, receiver_wxid, file_path)
+                    success = get_wechat_backend().send_image_to_wxid(current_pid, receiver_wxid, file_path)
 
                     if success:
                         self.statusBar().showMessage(f"已发送图片到 {receiver_wxid}", 3000)
@@ -4622,7 +4692,7 @@ class WeChatManagerApp(QMainWindow):
             print(f"准备发送消息 - PID: {current_pid}, 接收者: {receiver_wxid}, 内容: '{content}'")
 
             print(f"正在发送回复消息到 {receiver_wxid}: '{content}'")
-            success = send_message_to_wxid(current_pid, receiver_wxid, content)
+            success = get_wechat_backend().send_message_to_wxid(current_pid, receiver_wxid, content)
 
             if success:
                 self.statusBar().showMessage(f"已发送自动回复消息到 {receiver_wxid}", 3000)
@@ -4640,7 +4710,7 @@ class WeChatManagerApp(QMainWindow):
         try:
             dialog = QDialog(self)
             dialog.setWindowTitle("大模型回复规则设置")
-            dialog.setFixedSize(450, 400)  
+            dialog.setFixedSize(450, 430)  
             dialog.setWindowFlag(Qt.WindowType.WindowContextHelpButtonHint, False)
 
             layout = QVBoxLayout(dialog)
@@ -4658,6 +4728,9 @@ class WeChatManagerApp(QMainWindow):
             self.rules_enabled_check = QCheckBox("启用风格/表情/前缀等规则")
             self.rules_enabled_check.setChecked(current_settings.get('rules_enabled', True))
             rules_layout.addWidget(self.rules_enabled_check)
+            self.reply_cache_check = QCheckBox("相同问题复用回复缓存")
+            self.reply_cache_check.setChecked(current_settings.get('reply_cache_enabled', True))
+            rules_layout.addWidget(self.reply_cache_check)
             rules_layout.addStretch()
             layout.addLayout(rules_layout)
 
@@ -4776,6 +4849,17 @@ class WeChatManagerApp(QMainWindow):
             emoji_layout.addWidget(self.include_emoji_combo)
             layout.addLayout(emoji_layout)
 
+            stream_layout = QHBoxLayout()
+            self.stream_reply_check = QCheckBox("流式分段发送（边生成边按句发送）")
+            self.stream_reply_check.setChecked(current_settings.get('stream_reply_enabled', False))
+            stream_layout.addWidget(self.stream_reply_check)
+            stream_layout.addWidget(QLabel("最多段数:"))
+            self.stream_max_chunks_input = QLineEdit(str(current_settings.get('stream_max_chunks', 5)))
+            self.stream_max_chunks_input.setFixedWidth(25)
+            stream_layout.addWidget(self.stream_max_chunks_input)
+            stream_layout.addStretch()
+            layout.addLayout(stream_layout)
+
             params_layout = QHBoxLayout()
 
             creativity_label = QLabel("创意度:")
@@ -4917,6 +5001,11 @@ class WeChatManagerApp(QMainWindow):
             emoji_setting = self.include_emoji_combo.currentText()
             include_emoji = emoji_setting != "不添加表情"
 
+            try:
+                stream_max_chunks = max(1, int(self.stream_max_chunks_input.text()))
+            except ValueError:
+                stream_max_chunks = 5
+
             ai_manager.auto_reply_settings.update({
                 'model_token_limit': token_limit,
                 'length_type': length_type,
@@ -4926,7 +5015,10 @@ class WeChatManagerApp(QMainWindow):
                 'include_emoji': include_emoji,
                 'emoji_level': emoji_setting,
                 'reply_prefix': self.reply_prefix_input.text(),
-                'rules_enabled': self.rules_enabled_check.isChecked()
+                'rules_enabled': self.rules_enabled_check.isChecked(),
+                'reply_cache_enabled': self.reply_cache_check.isChecked(),
+                'stream_reply_enabled': self.stream_reply_check.isChecked(),
+                'stream_max_chunks': stream_max_chunks
             })
 
             try:
@@ -4958,33 +5050,15 @@ class WeChatManagerApp(QMainWindow):
             except Exception:
                 ai_rules = None
 
-            config_dir = "config"
-            os.makedirs(config_dir, exist_ok=True)
-            rules_file = os.path.join(config_dir, "auto_reply_rules.json")
-
-            existing_data = {}
-            if os.path.exists(rules_file):
-                try:
-                    with open(rules_file, 'r', encoding='utf-8') as f:
-                        existing_data = json.load(f)
-                except:
-                    existing_data = {}
-
-            existing_settings = existing_data.get('settings', {}) if isinstance(existing_data, dict) else {}
+            store = get_rules_store()
             try:
-                if isinstance(existing_settings, dict):
-                    existing_settings.update(ai_manager.auto_reply_settings)
+                store.update_settings(ai_manager.auto_reply_settings)
             except Exception:
                 pass
-
-            existing_data['settings'] = existing_settings
             if ai_rules is not None:
-                existing_data['ai_rules'] = ai_rules
-            existing_data['last_update'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            existing_data['version'] = '1.0'
-
-            with open(rules_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
+                store.set_section('ai_rules', ai_rules)
+            store.set_section('version', '1.0')
+            store.flush()
 
             ai_manager.save_auto_reply_rules()
 
@@ -5059,32 +5133,7 @@ class WeChatManagerApp(QMainWindow):
         updates: 仅包含需要更新的键值对，例如 {'ai_reply_mode': 0, 'model_reply_enabled': True}
         """
         try:
-            config_dir = "config"
-            os.makedirs(config_dir, exist_ok=True)
-            rules_file = os.path.join(config_dir, 'auto_reply_rules.json')
-
-            data = {}
-            if os.path.exists(rules_file):
-                try:
-                    with open(rules_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                except Exception:
-                    data = {}
-
-            if not isinstance(data, dict):
-                data = {}
-
-            settings = data.get('settings', {})
-            if not isinstance(settings, dict):
-                settings = {}
-
-            settings.update(updates or {})
-
-            data['settings'] = settings
-            data['last_update'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-            with open(rules_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            get_rules_store().update_settings(updates)
             try:
                 self._cleanup_obsolete_ai_config()
             except Exception:
@@ -5134,51 +5183,36 @@ class WeChatManagerApp(QMainWindow):
 
     def process_auto_reply(self, message_data):
         try:
-            sender_wxid = message_data.get('sender_wxid', '')
-
-            if sender_wxid == "wxid_wi_1d142z0zdj03":
-                return
-
-            if hasattr(self, 'rule_reply_switch') and self.rule_reply_switch.isChecked():
-                self.check_and_auto_reply(message_data)
-
+            self.reply_engine.process(message_data)
         except Exception as e:
             pass
+    def _find_contact(self, wxid):
+        """在已读取的联系人列表中查找 wxid 对应的联系人，找不到返回 None"""
+        for contact in getattr(self, 'all_contacts', None) or ():
+            if contact.get("wxid") == wxid:
+                return contact
+        return None
+
     def on_message_received(self, message):
         try:
             print("收到微信消息:", message)
 
-            try:
-                self.process_message_for_auto_reply(message)
-            except Exception as e:
-                pass
+            message_data = self.process_message_for_auto_reply(message)
             self.data_manager.save_message(message)
 
-            timestamp = int(message.get('timestamp', time.time()))
-            time_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-            wxid = message.get('wxid', '')
-
-            if wxid == "wxid_wi_1d142z0zdj03":
+            # 元宝客服的回答已由引擎回发给提问者，不进消息记录
+            if not message_data:
                 return
 
-            content = message.get('content', '')
-            original_content = content
-            account_info = message.get('account', {})
-            account_name = account_info.get('nickname', '未知账号')
-
-            is_at_me = False
-
-            print(f"解析消息: 发送者={wxid}, 内容={content}, 时间={time_str}")
-
-            parsed_content = parse_special_message(content)
-            if parsed_content:
-                content = parsed_content
-                print(f"解析XML内容: {content}")
+            content = message_data.get('content', '')
+            account_info = message_data.get('account', {})
+            print(f"解析消息: 发送者={message_data.get('sender_wxid', '')}, 内容={content}, 时间={message_data.get('receive_time', '')}")
 
             try:
-                text_to_check = content or original_content or ''
-                if "操作过于频繁，请稍后再试" in text_to_check:
+                text_to_check = content or message_data.get('original_content') or ''
+                if RATE_LIMIT_TEXT in text_to_check:
                     print("检测到频繁操作提示，自动停止添加好友流程")
+                    get_send_pacer().record_rate_limit(account_info.get('wxid') or account_info.get('pid'))
                     if not hasattr(self, 'rate_limit_triggered'):
                         self.rate_limit_triggered = False
                     if not self.rate_limit_triggered:
@@ -5196,74 +5230,6 @@ class WeChatManagerApp(QMainWindow):
             except Exception:
                 pass
 
-            is_group_message = "@chatroom" in wxid
-            member_id = message.get("member_id", "")
-
-            is_at_me = False
-
-            contact_info = None
-            if hasattr(self, 'all_contacts') and self.all_contacts:
-                for contact in self.all_contacts:
-                    if contact.get("wxid") == wxid:
-                        contact_info = contact
-                        break
-
-            sender_name = wxid
-            if is_group_message:
-                if contact_info:
-                    sender_name = contact_info.get("nickname", wxid)
-
-                member_info = None
-                if hasattr(self, 'all_contacts') and self.all_contacts:
-                    for contact in self.all_contacts:
-                        if contact.get("wxid") == member_id:
-                            member_info = contact
-                            break
-
-                self_nickname = account_info.get('nickname', '')
-                self_wxid = account_info.get('wxid', '')
-
-                is_at_me = False
-                if self_nickname and f"@{self_nickname}" in content:
-                    is_at_me = True
-
-                    content = content.replace(f"@{self_nickname}", "").strip()
-                    print(f"群消息包含@我，原内容: '{original_content}'，过滤后内容: '{content}'")
-
-                elif self_wxid and f"@{self_wxid}" in content:
-                    is_at_me = True
-
-                    content = content.replace(f"@{self_wxid}", "").strip()
-                    print(f"群消息包含@我，原内容: '{original_content}'，过滤后内容: '{content}'")
-
-                if member_info:
-                    member_name = member_info.get("nickname", member_id)
-            else:
-                if contact_info:
-                    remarks = contact_info.get("remarks", "")
-                    if remarks and remarks.strip():
-                        sender_name = remarks
-                    else:
-                        sender_name = contact_info.get("nickname", wxid)
-
-            message_data = {
-                'self_nickname': account_name,
-                'sender_nickname': sender_name,
-                'sender_wxid': wxid,
-                'content': content,
-                'original_content': original_content,
-                'receive_time': time_str,
-                'account': account_info,
-                'is_at_me': is_at_me if is_group_message else False
-            }
-
-            if is_group_message and member_id:
-                member_name = member_id
-                if member_info:
-                    member_name = member_info.get("nickname", member_id)
-                message_data['member_name'] = member_name
-                message_data['member_id'] = member_id
-
             self.add_message_to_auto_reply_history(message_data)
 
             try:
@@ -5290,10 +5256,11 @@ class WeChatManagerApp(QMainWindow):
 
             print(traceback.format_exc())
 
-    def start_message_monitoring(self):
-        try:
-            self.monitor_manager.start_monitor_all()
+    def _start_monitors_with_discovered_accounts(self):
+        self.monitor_manager.start_monitor_all(self.startup_sequence.result("账号发现"))
 
+    def _on_monitoring_started(self, _result=None):
+        try:
             self.statusBar().showMessage("已自动启动消息监听，持续监听中...", 5000)
             self.monitor_check_timer = QTimer()
             self.monitor_check_timer.timeout.connect(self.check_monitor_status)
@@ -5302,6 +5269,8 @@ class WeChatManagerApp(QMainWindow):
             pass
     def check_monitor_status(self):
         try:
+            self.reply_engine.yuanbao_routes.purge_expired()
+            self.refresh_rule_warnings()
             if not self.monitor_manager.is_running:
                 self.monitor_manager.start_monitor_all()
         except Exception as e:
@@ -5364,7 +5333,7 @@ class WeChatManagerApp(QMainWindow):
                             )
                             QApplication.processEvents()
 
-                            members = get_group_members(pid, group_id, progress_callback)
+                            members = get_wechat_backend().get_group_members(pid, group_id, progress_callback)
 
                             for member in members:
                                 member_data = {
@@ -5438,7 +5407,7 @@ class WeChatManagerApp(QMainWindow):
 
     def start_monitoring(self):
         try:
-            pids = detect_wechat_processes()
+            pids = get_account_registry().pids()
             if not pids:
                 self.add_friend_status.setText("未找到微信进程，请确保微信已启动")
                 return
@@ -5459,7 +5428,7 @@ class WeChatManagerApp(QMainWindow):
             for pid in pids:
                 mon = self.contact_monitors.get(pid)
                 if mon is None:
-                    mon = ContactInfoMonitor(pid)
+                    mon = get_wechat_backend().create_contact_monitor(pid)
                     self.contact_monitors[pid] = mon
                 if not mon.is_active():
                     mon.set_callback(self.on_contact_info)
@@ -5647,8 +5616,7 @@ class WeChatManagerApp(QMainWindow):
             self.add_friend_status.setText("请先导入手机号")
             return
 
-        wechat_info = SimpleWeChatInfo()
-        accounts = wechat_info.run()
+        accounts = get_account_registry().accounts()
 
         if not accounts:
             self.add_friend_status.setText("未找到已登录的微信账号")
@@ -5773,6 +5741,7 @@ class WeChatManagerApp(QMainWindow):
         self.add_friend_table.setItem(self.current_index, 3, QTableWidgetItem(f"搜索中({current_account['nickname']})"))
         self.add_friend_status.setText(f"正在搜索: {phone} (账号: {current_account['nickname']})")
 
+        lease = None
         try:
             wechat_pid = current_account['pid']
             if not wechat_pid:
@@ -5780,16 +5749,11 @@ class WeChatManagerApp(QMainWindow):
                 self.schedule_next_search(min_delay, max_delay)
                 return
 
-            handle = OpenProcess(0x1F0FFF, False, wechat_pid)
-            if not handle:
-                self.add_friend_table.setItem(self.current_index, 3, QTableWidgetItem("失败：无法打开进程"))
-                self.schedule_next_search(min_delay, max_delay)
-                return
-
-            wechat_base = get_wechat_base(wechat_pid)
-            if not wechat_base:
-                self.add_friend_table.setItem(self.current_index, 3, QTableWidgetItem("失败：无法获取微信基址"))
-                CloseHandle(handle)
+            # 句柄和基址按 pid 复用，整个任务期间只打开/解析一次
+            try:
+                lease = get_process_pool().acquire(wechat_pid)
+            except ProcessPoolError as e:
+                self.add_friend_table.setItem(self.current_index, 3, QTableWidgetItem(f"失败：{e}"))
                 self.schedule_next_search(min_delay, max_delay)
                 return
 
@@ -5799,25 +5763,25 @@ class WeChatManagerApp(QMainWindow):
             if is_group_member:
                 # 确保在主线程中调度
                 if QThread.currentThread() == QApplication.instance().thread():
-                    QTimer.singleShot(1000, lambda: self.check_and_add_friend(handle, wechat_base, self.current_index, min_delay, max_delay, None))
+                    QTimer.singleShot(1000, lambda: self.check_and_add_friend(lease, self.current_index, min_delay, max_delay, None))
                 else:
                     # 如果不在主线程，立即执行
-                    self.check_and_add_friend(handle, wechat_base, self.current_index, min_delay, max_delay, None)
+                    self.check_and_add_friend(lease, self.current_index, min_delay, max_delay, None)
             else:
                 monitor = None
                 try:
-                    monitor = ContactInfoMonitor(wechat_pid)
+                    monitor = get_wechat_backend().create_contact_monitor(wechat_pid)
                     monitor.set_callback(self.on_contact_info)
                     monitor.start()
 
-                    result = add_friend_by_phone(handle, wechat_base, phone)
+                    result = get_wechat_backend().add_friend_by_phone(lease.handle, lease.base, phone)
 
                     # 确保在主线程中调度
                     if QThread.currentThread() == QApplication.instance().thread():
-                        QTimer.singleShot(3000, lambda: self.check_and_add_friend(handle, wechat_base, self.current_index, min_delay, max_delay, monitor))
+                        QTimer.singleShot(3000, lambda: self.check_and_add_friend(lease, self.current_index, min_delay, max_delay, monitor))
                     else:
                         # 如果不在主线程，立即执行
-                        self.check_and_add_friend(handle, wechat_base, self.current_index, min_delay, max_delay, monitor)
+                        self.check_and_add_friend(lease, self.current_index, min_delay, max_delay, monitor)
                 except Exception as monitor_error:
                     print(f"监控器创建失败: {monitor_error}")
                     if monitor:
@@ -5827,21 +5791,20 @@ class WeChatManagerApp(QMainWindow):
                             pass
                     # 继续执行，但不使用监控器，确保在主线程中调度
                     if QThread.currentThread() == QApplication.instance().thread():
-                        QTimer.singleShot(3000, lambda: self.check_and_add_friend(handle, wechat_base, self.current_index, min_delay, max_delay, None))
+                        QTimer.singleShot(3000, lambda: self.check_and_add_friend(lease, self.current_index, min_delay, max_delay, None))
                     else:
                         # 如果不在主线程，立即执行
-                        self.check_and_add_friend(handle, wechat_base, self.current_index, min_delay, max_delay, None)
+                        self.check_and_add_friend(lease, self.current_index, min_delay, max_delay, None)
 
         except Exception as e:
+            if lease is not None:
+                lease.release()
             self.add_friend_table.setItem(self.current_index, 3, QTableWidgetItem(f"失败: {str(e)[:20]}"))
             self.schedule_next_search(min_delay, max_delay)
 
-    def check_and_add_friend(self, handle, wechat_base, row_index, min_delay, max_delay, monitor=None):
+    def check_and_add_friend(self, lease, row_index, min_delay, max_delay, monitor=None):
         if not self.is_running or self.is_paused:
-            try:
-                CloseHandle(handle)
-            except:
-                pass
+            lease.release()
             if monitor:
                 try:
                     monitor.stop()
@@ -5857,10 +5820,7 @@ class WeChatManagerApp(QMainWindow):
 
             if not v3_info and phone:
                 self.add_friend_table.setItem(row_index, 3, QTableWidgetItem(f"无微信号({current_account['nickname']})"))
-                try:
-                    CloseHandle(handle)
-                except:
-                    pass
+                lease.release()
                 if monitor:
                     try:
                         monitor.stop()
@@ -5870,10 +5830,7 @@ class WeChatManagerApp(QMainWindow):
                 self.schedule_next_search(min_delay, max_delay)
                 return
 
-            try:
-                CloseHandle(handle)
-            except:
-                pass
+            lease.release()
 
             is_group_member = v3_info and v3_info.startswith("wxid_")
 
@@ -5886,7 +5843,8 @@ class WeChatManagerApp(QMainWindow):
                     self.add_friend_table.setItem(row_index, 3, QTableWidgetItem(f"添加中({current_account['nickname']})"))
                     greeting = self.add_friend_table.item(row_index, 2).text() if self.add_friend_table.item(row_index, 2) else "您好，我想添加您为好友"
 
-                    result = add_wechat_friend(wechat_pid, v3_info, greeting)
+                    result = get_wechat_backend().add_friend(wechat_pid, v3_info, greeting)
+                    self._record_add_friend_result(current_account, result)
 
                     if result:
                         self.add_friend_table.setItem(row_index, 3, QTableWidgetItem(f"添加成功({current_account['nickname']})"))
@@ -5901,7 +5859,8 @@ class WeChatManagerApp(QMainWindow):
                         self.add_friend_table.setItem(row_index, 3, QTableWidgetItem(f"添加中({current_account['nickname']})"))
                         greeting = self.add_friend_table.item(row_index, 2).text() if self.add_friend_table.item(row_index, 2) else "您好，我想添加您为好友"
 
-                        result = add_wechat_friend(wechat_pid, v3_info, greeting)
+                        result = get_wechat_backend().add_friend(wechat_pid, v3_info, greeting)
+                        self._record_add_friend_result(current_account, result)
 
                         if result:
                             self.add_friend_table.setItem(row_index, 3, QTableWidgetItem(f"添加成功({current_account['nickname']})"))
@@ -5929,10 +5888,7 @@ class WeChatManagerApp(QMainWindow):
         except Exception as e:
             print(f"添加好友过程异常: {e}")
             self.add_friend_table.setItem(row_index, 3, QTableWidgetItem(f"失败: {str(e)[:20]}"))
-            try:
-                CloseHandle(handle)
-            except:
-                pass
+            lease.release()
             if monitor:
                 try:
                     monitor.stop()
@@ -5940,6 +5896,14 @@ class WeChatManagerApp(QMainWindow):
                     print(f"异常处理中停止监控器失败: {monitor_error}")
             self.schedule_next_search(min_delay, max_delay)
 
+    def _record_add_friend_result(self, account, result):
+        pacer = get_send_pacer()
+        pacer.bind(account.get('pid'), account.get('wxid'))
+        if result:
+            pacer.record_success(account.get('pid'), 'add_friend')
+        else:
+            pacer.record_failure(account.get('pid'), 'add_friend')
+
     def schedule_next_search(self, min_delay, max_delay):
         # 确保在主线程中执行
         def _schedule_in_main_thread():
@@ -5954,20 +5918,21 @@ class WeChatManagerApp(QMainWindow):
             self.current_index = next_waiting_index
             self.current_account_index = self.current_index % len(self.selected_wechat_accounts)
 
-            import random
+            current_account = self.selected_wechat_accounts[self.current_account_index]
             if getattr(self, 'initial_no_delay', False):
                 delay_minutes = 0
                 self.initial_no_delay = False
             else:
-                delay_minutes = random.randint(min_delay, max_delay)
-            current_account = self.selected_wechat_accounts[self.current_account_index]
+                pacer = get_send_pacer()
+                pacer.bind(current_account.get('pid'), current_account.get('wxid'))
+                delay_minutes = pacer.next_delay(current_account.get('pid'), 'add_friend', min_delay, max_delay)
             if delay_minutes > 0:
-                self.add_friend_status.setText(f"等待 {delay_minutes} 分钟后，账号 {current_account['nickname']} 处理第 {self.current_index + 1} 个手机号...")
+                self.add_friend_status.setText(f"等待 {delay_minutes:.1f} 分钟后，账号 {current_account['nickname']} 处理第 {self.current_index + 1} 个手机号...")
             else:
                 self.add_friend_status.setText(f"立即由账号 {current_account['nickname']} 处理第 {self.current_index + 1} 个手机号...")
 
             # 使用QTimer.singleShot在主线程中调度
-            QTimer.singleShot(delay_minutes * 60 * 1000, lambda: self.process_next_phone(min_delay, max_delay))
+            QTimer.singleShot(int(delay_minutes * 60 * 1000), lambda: self.process_next_phone(min_delay, max_delay))
         
         # 如果当前在主线程，直接执行；否则使用QTimer调度到主线程
         if QThread.currentThread() == QApplication.instance().thread():
@@ -6117,6 +6082,7 @@ class WeChatManagerApp(QMainWindow):
 
     def add_group_members_from_context(self, group_id, group_name):
         try:
+            self._ensure_tab(self.add_friend_tab)
             if self.add_friend_table.rowCount() > 0:
                 reply = QMessageBox.question(
                     self,
@@ -6139,7 +6105,7 @@ class WeChatManagerApp(QMainWindow):
             def progress_callback(current, total, member):
                 pass
 
-            members = get_group_members(pid, group_id, progress_callback)
+            members = get_wechat_backend().get_group_members(pid, group_id, progress_callback)
 
             if not members:
                 QMessageBox.warning(self, "获取失败", f"未能获取到群 {group_name} 的成员信息", QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
@@ -6295,132 +6261,14 @@ class WeChatManagerApp(QMainWindow):
             print(traceback.format_exc())
 
     def check_and_auto_reply(self, message_data):
-        try:
-            if not getattr(self, 'rule_reply_switch', None) or not self.rule_reply_switch.isChecked():
-                return
-            content = message_data.get('content', '')
-            sender_wxid = message_data.get('sender_wxid', '')
-            if not content or not sender_wxid:
-                return
-            if sender_wxid == "wxid_wi_1d142z0zdj03":
-                return
-            is_group = '@chatroom' in sender_wxid
-            if is_group:
-                allowed = False
-                if getattr(self, 'reply_group_switch', None) and self.reply_group_switch.isChecked():
-                    allowed = True
-                elif getattr(self, 'specific_group_switch', None) and self.specific_group_switch.isChecked() and sender_wxid in getattr(self, 'specific_group_wxids', set()):
-                    allowed = True
-                if not allowed:
-                    print("群消息未启用，且不在指定群列表，忽略")
-                    return
-                if not message_data.get('is_at_me', False):
-                    print("收到群消息，但未被@，忽略")
-                    return
-            else:
-                allowed = False
-                if getattr(self, 'reply_friend_switch', None) and self.reply_friend_switch.isChecked():
-                    allowed = True
-                elif getattr(self, 'specific_friend_switch', None) and self.specific_friend_switch.isChecked() and sender_wxid in getattr(self, 'specific_friend_wxids', set()):
-                    allowed = True
-                if not allowed:
-                    print("好友消息未启用，且不在指定好友列表，忽略")
-                    return
-            account_info = message_data.get('account', {})
-            current_pid = account_info.get('pid')
-            receiver_wxid = sender_wxid
-            matched_rules = []
-            try:
-                if getattr(self, 'exact_match_switch', None) and self.exact_match_switch.isChecked():
-                    for row in range(self.rules_table.rowCount()):
-                        checkbox_widget = self.rules_table.cellWidget(row, 1)
-                        if not checkbox_widget:
-                            continue
-                        checkbox = checkbox_widget.findChild(QCheckBox)
-                        if not checkbox or not checkbox.isChecked():
-                            continue
-                        keyword_item = self.rules_table.item(row, 2)
-                        reply_item = self.rules_table.item(row, 3)
-                        if not keyword_item or not reply_item:
-                            continue
-                        keyword = keyword_item.text() or ''
-                        reply = reply_item.text() or ''
-                        if content.strip() == keyword.strip():
-                            matched_rules.append({'row': row, 'reply': reply})
-                if (not matched_rules) and getattr(self, 'fuzzy_match_switch', None) and self.fuzzy_match_switch.isChecked():
-                    low_content = content.strip().lower()
-                    for row in range(self.rules_table.rowCount()):
-                        checkbox_widget = self.rules_table.cellWidget(row, 1)
-                        if not checkbox_widget:
-                            continue
-                        checkbox = checkbox_widget.findChild(QCheckBox)
-                        if not checkbox or not checkbox.isChecked():
-                            continue
-                        keyword_item = self.rules_table.item(row, 2)
-                        reply_item = self.rules_table.item(row, 3)
-                        if not keyword_item or not reply_item:
-                            continue
-                        keyword = (keyword_item.text() or '').strip()
-                        reply = reply_item.text() or ''
-                        if keyword and keyword.lower() in low_content:
-                            matched_rules.append({'row': row, 'reply': reply})
-            except Exception as e:
-                pass
-            if not matched_rules:
-                if getattr(self, 'ai_reply_switch', None) and self.ai_reply_switch.isChecked():
-                    try:
-                        from aizhuli_combined import AIManager
-                        ai_assistant = AIManager()
-                        def on_ai_response(response):
-                            try:
-                                if response:
-                                    formatted = self.format_ai_response(response, getattr(ai_assistant, 'auto_reply_settings', {}))
-                                    self.send_delayed_reply(receiver_wxid, formatted, reply_type="ai_reply", pid=current_pid)
-                            finally:
-                                try:
-                                    ai_assistant.response_ready.disconnect(on_ai_response)
-                                except Exception:
-                                    pass
-                        ai_assistant.response_ready.connect(on_ai_response)
-                        def get_ai_reply():
-                            try:
-                                import asyncio
-                                prompt = content
-                                coro = ai_assistant._async_ai_reply(sender_wxid, prompt)
-                                try:
-                                    asyncio.run(coro)
-                                except RuntimeError:
-                                    try:
-                                        loop = asyncio.get_event_loop()
-                                        loop.run_until_complete(coro)
-                                    except Exception:
-                                        new_loop = asyncio.new_event_loop()
-                                        try:
-                                            asyncio.set_event_loop(new_loop)
-                                            new_loop.run_until_complete(coro)
-                                        finally:
-                                            new_loop.close()
-                            except Exception as e:
-                                pass
-                        threading.Thread(target=get_ai_reply, daemon=True).start()
-                    except Exception as e:
-                        pass
-                return
-            matched_rules.sort(key=lambda x: x['row'])
-            try:
-                min_delay = max(0, int(self.min_interval.text()))
-                max_delay = max(min_delay, int(self.max_interval.text()))
-            except Exception:
-                min_delay, max_delay = 1, 5
-            for i, rule in enumerate(matched_rules):
-                if min_delay == max_delay:
-                    delay = min_delay
-                else:
-                    delay = random.randint(min_delay, max_delay)
-                print(f"将在 {delay} 秒后发送第 {i+1} 条回复")
-                QTimer.singleShot(delay * 1000, lambda r=rule['reply']: self.send_auto_reply(current_pid, receiver_wxid, r))
-        except Exception as e:
-            pass
+        return self.reply_engine.process(message_data)
+
+    def on_ai_reply_ready(self, receiver_wxid, response, pid):
+        self.reply_engine.deliver_ai_reply(receiver_wxid, response, pid)
+
+    def on_ai_reply_chunk(self, receiver_wxid, text, pid, index):
+        self.reply_engine.deliver_ai_chunk(receiver_wxid, text, pid, index)
+
     def show_contact_service_dialog(self):
         """显示联系客服对话框"""
         dialog = QDialog(self)
@@ -6447,20 +6295,21 @@ class WeChatManagerApp(QMainWindow):
         dialog.exec()
 
 class WeChatAccountSelectionDialog(QDialog):
-    def __init__(self, accounts, parent=None):
+    def __init__(self, accounts, parent=None, purpose="添加好友"):
         super().__init__(parent)
         self.accounts = accounts
+        self.purpose = purpose
         self.selected_accounts = []
         self.setup_ui()
 
     def setup_ui(self):
-        self.setWindowTitle("选择添加好友的微信账号")
+        self.setWindowTitle(f"选择{self.purpose}的微信账号")
         self.setModal(True)
         self.resize(100, 200)
 
         layout = QVBoxLayout()
 
-        label = QLabel("请选择要用于添加好友的微信账号：")
+        label = QLabel(f"请选择要用于{self.purpose}的微信账号：")
         label.setStyleSheet(StyleSheet.LABEL_SECONDARY)
         layout.addWidget(label)
 
@@ -6575,9 +6424,10 @@ if __name__ == "__main__":
             _show_already_running_message()
             sys.exit(0)
 
-        app = QApplication.instance()
-        if app is None:
-            app = QApplication(sys.argv)
+        with _startup_profile.stage("创建 QApplication"):
+            app = QApplication.instance()
+            if app is None:
+                app = QApplication(sys.argv)
 
         try:
             app.setApplicationName("AI全功能营销系统")
@@ -6586,9 +6436,18 @@ if __name__ == "__main__":
         except Exception:
             pass
 
-        apply_stylesheet(app)
-        window = WeChatManagerApp()
+        with _startup_profile.stage("应用样式"):
+            apply_stylesheet(app)
+        with _startup_profile.stage("构建主窗口"):
+            window = WeChatManagerApp()
         window.show()
+
+        def _report_startup():
+            _startup_profile.mark("首帧显示")
+            # 后台阶段（账号发现、启动监听）全部完成后再打印
+            window.startup_sequence.when_done(None, _startup_profile.report)
+
+        QTimer.singleShot(0, _report_startup)
         sys.exit(app.exec())
     except Exception as e:
         import traceback
@@ -0,0 +1,44 @@
+import threading
+
+
+def shard_recipients(recipients, account_contacts):
+    """把群发对象分配给各账号，只分给好友/群列表中有该对象的账号。
+
+    account_contacts 为 {账号key: 该账号的联系人 wxid 集合}（按字典顺序视为账号优先级）。
+    有多个账号可发时分给当前分到最少的那个，使各账号负载均衡。
+    返回 ({账号key: [联系人, ...]}, [无账号可发的联系人, ...])。
+    """
+    shards = {key: [] for key in account_contacts}
+    unreachable = []
+    for contact in recipients:
+        wxid = contact.get('wxid')
+        candidates = [key for key, wxids in account_contacts.items() if wxid and wxid in wxids]
+        if not candidates:
+            unreachable.append(contact)
+            continue
+        target = min(candidates, key=lambda key: len(shards[key]))
+        shards[target].append(contact)
+    return {key: items for key, items in shards.items() if items}, unreachable
+
+
+def run_sharded(shards, send_shard):
+    """每个账号一个线程并行发送，send_shard(账号key, 联系人列表) 返回成功数；等待全部完成后返回成功总数"""
+    results = {}
+    lock = threading.Lock()
+
+    def worker(key, contacts):
+        try:
+            count = send_shard(key, contacts)
+        except Exception as e:
+            print(f"账号 {key} 群发失败: {e}")
+            count = 0
+        with lock:
+            results[key] = count or 0
+
+    threads = [threading.Thread(target=worker, args=(key, contacts), daemon=True)
+               for key, contacts in shards.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(results.values())
@@ -0,0 +1,165 @@
+import time
+import random
+import itertools
+from datetime import datetime
+from functools import lru_cache
+
+
+# 占位符别名 -> 规范字段名
+FIELD_ALIASES = {
+    'nickname': 'nickname', '昵称': 'nickname',
+    'remark': 'remark', '备注': 'remark',
+    'group': 'group', '群名': 'group', '群': 'group',
+    'date': 'date', '日期': 'date',
+    'time': 'time', '时间': 'time',
+    'weekday': 'weekday', '星期': 'weekday',
+    'datetime': 'datetime',
+}
+TEMPLATE_HELP = "可用变量：{昵称} {备注} {群名} {日期} {时间} {星期}；{你好|您好|哈喽} 每次随机选一个"
+
+_WEEKDAYS = "一二三四五六日"
+_choice_ids = itertools.count()
+
+
+class _Context(dict):
+    def __missing__(self, key):
+        return ''
+
+
+class MessageTemplate:
+    """编译后的消息模板。
+
+    编译时把文本拆成一个 str.format 格式串：已知变量变成 {nickname} 等字段，
+    随机变体 {a|b|c} 变成 {_s0} 字段并把各选项递归编译为子模板（纯文本选项直接存字符串），
+    其余花括号按字面保留。
+    渲染时只需为随机变体选一个选项再调用一次 format_map，不再解析文本；
+    不含任何变量的模板直接返回原文。变体字段名全局唯一，选中的结果直接写入传入的上下文。
+    """
+
+    __slots__ = ('source', 'fmt', 'choices', 'fields', 'is_static')
+
+    def __init__(self, source):
+        self.source = source
+        self.choices = []
+        self.fields = set()
+        pieces = []
+        self._parse(source, pieces)
+        self.fmt = ''.join(pieces)
+        self.is_static = not self.choices and not self.fields
+        if self.is_static:
+            self.fmt = source
+
+    def _parse(self, text, pieces):
+        i = 0
+        length = len(text)
+        while i < length:
+            ch = text[i]
+            if ch == '{':
+                end = _find_closing(text, i)
+                if end > 0:
+                    body = text[i + 1:end]
+                    field = FIELD_ALIASES.get(body.strip())
+                    if field:
+                        self.fields.add(field)
+                        pieces.append('{' + field + '}')
+                        i = end + 1
+                        continue
+                    options = _split_options(body)
+                    if len(options) > 1:
+                        name = f"_s{next(_choice_ids)}"
+                        compiled = [compile_template(option) for option in options]
+                        self.choices.append((name, [t.source if t.is_static else t for t in compiled]))
+                        pieces.append('{' + name + '}')
+                        i = end + 1
+                        continue
+                pieces.append('{{')
+            elif ch == '}':
+                pieces.append('}}')
+            else:
+                pieces.append(ch)
+            i += 1
+
+    def render(self, context=None, rng=random):
+        if self.is_static:
+            return self.source
+        if not isinstance(context, _Context):
+            context = _Context(context or {})
+        random_value = rng.random
+        for name, options in self.choices:
+            option = options[int(random_value() * len(options))]
+            context[name] = option if option.__class__ is str else option.render(context, rng)
+        return self.fmt.format_map(context)
+
+    def __repr__(self):
+        return f"MessageTemplate({self.source!r})"
+
+
+def _find_closing(text, start):
+    """找到与 start 处 { 配对的 }（支持嵌套），没有则返回 -1"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '{':
+            depth += 1
+        elif text[i] == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _split_options(body):
+    """按最外层的 | 切分随机变体选项"""
+    options = []
+    depth = 0
+    current = []
+    for ch in body:
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+        if ch == '|' and depth == 0:
+            options.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    options.append(''.join(current))
+    return options
+
+
+@lru_cache(maxsize=4096)
+def compile_template(text):
+    """编译模板（相同文本只编译一次）"""
+    return MessageTemplate(text or '')
+
+
+@lru_cache(maxsize=4)
+def _date_fields(minute):
+    now = datetime.fromtimestamp(minute * 60)
+    return {
+        'date': now.strftime('%Y-%m-%d'),
+        'time': now.strftime('%H:%M'),
+        'weekday': f"星期{_WEEKDAYS[now.weekday()]}",
+        'datetime': now.strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+def date_fields(timestamp=None):
+    """日期类变量，按分钟缓存"""
+    minute = int((timestamp if timestamp is not None else time.time()) // 60)
+    return _date_fields(minute)
+
+
+def contact_context(contact, group='', timestamp=None):
+    """由联系人信息生成渲染上下文：备注为空时用昵称，昵称为空时用 wxid；发给群时 {群名} 为群昵称"""
+    contact = contact or {}
+    wxid = contact.get('wxid', '')
+    nickname = contact.get('nickname') or wxid
+    context = _Context(date_fields(timestamp))
+    context['nickname'] = nickname
+    context['remark'] = (contact.get('remarks') or '').strip() or nickname
+    context['group'] = group or (nickname if '@chatroom' in wxid else '')
+    return context
+
+
+def render_template(text, context=None, rng=random):
+    return compile_template(text).render(context, rng)
@@ -0,0 +1,127 @@
+import threading
+
+from wechat_backend import get_wechat_backend
+
+
+class ProcessPoolError(RuntimeError):
+    pass
+
+
+class ProcessLease:
+    """一次借用：handle、base 在 release() 之前有效；release() 可重复调用。
+    归还的是借用时的那一份句柄，即使期间该 pid 的句柄已被替换"""
+
+    def __init__(self, pool, pid, entry):
+        self.pool = pool
+        self.pid = pid
+        self.handle = entry['handle']
+        self.base = entry['base']
+        self._entry = entry
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.pool._release_entry(self.pid, self._entry)
+
+
+class ProcessPool:
+    """按 pid 共享的微信进程句柄与基址。
+
+    同一个进程只在第一次借用时 OpenProcess 并解析基址，之后的借用直接复用；借用计数归零后句柄保持打开，
+    直到进程退出（账号注册表通知）或 close_all()。进程退出时仍有人在用的句柄等最后一次归还后再关闭。
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'reused': 0, 'closed': 0}
+
+    @property
+    def backend(self):
+        return self._backend or get_wechat_backend()
+
+    def acquire(self, pid):
+        """借用 pid 对应的句柄和基址，返回 ProcessLease；打开失败时抛出 ProcessPoolError"""
+        with self._lock:
+            entry = self._entries.get(pid)
+            if entry is not None and (entry['stale'] or entry['backend'] is not self.backend):
+                # 进程已退出（pid 可能被新进程复用）或全局微信接口被替换：旧句柄不再借出，
+                # 仍在使用的等最后一次归还时关闭
+                self._entries.pop(pid)
+                entry['stale'] = True
+                if entry['refs'] == 0:
+                    self._close(entry)
+                entry = None
+            if entry is None:
+                backend = self.backend
+                handle = backend.open_process(pid)
+                if not handle:
+                    raise ProcessPoolError("无法打开进程")
+                base = backend.get_base_address(pid)
+                if not base:
+                    backend.close_process(handle)
+                    raise ProcessPoolError("无法获取微信基址")
+                entry = {'handle': handle, 'base': base, 'refs': 0, 'stale': False, 'closed': False,
+                         'backend': backend}
+                self._entries[pid] = entry
+                self.stats['opened'] += 1
+            else:
+                self.stats['reused'] += 1
+            entry['refs'] += 1
+            return ProcessLease(self, pid, entry)
+
+    def _release_entry(self, pid, entry):
+        with self._lock:
+            entry['refs'] = max(0, entry['refs'] - 1)
+            if entry['stale'] and entry['refs'] == 0:
+                if self._entries.get(pid) is entry:
+                    self._entries.pop(pid)
+                if not entry['closed']:
+                    self._close(entry)
+
+    def invalidate(self, pid):
+        """进程退出：不再借出该句柄，没人在用时立即关闭，否则等最后一次归还"""
+        with self._lock:
+            entry = self._entries.pop(pid, None)
+            if entry is None:
+                return
+            entry['stale'] = True
+            if entry['refs'] == 0:
+                self._close(entry)
+
+    def close_all(self):
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+            for entry in entries:
+                entry['stale'] = True
+                if not entry['closed']:
+                    self._close(entry)
+
+    def _close(self, entry):
+        entry['closed'] = True
+        try:
+            entry['backend'].close_process(entry['handle'])
+        except Exception as e:
+            print(f"关闭进程句柄失败: {e}")
+        self.stats['closed'] += 1
+
+    def on_accounts_changed(self, accounts, added, removed):
+        for account in removed:
+            self.invalidate(account['pid'])
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """获取全局共享的进程句柄池（随账号注册表的进程退出通知失效）"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            from account_registry import get_account_registry
+            _process_pool = ProcessPool()
+            get_account_registry().add_listener(_process_pool.on_accounts_changed)
+        return _process_pool
@@ -0,0 +1,187 @@
+import re
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+
+REPEAT_HELP = ("重复规则：留空为只发送一次；@every 30m / 2h / 1d 表示固定间隔；"
+               "@hourly / @daily / @weekly / @monthly；或 5 段 cron 表达式“分 时 日 月 周”，"
+               "如 0 9 * * 1-5 表示工作日 9:00")
+
+_MACROS = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+_INTERVAL_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+_EVERY_RE = re.compile(r'^@every\s+(\d+)\s*([mhd])$', re.IGNORECASE)
+# 分 时 日 月 周 的取值范围
+_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+_FIELD_NAMES = ("分钟", "小时", "日期", "月份", "星期")
+_WEEKDAY_NAMES = "一二三四五六日"
+# 找不到下一次触发时间时最多向后查找的年数（如 2 月 30 日永远不会触发）
+_SEARCH_YEARS = 5
+
+
+class Recurrence:
+    """重复规则：固定间隔（@every）或 cron 表达式。
+
+    next_after() 直接跳到下一个可能的月/日/时/分计算下一次触发时间，不逐分钟扫描；
+    调用方每次触发后只需计算一次下一次时间放回调度堆。
+    """
+
+    def __init__(self, spec):
+        self.spec = (spec or '').strip()
+        self.interval = None
+        text = _MACROS.get(self.spec.lower(), self.spec)
+        match = _EVERY_RE.match(text)
+        if match:
+            self.interval = int(match.group(1)) * _INTERVAL_UNITS[match.group(2).lower()]
+            if self.interval <= 0:
+                raise ValueError("重复间隔必须大于 0")
+            return
+        parts = text.split()
+        if len(parts) != 5:
+            raise ValueError(f"无法识别的重复规则: {self.spec}")
+        fields = [_parse_field(part, low, high, name)
+                  for part, (low, high), name in zip(parts, _FIELD_RANGES, _FIELD_NAMES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        # cron 中 0 和 7 都表示星期日；转换成 Python 的 weekday()（周一为 0）
+        self.weekdays = {(d - 1) % 7 for d in weekdays}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+        self.sorted_minutes = sorted(self.minutes)
+        self.sorted_hours = sorted(self.hours)
+
+    def next_after(self, timestamp, anchor=None):
+        """严格晚于 timestamp 的下一次触发时间（秒）；固定间隔按 anchor 对齐。
+        永远不会触发的规则抛出 ValueError。"""
+        if self.interval is not None:
+            if anchor is None or anchor > timestamp:
+                return int(anchor if anchor is not None else timestamp + self.interval)
+            steps = int((timestamp - anchor) // self.interval) + 1
+            return int(anchor + steps * self.interval)
+
+        t = datetime.fromtimestamp(int(timestamp)).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        last_year = t.year + _SEARCH_YEARS
+        while t.year <= last_year:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                hour = next((h for h in self.sorted_hours if h > t.hour), None)
+                if hour is None:
+                    t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                else:
+                    t = t.replace(hour=hour, minute=0)
+                continue
+            if t.minute not in self.minutes:
+                minute = next((m for m in self.sorted_minutes if m > t.minute), None)
+                if minute is None:
+                    t = t.replace(minute=0) + timedelta(hours=1)
+                else:
+                    t = t.replace(minute=minute)
+                continue
+            return int(t.timestamp())
+        raise ValueError(f"重复规则 {self.spec} 在 {_SEARCH_YEARS} 年内不会触发")
+
+    def first_at_or_after(self, timestamp):
+        """不早于 timestamp 的第一次触发时间（新建/修改任务时用），固定间隔以 timestamp 为起点"""
+        if self.interval is not None:
+            return int(timestamp)
+        return self.next_after(int(timestamp) - 1)
+
+    def preview(self, start, count=10):
+        """从 start 开始（含）之后的 count 次触发时间"""
+        times = []
+        try:
+            current = self.first_at_or_after(start)
+            while len(times) < count:
+                times.append(current)
+                current = self.next_after(current, anchor=start)
+        except ValueError:
+            pass
+        return times
+
+    def describe(self):
+        if self.interval is not None:
+            for seconds, label in ((86400, '天'), (3600, '小时'), (60, '分钟')):
+                if self.interval % seconds == 0:
+                    return f"每 {self.interval // seconds} {label}"
+        if len(self.minutes) == 1 and len(self.hours) == 1 and self.any_day and len(self.months) == 12:
+            at = f"{self.sorted_hours[0]:02d}:{self.sorted_minutes[0]:02d}"
+            if self.any_weekday:
+                return f"每天 {at}"
+            days = ','.join(_WEEKDAY_NAMES[d] for d in sorted(self.weekdays))
+            return f"每周{days} {at}"
+        return f"cron {self.spec}"
+
+    def _day_matches(self, t):
+        day_ok = t.day in self.days
+        weekday_ok = t.weekday() in self.weekdays
+        # 与 cron 一致：日期和星期都有限定时满足其一即可
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+
+def _parse_field(text, low, high, name):
+    """解析 cron 的一段：* / 5 / 1-5 / 1,3,5 / */15 / 10-50/10"""
+    values = set()
+    for item in text.split(','):
+        step = 1
+        if '/' in item:
+            item, step_text = item.split('/', 1)
+            if not step_text.isdigit() or int(step_text) <= 0:
+                raise ValueError(f"{name}的步长无效: {text}")
+            step = int(step_text)
+        if item == '*':
+            start, end = low, high
+        elif '-' in item:
+            start_text, end_text = item.split('-', 1)
+            if not start_text.isdigit() or not end_text.isdigit():
+                raise ValueError(f"{name}的范围无效: {text}")
+            start, end = int(start_text), int(end_text)
+        elif item.isdigit():
+            start = int(item)
+            end = high if step > 1 else start
+        else:
+            raise ValueError(f"{name}无效: {text}")
+        if start < low or end > high or start > end:
+            raise ValueError(f"{name}超出范围 {low}-{high}: {text}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+@lru_cache(maxsize=256)
+def parse_recurrence(spec):
+    """解析重复规则（相同规则只解析一次）；空规则返回 None，格式错误抛出 ValueError"""
+    spec = (spec or '').strip()
+    return Recurrence(spec) if spec else None
+
+
+def describe_recurrence(spec):
+    """重复规则的简短说明，规则无效时原样返回"""
+    try:
+        recurrence = parse_recurrence(spec)
+    except ValueError:
+        return spec
+    return recurrence.describe() if recurrence else "不重复"
+
+
+def next_fire_time(spec, after=None, anchor=None):
+    """重复任务在 after（默认当前时间）之后的下一次触发时间；不重复或不会再触发时返回 None"""
+    try:
+        recurrence = parse_recurrence(spec)
+        if recurrence is None:
+            return None
+        return recurrence.next_after(time.time() if after is None else after, anchor=anchor)
+    except ValueError as e:
+        print(f"计算下一次触发时间失败: {e}")
+        return None
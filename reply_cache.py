@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+CACHE_FILE = os.path.join("config", "ai_reply_cache.json")
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 2000
+
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT = "?？!！。.,，~～…、;；:："
+
+
+def normalize_prompt(text):
+    """规范化用户问题：全角转半角、去空白、转小写、去掉结尾标点，使“多少钱？”与“多少钱”命中同一缓存"""
+    text = unicodedata.normalize('NFKC', text or '')
+    text = _SPACE_RE.sub('', text).lower()
+    return text.rstrip(_TRAILING_PUNCT)
+
+
+def make_cache_key(prompt, model='', system_prompt='', temperature=None):
+    raw = "\x1f".join([normalize_prompt(prompt), model or '', system_prompt or '', str(temperature)])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ReplyCache:
+    """AI 回复缓存：LRU + TTL + 容量上限，记录每条命中次数，延迟写盘以便重启后继续使用"""
+
+    def __init__(self, cache_file=CACHE_FILE, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, save_delay=5.0):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.save_delay = save_delay
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._save_timer = None
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            return
+        now = time.time()
+        with self._lock:
+            self.entries.clear()
+            items = sorted(
+                (item for item in (data.get('entries') or {}).items() if isinstance(item[1], dict)),
+                key=lambda kv: kv[1].get('last_used', 0)
+            )
+            for key, entry in items:
+                if now - entry.get('created', 0) < self.ttl and entry.get('reply'):
+                    self.entries[key] = entry
+            self._evict_overflow()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - entry['created'] >= self.ttl:
+                del self.entries[key]
+                self.misses += 1
+                self._schedule_save()
+                return None
+            entry['hits'] = entry.get('hits', 0) + 1
+            entry['last_used'] = now
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self._schedule_save()
+            return entry['reply']
+
+    def put(self, key, prompt, reply):
+        if not reply:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            self.entries[key] = {
+                'prompt': prompt,
+                'reply': reply,
+                'created': now,
+                'last_used': now,
+                'hits': previous.get('hits', 0) if previous else 0
+            }
+            self._evict_overflow()
+            self._schedule_save()
+
+    def _evict_overflow(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self._schedule_save()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'top': sorted(
+                    ((e.get('prompt', ''), e.get('hits', 0)) for e in self.entries.values()),
+                    key=lambda x: x[1], reverse=True
+                )[:10]
+            }
+
+    def _schedule_save(self):
+        self._dirty = True
+        if not self.cache_file or self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_delay, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def flush(self):
+        """立即把缓存写入磁盘（临时文件 + 原子替换）"""
+        with self._lock:
+            self._save_timer = None
+            if not self._dirty or not self.cache_file:
+                return
+            snapshot = {'entries': dict(self.entries), 'last_update': int(time.time())}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            temp_file = self.cache_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+        except Exception as e:
+            print(f"保存AI回复缓存失败: {e}")
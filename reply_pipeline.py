@@ -0,0 +1,196 @@
+import time
+import threading
+from collections import deque
+
+
+def _timer_schedule(delay, callback):
+    timer = threading.Timer(max(0.0, delay), callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class MessageCoalescer:
+    """按发送者合并连续发来的短消息。
+
+    每收到一条片段就把该发送者的等待窗口顺延 window 秒，窗口到期（或累计等待超过 max_wait 秒、
+    片段数达到 max_fragments）时把所有片段合并成一条，调用 on_flush(key, text, context)。
+    窗口到期由 schedule(delay, callback) 安排，on_flush 在 schedule 回调所在的线程中执行
+    （默认定时器线程；界面传入 QTimer.singleShot 的包装，合并后的消息就在界面线程中处理）。
+    schedule 不需要支持取消：窗口顺延后，旧的到期回调发现批次号已变化就直接返回。
+    """
+
+    def __init__(self, on_flush, window=3.0, max_wait=15.0, max_fragments=10, separator="\n", schedule=None):
+        self.on_flush = on_flush
+        self.schedule = schedule or _timer_schedule
+        self.window = window
+        self.max_wait = max_wait
+        self.max_fragments = max_fragments
+        self.separator = separator
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, text, context=None):
+        if not text:
+            return
+        now = time.monotonic()
+        with self._lock:
+            state = self._pending.get(key)
+            if state is None:
+                state = {'fragments': [], 'first': now, 'generation': 0, 'context': context}
+                self._pending[key] = state
+            state['generation'] += 1
+            generation = state['generation']
+            state['fragments'].append(text)
+            if context is not None:
+                state['context'] = context
+
+            delay = min(self.window, max(0.0, state['first'] + self.max_wait - now))
+            flush_now = len(state['fragments']) >= self.max_fragments or delay <= 0
+        if flush_now:
+            self.flush(key)
+        else:
+            self.schedule(delay, lambda: self.flush(key, generation))
+
+    def flush(self, key, generation=None):
+        """立即合并 key 的片段；generation 不是当前批次号时（窗口已顺延）什么也不做"""
+        with self._lock:
+            state = self._pending.get(key)
+            if state is None or (generation is not None and state['generation'] != generation):
+                return
+            del self._pending[key]
+        text = self.separator.join(state['fragments'])
+        try:
+            self.on_flush(key, text, state['context'])
+        except Exception as e:
+            print(f"合并消息处理失败: {e}")
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def cancel_all(self):
+        with self._lock:
+            self._pending = {}
+
+
+class YuanbaoRouteTable:
+    """元宝客服转发路由表。
+
+    转发问题时记录 (账号pid -> 应回复的好友/群)，客服回答到达时按收到回答的账号 pid
+    以 O(1) 取出最早一条未回答的转发。距上一段不超过 segment_gap 秒的回答视为同一回答的后续段，
+    沿用上一段的去向，不会取走排在后面的其他人的转发；没有待回答的转发时，sticky_ttl 秒内的回答
+    也沿用上一次的去向。超过 ttl 秒仍未回答的转发视为过期丢弃。
+    """
+
+    def __init__(self, ttl=600, sticky_ttl=120, max_per_account=500, segment_gap=8):
+        self.ttl = ttl
+        self.sticky_ttl = sticky_ttl
+        self.segment_gap = segment_gap
+        self.max_per_account = max_per_account
+        self._pending = {}
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def record(self, pid, target_wxid, member_id=''):
+        route = {'target': target_wxid, 'member_id': member_id, 'time': time.monotonic()}
+        with self._lock:
+            queue = self._pending.get(pid)
+            if queue is None:
+                queue = self._pending[pid] = deque()
+            queue.append(route)
+            while len(queue) > self.max_per_account:
+                queue.popleft()
+
+    def resolve(self, pid):
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(pid)
+            if last and now - last['time'] < self.segment_gap:
+                # 同一回答的后续段
+                last['time'] = now
+                return last
+            queue = self._pending.get(pid)
+            while queue:
+                route = queue.popleft()
+                if now - route['time'] < self.ttl:
+                    route['time'] = now
+                    self._last[pid] = route
+                    return route
+            if last and now - last['time'] < self.sticky_ttl:
+                last['time'] = now
+                return last
+        return None
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            for pid, queue in list(self._pending.items()):
+                while queue and now - queue[0]['time'] >= self.ttl:
+                    queue.popleft()
+                if not queue:
+                    del self._pending[pid]
+            for pid, last in list(self._last.items()):
+                if now - last['time'] >= self.sticky_ttl:
+                    del self._last[pid]
+
+
+class ReplyChunker:
+    """把流式返回的增量文本切成按句/按段的消息片段。
+
+    feed() 返回已凑满的片段：遇到句末标点或换行且累计不少于 min_chars 字时切一段，
+    超过 max_chars 仍无句末标点时强制切段。已发出 max_chunks-1 段后不再切分，
+    剩余内容在 finish() 时合并为最后一段。
+    """
+
+    SENTENCE_ENDS = "。！？!?；;…\n"
+
+    def __init__(self, min_chars=8, max_chars=200, max_chunks=5):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.max_chunks = max(1, int(max_chunks or 1))
+        self.emitted = 0
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text or ""
+        chunks = []
+        while self.emitted + len(chunks) < self.max_chunks - 1:
+            cut = self._find_cut()
+            if cut <= 0:
+                break
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+        self.emitted += len(chunks)
+        return chunks
+
+    def _find_cut(self):
+        buffer = self._buffer
+        # 增量记录 buffer[:i + 1] 首尾非空白字符的位置，strip 后的长度即 last - first + 1
+        first = last = -1
+        for i, ch in enumerate(buffer):
+            if not ch.isspace():
+                if first < 0:
+                    first = i
+                last = i
+            stripped = last - first + 1 if first >= 0 else 0
+            if ch in self.SENTENCE_ENDS and stripped >= self.min_chars:
+                end = i + 1
+                while end < len(buffer) and buffer[end] in self.SENTENCE_ENDS:
+                    end += 1
+                if end == len(buffer) and ch != "\n":
+                    return 0
+                return end
+            if i + 1 >= self.max_chars:
+                return i + 1
+        return 0
+
+    def finish(self):
+        chunk = self._buffer.strip()
+        self._buffer = ""
+        if not chunk:
+            return []
+        self.emitted += 1
+        return [chunk]
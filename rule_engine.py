@@ -0,0 +1,410 @@
+import re
+import time
+import threading
+
+
+SCOPE_FIELDS = ('accounts', 'chats', 'chat_sets')
+SCOPE_LABELS = {'accounts': '账号', 'chats': '聊天', 'chat_sets': '分组'}
+_SCOPE_SPLIT_RE = re.compile(r"[;；]")
+_VALUE_SPLIT_RE = re.compile(r"[,，\s]+")
+
+MATCH_TYPES = {'keyword': '关键词', 'regex': '正则', 'wildcard': '通配符'}
+PATTERN_TYPES = ('regex', 'wildcard')
+MAX_PATTERN_INPUT = 2000
+# (a+)+、(\w*)* 这类嵌套量词在不匹配时可能指数级回溯
+_NESTED_QUANTIFIER_RE = re.compile(r"\((?:[^()\\]|\\.)*[+*](?:[^()\\]|\\.)*\)(?:[+*]|\{\d*,\d*\})")
+
+
+def wildcard_to_regex(text):
+    """通配符转正则：* 匹配任意多个字符，? 匹配一个字符，其余按字面匹配（不区分大小写、可出现在消息任意位置）"""
+    parts = []
+    for ch in text:
+        if ch == '*':
+            parts.append('.*?')
+        elif ch == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(ch))
+    return ''.join(parts)
+
+
+def compile_rule_pattern(rule):
+    """编译正则/通配符规则，返回 (编译结果, 是否有回溯风险)；规则写法错误时抛出 re.error"""
+    keyword = (rule.get('keyword') or '').strip()
+    if rule.get('match_type') == 'wildcard':
+        return re.compile(wildcard_to_regex(keyword), re.IGNORECASE | re.DOTALL), False
+    return re.compile(keyword), bool(_NESTED_QUANTIFIER_RE.search(keyword))
+
+
+def rule_key(rule):
+    """规则唯一标识：全局规则就是关键词本身（兼容旧数据），限定范围的规则再拼上范围"""
+    keyword = rule.get('keyword', '')
+    scope = [",".join(sorted(rule.get(field) or ())) for field in SCOPE_FIELDS]
+    match_type = rule.get('match_type') or 'keyword'
+    if match_type != 'keyword':
+        scope.append(match_type)
+    if not any(scope):
+        return keyword
+    return "\x1f".join([keyword] + scope)
+
+
+def format_scope(rule):
+    """把规则范围格式化为 “账号=a,b; 聊天=c; 分组=g”，全局规则返回空字符串"""
+    parts = []
+    for field in SCOPE_FIELDS:
+        values = rule.get(field) or ()
+        if values:
+            parts.append(f"{SCOPE_LABELS[field]}={','.join(values)}")
+    return "; ".join(parts)
+
+
+def parse_scope(text):
+    """解析 format_scope 的文本，返回 {'accounts': [...], 'chats': [...], 'chat_sets': [...]}"""
+    fields = {label: field for field, label in SCOPE_LABELS.items()}
+    fields.update({field: field for field in SCOPE_FIELDS})
+    scope = {field: [] for field in SCOPE_FIELDS}
+    for part in _SCOPE_SPLIT_RE.split(text or ''):
+        if not part.strip():
+            continue
+        name, sep, values = part.replace('：', '=').replace(':', '=').partition('=')
+        field = fields.get(name.strip())
+        if not sep or field is None:
+            raise ValueError(f"无法识别的适用范围: {part.strip()}")
+        for value in _VALUE_SPLIT_RE.split(values.strip()):
+            if value and value not in scope[field]:
+                scope[field].append(value)
+    return scope
+
+
+def diff_rules(old_rules, new_rules):
+    """比较两份 {规则标识: 规则} 字典，返回 (新增, 删除, 修改) 三个规则列表"""
+    added = [rule for key, rule in new_rules.items() if key not in old_rules]
+    removed = [rule for key, rule in old_rules.items() if key not in new_rules]
+    modified = [rule for key, rule in new_rules.items()
+                if key in old_rules and old_rules[key] != rule]
+    return added, removed, modified
+
+
+class RuleMatcher:
+    """关键词规则匹配器。
+
+    精准匹配用 {去空白关键词: 规则} 字典直接查找；模糊匹配按关键词前两个字符（单字关键词按该字）
+    分桶，只检查消息中出现过的双字/单字对应的桶。正则/通配符规则在加入时编译一次，按优先级依次执行，
+    单条耗时超过 slow_ms 毫秒记一次慢匹配，累计 quarantine_after 次后隔离不再执行。
+    规则变化时按新增/删除/修改增量更新索引，结果按优先级（大者优先）再按规则顺序排列。
+    """
+
+    def __init__(self, rules=None, slow_ms=20, quarantine_after=3):
+        self.slow_ms = slow_ms
+        self.quarantine_after = quarantine_after
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._exact = {}
+        self._fuzzy = {}
+        self._patterns = {}
+        self._pattern_order = None
+        self._next_order = 0
+        if rules:
+            self.rebuild(rules)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, rules):
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._fuzzy.clear()
+            self._patterns.clear()
+            self._pattern_order = None
+            self._next_order = 0
+            for rule in rules:
+                self._add(rule)
+
+    def apply_diff(self, added=(), removed=(), modified=()):
+        with self._lock:
+            for rule in removed:
+                self._remove(rule_key(rule))
+            for rule in modified:
+                entry = self._entries.get(rule_key(rule))
+                self._add(rule, order=entry['order'] if entry else None)
+            for rule in added:
+                self._add(rule)
+
+    def add(self, rule, order=None):
+        with self._lock:
+            self._add(rule, order)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _add(self, rule, order=None):
+        key = rule_key(rule)
+        keyword = rule.get('keyword', '')
+        if key in self._entries:
+            self._remove(key)
+        if order is None:
+            order = self._next_order
+            self._next_order += 1
+        else:
+            self._next_order = max(self._next_order, order + 1)
+        entry = {
+            'key': key,
+            'keyword': keyword,
+            'reply': rule.get('reply', ''),
+            'enabled': rule.get('enabled', True),
+            'order': order,
+            'priority': _to_int(rule.get('priority', 0)),
+            'match_type': rule.get('match_type') or 'keyword',
+            'exact_key': keyword.strip(),
+            'needle': keyword.strip().lower()
+        }
+        self._entries[key] = entry
+        if entry['match_type'] in PATTERN_TYPES:
+            entry.update(pattern=None, error='', risky=False, slow_count=0, max_ms=0.0, quarantined=False)
+            try:
+                entry['pattern'], entry['risky'] = compile_rule_pattern(rule)
+            except re.error as e:
+                entry['error'] = str(e)
+            if entry['risky']:
+                print(f"规则 {keyword} 含嵌套量词，可能导致匹配缓慢")
+            self._patterns[key] = entry
+            self._pattern_order = None
+            return
+        self._exact.setdefault(entry['exact_key'], {})[key] = entry
+        if entry['needle']:
+            self._fuzzy.setdefault(entry['needle'][:2], {})[key] = entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if key in self._patterns:
+            del self._patterns[key]
+            self._pattern_order = None
+            return
+        bucket = self._exact.get(entry['exact_key'])
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._exact[entry['exact_key']]
+        if entry['needle']:
+            bucket = self._fuzzy.get(entry['needle'][:2])
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._fuzzy[entry['needle'][:2]]
+
+    def match(self, content, exact=True, fuzzy=True, patterns=True, deadline=None):
+        """返回命中的已启用规则列表；精准匹配有结果时不再做模糊匹配，正则/通配符规则始终参与并按优先级排序。
+
+        deadline 为 time.perf_counter() 的截止时间，超过后剩余的正则/通配符规则不再执行。
+        """
+        content = (content or '').strip()
+        with self._lock:
+            matched = []
+            if exact:
+                matched = [e for e in self._exact.get(content, {}).values() if e['enabled']]
+            if not matched and fuzzy and content:
+                low_content = content.lower()
+                prefixes = set(low_content)
+                prefixes.update(low_content[i:i + 2] for i in range(len(low_content) - 1))
+                for prefix in prefixes:
+                    for entry in self._fuzzy.get(prefix, {}).values():
+                        if entry['enabled'] and entry['needle'] in low_content:
+                            matched.append(entry)
+            if patterns and content and self._patterns:
+                matched.extend(self._match_patterns(content[:MAX_PATTERN_INPUT], deadline))
+            matched.sort(key=lambda e: (-e['priority'], e['order']))
+            return [_public_entry(e) for e in matched]
+
+    def _match_patterns(self, text, deadline):
+        if self._pattern_order is None:
+            self._pattern_order = sorted(self._patterns.values(), key=lambda e: (-e['priority'], e['order']))
+        matched = []
+        for entry in self._pattern_order:
+            if not entry['enabled'] or entry['pattern'] is None or entry['quarantined']:
+                continue
+            start = time.perf_counter()
+            if deadline is not None and start > deadline:
+                break
+            hit = entry['pattern'].search(text)
+            cost_ms = (time.perf_counter() - start) * 1000
+            if cost_ms > entry['max_ms']:
+                entry['max_ms'] = cost_ms
+            if cost_ms > self.slow_ms:
+                entry['slow_count'] += 1
+                if entry['slow_count'] >= self.quarantine_after:
+                    entry['quarantined'] = True
+                    print(f"规则 {entry['keyword']} 多次匹配超时（最长 {entry['max_ms']:.1f}ms），已暂停使用")
+            if hit:
+                matched.append(entry)
+        return matched
+
+    def pattern_issues(self):
+        """写法错误、有回溯风险、匹配过慢或已隔离的正则/通配符规则"""
+        with self._lock:
+            return [{
+                'keyword': e['keyword'], 'match_type': e['match_type'], 'error': e['error'],
+                'risky': e['risky'], 'slow_count': e['slow_count'], 'max_ms': e['max_ms'],
+                'quarantined': e['quarantined']
+            } for e in self._patterns.values() if e['error'] or e['risky'] or e['slow_count']]
+
+
+def describe_pattern_issue(issue):
+    """pattern_issues() 中一条问题的说明文字"""
+    if issue.get('error'):
+        return f"写法错误，已跳过：{issue['error']}"
+    parts = []
+    if issue.get('risky'):
+        parts.append("含嵌套量词，可能导致匹配缓慢")
+    if issue.get('slow_count'):
+        parts.append(f"{issue['slow_count']} 次匹配超时（最长 {issue.get('max_ms', 0):.1f}ms）")
+    if issue.get('quarantined'):
+        parts.append("已暂停使用")
+    return "；".join(parts)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _public_entry(entry):
+    return {
+        'keyword': entry['keyword'], 'reply': entry['reply'], 'enabled': entry['enabled'],
+        'order': entry['order'], 'priority': entry['priority'], 'match_type': entry['match_type']
+    }
+
+
+class ScopedRuleMatcher:
+    """按 (账号, 聊天) 分区的规则匹配器。
+
+    每条规则按适用账号 × 适用聊天（聊天分组展开为成员）放入对应分区的 RuleMatcher，
+    未限定的一侧用 '' 表示全部。一条消息只查 ('',''), (账号,''), ('',聊天), (账号,聊天) 四个分区。
+    聊天分组成员变化时只重建引用了该分组的规则。mode 为 'first' 时只返回优先级最高的一条。
+    """
+
+    def __init__(self, rules=None, chat_sets=None):
+        self._lock = threading.RLock()
+        self._matchers = {}
+        self._rules = {}
+        self._chat_sets = {}
+        self._next_order = 0
+        self.budget_overruns = 0
+        if chat_sets:
+            self.set_chat_sets(chat_sets)
+        if rules:
+            self.rebuild(rules)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def partition_count(self):
+        return len(self._matchers)
+
+    def _slots(self, rule):
+        accounts = rule.get('accounts') or ['']
+        chats = set(rule.get('chats') or ())
+        for name in rule.get('chat_sets') or ():
+            chats.update(self._chat_sets.get(name, ()))
+        if not chats:
+            if rule.get('chat_sets') and not rule.get('chats'):
+                return []
+            chats = {''}
+        return [(account, chat) for account in accounts for chat in chats]
+
+    def _add(self, rule, order=None):
+        key = rule_key(rule)
+        if key in self._rules:
+            self._remove(key)
+        if order is None:
+            order = self._next_order
+            self._next_order += 1
+        slots = self._slots(rule)
+        for slot in slots:
+            matcher = self._matchers.get(slot)
+            if matcher is None:
+                matcher = self._matchers[slot] = RuleMatcher()
+            matcher.add(rule, order)
+        self._rules[key] = {'rule': rule, 'order': order, 'slots': slots}
+
+    def _remove(self, key):
+        item = self._rules.pop(key, None)
+        if item is None:
+            return
+        for slot in item['slots']:
+            matcher = self._matchers.get(slot)
+            if matcher is not None:
+                matcher.remove(key)
+                if not len(matcher):
+                    del self._matchers[slot]
+
+    def rebuild(self, rules):
+        with self._lock:
+            self._matchers.clear()
+            self._rules.clear()
+            self._next_order = 0
+            for rule in rules:
+                self._add(rule)
+
+    def apply_diff(self, added=(), removed=(), modified=()):
+        with self._lock:
+            for rule in removed:
+                self._remove(rule_key(rule))
+            for rule in modified:
+                item = self._rules.get(rule_key(rule))
+                self._add(rule, order=item['order'] if item else None)
+            for rule in added:
+                self._add(rule)
+
+    def set_chat_sets(self, chat_sets):
+        """更新聊天分组 {分组名: [聊天wxid, ...]}，只重新索引成员有变化的分组引用的规则"""
+        chat_sets = {name: set(members or ()) for name, members in (chat_sets or {}).items()}
+        with self._lock:
+            changed = {name for name in set(chat_sets) | set(self._chat_sets)
+                       if chat_sets.get(name) != self._chat_sets.get(name)}
+            self._chat_sets = chat_sets
+            if not changed:
+                return
+            for key, item in list(self._rules.items()):
+                if changed.intersection(item['rule'].get('chat_sets') or ()):
+                    self._add(item['rule'], order=item['order'])
+
+    def matchers_for(self, account='', chat=''):
+        slots = {('', ''), (account or '', ''), ('', chat or ''), (account or '', chat or '')}
+        return [self._matchers[slot] for slot in slots if slot in self._matchers]
+
+    def match(self, content, exact=True, fuzzy=True, account='', chat='', mode='all', budget_ms=None):
+        """只在该账号/聊天适用的分区内匹配；任一分区精准命中时不再做模糊匹配，正则/通配符规则始终参与。
+
+        budget_ms 为单条消息的正则/通配符匹配总时长上限（毫秒），超出后跳过剩余规则。
+        """
+        deadline = time.perf_counter() + budget_ms / 1000.0 if budget_ms else None
+        with self._lock:
+            matchers = self.matchers_for(account, chat)
+        matched = []
+        if exact:
+            for matcher in matchers:
+                matched.extend(matcher.match(content, exact=True, fuzzy=False, patterns=False))
+        fuzzy = fuzzy and not matched
+        for matcher in matchers:
+            matched.extend(matcher.match(content, exact=False, fuzzy=fuzzy, patterns=True, deadline=deadline))
+        if deadline is not None and time.perf_counter() > deadline:
+            self.budget_overruns += 1
+        matched.sort(key=lambda r: (-r['priority'], r['order']))
+        return matched[:1] if mode == 'first' else matched
+
+    def pattern_issues(self):
+        with self._lock:
+            matchers = list(self._matchers.values())
+        issues = {}
+        for matcher in matchers:
+            for issue in matcher.pattern_issues():
+                key = (issue['keyword'], issue['match_type'])
+                if key not in issues or issue['slow_count'] > issues[key]['slow_count']:
+                    issues[key] = issue
+        return list(issues.values())
@@ -0,0 +1,172 @@
+import os
+import re
+import csv
+import json
+import codecs
+
+from rule_engine import rule_key, compile_rule_pattern, MATCH_TYPES, PATTERN_TYPES
+
+
+KEYWORD_COLUMNS = ('关键词', 'keyword')
+REPLY_COLUMNS = ('回复内容', 'reply')
+ENABLED_COLUMNS = ('启用状态', 'enabled')
+MATCH_TYPE_COLUMNS = ('匹配类型', 'match_type')
+PRIORITY_COLUMNS = ('优先级', 'priority')
+_MATCH_TYPE_NAMES = {name: code for code, name in MATCH_TYPES.items()}
+SCOPE_COLUMNS = {
+    'accounts': ('适用账号', 'accounts'),
+    'chats': ('适用聊天', 'chats'),
+    'chat_sets': ('聊天分组', 'chat_sets')
+}
+_FALSE_VALUES = {'false', '0', '否', '禁用', 'no', 'off'}
+
+
+def _parse_enabled(value):
+    if value is None or value == '':
+        return True
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in _FALSE_VALUES
+
+
+def _parse_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).replace('，', ',').split(',') if v.strip()]
+
+
+def _pick(row, columns):
+    for column in columns:
+        if column in row:
+            return row[column]
+    return None
+
+
+def _has_required_columns(headers):
+    headers = set(headers)
+    return bool(headers.intersection(KEYWORD_COLUMNS)) and bool(headers.intersection(REPLY_COLUMNS))
+
+
+def _iter_xlsx(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        headers = [str(cell).strip() if cell is not None else '' for cell in (header_row or ())]
+        if not _has_required_columns(headers):
+            raise ValueError("Excel文件必须包含'关键词'和'回复内容'列")
+        for row in rows:
+            yield dict(zip(headers, row))
+    finally:
+        wb.close()
+
+
+def _detect_csv_encoding(path, chunk_size=65536):
+    """逐块按 UTF-8 解码整个文件判断编码（开头全是 ASCII、中文在后面的 GBK 文件也能识别）：
+    全部能解码则用 utf-8-sig，否则按 Excel 中文版默认的 gbk"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+
+def _iter_csv(path):
+    encoding = _detect_csv_encoding(path)
+    try:
+        with open(path, 'r', encoding=encoding, newline='') as f:
+            reader = csv.DictReader(f)
+            if not _has_required_columns(reader.fieldnames or ()):
+                raise ValueError("CSV文件必须包含'关键词'和'回复内容'列")
+            for row in reader:
+                yield row
+    except UnicodeDecodeError as e:
+        raise ValueError(f"CSV文件编码无法识别，请另存为 UTF-8 或 GBK 编码: {e}")
+
+
+def _iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield {}
+                continue
+            yield row if isinstance(row, dict) else {}
+
+
+READERS = {
+    '.xlsx': _iter_xlsx,
+    '.csv': _iter_csv,
+    '.jsonl': _iter_jsonl
+}
+
+
+def iter_rule_rows(path):
+    """按行流式读取规则文件（xlsx 只读模式 / csv / jsonl），逐行产出原始字典"""
+    ext = os.path.splitext(path)[1].lower()
+    reader = READERS.get(ext)
+    if reader is None:
+        raise ValueError("仅支持 .xlsx / .csv / .jsonl 格式的规则导入")
+    return reader(path)
+
+
+def read_rules_file(path, existing_keys=()):
+    """读取并校验规则文件，返回 (新规则列表, 统计)。
+
+    关键词或回复为空、正则/通配符写法错误的行计为无效；文件内重复的规则（关键词 + 适用范围相同）保留第一条；
+    existing_keys 中已存在的规则跳过。
+    """
+    existing = set(existing_keys)
+    seen = set()
+    rules = []
+    stats = {'total': 0, 'invalid': 0, 'dup_in_file': 0, 'dup_exists': 0}
+    for row in iter_rule_rows(path):
+        stats['total'] += 1
+        keyword = _pick(row, KEYWORD_COLUMNS)
+        reply = _pick(row, REPLY_COLUMNS)
+        keyword = str(keyword).strip() if keyword is not None else ''
+        reply = str(reply).strip() if reply is not None else ''
+        if not keyword or not reply:
+            stats['invalid'] += 1
+            continue
+        rule = {'keyword': keyword, 'reply': reply, 'enabled': _parse_enabled(_pick(row, ENABLED_COLUMNS))}
+        match_type = str(_pick(row, MATCH_TYPE_COLUMNS) or '').strip()
+        match_type = _MATCH_TYPE_NAMES.get(match_type, match_type)
+        if match_type in PATTERN_TYPES:
+            try:
+                compile_rule_pattern({'keyword': keyword, 'match_type': match_type})
+            except re.error:
+                stats['invalid'] += 1
+                continue
+            rule['match_type'] = match_type
+        try:
+            priority = int(float(_pick(row, PRIORITY_COLUMNS) or 0))
+        except (TypeError, ValueError):
+            priority = 0
+        if priority:
+            rule['priority'] = priority
+        for field, columns in SCOPE_COLUMNS.items():
+            values = _parse_list(_pick(row, columns))
+            if values:
+                rule[field] = values
+        key = rule_key(rule)
+        if key in seen:
+            stats['dup_in_file'] += 1
+            continue
+        seen.add(key)
+        if key in existing:
+            stats['dup_exists'] += 1
+            continue
+        rules.append(rule)
+    return rules, stats
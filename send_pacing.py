@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import random
+import threading
+from datetime import datetime
+
+
+PACING_FILE = os.path.join("config", "send_pacing.json")
+
+
+class SendPacer:
+    """按账号自适应调整发送间隔（AIMD）。
+
+    每个账号的每个发送通道（mass 群发、reply 自动回复、add_friend 添加好友，间隔单位沿用调用方）
+    记住一个当前间隔：发送成功且耗时正常时间隔线性缩短
+    （连续 SPEEDUP_STEPS 次快速成功可从设置的上限降到下限）；发送变慢时线性放慢；
+    发送失败时乘以 FAILURE_FACTOR；收到“操作过于频繁”时该账号所有通道乘以 RATE_LIMIT_FACTOR，
+    并在 COOLDOWN_SECONDS 内不再提速。间隔最多放大到设置上限的 BACKOFF_CEILING 倍，
+    实际等待时间在当前间隔上加 ±JITTER 的随机抖动。
+    学到的间隔按账号 wxid 保存到 send_pacing.json，重启后继续使用；只知道 PID 的账号不保存。
+    """
+
+    SPEEDUP_STEPS = 20
+    FAILURE_FACTOR = 1.5
+    RATE_LIMIT_FACTOR = 4.0
+    BACKOFF_CEILING = 4.0
+    SLOW_LATENCY_MS = 3000.0
+    COOLDOWN_SECONDS = 1800
+    # 短时间内重复出现的频繁提示只算一次
+    RATE_LIMIT_DEBOUNCE_SECONDS = 60
+    JITTER = 0.2
+    SAVE_DELAY = 5.0
+
+    def __init__(self, path=PACING_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._accounts = {}
+        self._aliases = {}
+        self._save_timer = None
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                accounts = data.get('accounts') if isinstance(data, dict) else None
+                if isinstance(accounts, dict):
+                    self._accounts = accounts
+        except Exception as e:
+            print(f"读取发送节奏记录失败: {e}")
+
+    def bind(self, pid, wxid):
+        """记录 PID 对应的账号 wxid，之后用 PID 调用时按 wxid 记账"""
+        if pid and wxid:
+            with self._lock:
+                self._aliases[pid] = wxid
+
+    def _key(self, account):
+        if account in self._aliases:
+            return self._aliases[account]
+        if isinstance(account, str) and account and not account.isdigit():
+            return account
+        return f"pid:{account}"
+
+    def _account_state(self, account):
+        key = self._key(account)
+        state = self._accounts.get(key)
+        if state is None:
+            state = self._accounts[key] = {'cooldown_until': 0, 'last_rate_limit': 0, 'channels': {}}
+        return state
+
+    def _channel_state(self, account, channel, min_delay=None, max_delay=None):
+        account_state = self._account_state(account)
+        state = account_state['channels'].get(channel)
+        if state is None:
+            if min_delay is None:
+                return None
+            # 冷却期内新出现的通道从上限开始
+            cooling = account_state.get('cooldown_until', 0) > time.time()
+            state = account_state['channels'][channel] = {
+                'delay': max_delay if cooling else (min_delay + max_delay) / 2.0,
+                'latency_ms': None, 'successes': 0, 'failures': 0, 'rate_limits': 0,
+            }
+        if min_delay is not None:
+            state['min'] = min_delay
+            state['max'] = max_delay
+        return state
+
+    @classmethod
+    def _bounds(cls, state):
+        low = max(0.0, float(state.get('min') or 0))
+        high = max(low, float(state.get('max') or 0))
+        step = max((high - low) / cls.SPEEDUP_STEPS, high * 0.02)
+        return low, high, high * cls.BACKOFF_CEILING, step
+
+    def next_delay(self, account, channel, min_delay, max_delay, rng=random):
+        """下一次发送前应等待的时间（与 min_delay/max_delay 同单位）；两者都为 0 时不等待"""
+        if max_delay <= 0 and min_delay <= 0:
+            return 0
+        with self._lock:
+            state = self._channel_state(account, channel, min_delay, max(min_delay, max_delay))
+            low, high, ceiling, _ = self._bounds(state)
+            delay = min(max(state['delay'], low), ceiling)
+            state['delay'] = delay
+        jittered = delay * (1 + self.JITTER * (2 * rng.random() - 1))
+        return min(max(jittered, low), ceiling)
+
+    def record_success(self, account, channel, latency_ms=None):
+        with self._lock:
+            state = self._channel_state(account, channel)
+            if state is None:
+                return
+            low, high, ceiling, step = self._bounds(state)
+            state['successes'] += 1
+            average = state.get('latency_ms')
+            slow = False
+            if latency_ms is not None:
+                slow = latency_ms > self.SLOW_LATENCY_MS or (average is not None and latency_ms > average * 3)
+                state['latency_ms'] = latency_ms if average is None else average * 0.8 + latency_ms * 0.2
+            if slow:
+                state['delay'] = min(ceiling, state['delay'] + step)
+            elif self._account_state(account).get('cooldown_until', 0) <= time.time():
+                state['delay'] = max(low, state['delay'] - step)
+            self._mark_dirty()
+
+    def record_failure(self, account, channel):
+        with self._lock:
+            state = self._channel_state(account, channel)
+            if state is None:
+                return
+            low, high, ceiling, step = self._bounds(state)
+            state['failures'] += 1
+            state['delay'] = min(ceiling, max(state['delay'] * self.FAILURE_FACTOR, state['delay'] + step))
+            self._mark_dirty()
+
+    def record_rate_limit(self, account):
+        """账号收到“操作过于频繁”：所有通道大幅放慢并进入冷却期，立即保存"""
+        now = time.time()
+        with self._lock:
+            account_state = self._account_state(account)
+            if now - account_state.get('last_rate_limit', 0) < self.RATE_LIMIT_DEBOUNCE_SECONDS:
+                return
+            account_state['last_rate_limit'] = now
+            account_state['cooldown_until'] = now + self.COOLDOWN_SECONDS
+            for channel, state in account_state['channels'].items():
+                low, high, ceiling, step = self._bounds(state)
+                state['rate_limits'] = state.get('rate_limits', 0) + 1
+                state['delay'] = min(ceiling, max(state['delay'] * self.RATE_LIMIT_FACTOR, high))
+            print(f"账号 {self._key(account)} 触发频率限制，发送间隔已放慢，"
+                  f"{self.COOLDOWN_SECONDS // 60} 分钟内不再提速")
+            self._dirty = True
+        self.flush()
+
+    def snapshot(self, account=None):
+        """当前学到的间隔（用于显示/调试）"""
+        with self._lock:
+            if account is not None:
+                return json.loads(json.dumps(self._accounts.get(self._key(account), {})))
+            return json.loads(json.dumps(self._accounts))
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.SAVE_DELAY, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def flush(self):
+        """把按 wxid 记录的账号状态原子写盘"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return False
+            data = {
+                'accounts': {key: state for key, state in self._accounts.items() if not key.startswith('pid:')},
+                'last_update': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                temp_file = self.path + '.tmp'
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(temp_file, self.path)
+            except Exception as e:
+                print(f"保存发送节奏记录失败: {e}")
+                return False
+            self._dirty = False
+            return True
+
+
+_send_pacer = None
+_send_pacer_lock = threading.Lock()
+
+
+def get_send_pacer():
+    """获取全局共享的发送节奏控制器"""
+    global _send_pacer
+    with _send_pacer_lock:
+        if _send_pacer is None:
+            _send_pacer = SendPacer()
+        return _send_pacer
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+
+PROFILE_ENV = "WECHAT_STARTUP_PROFILE"
+PROFILE_ARG = "--profile-startup"
+
+
+class StartupProfile:
+    """记录启动各阶段耗时（导入、构建界面、延迟构建的标签页等）。
+
+    stage() 记录一段代码的耗时和期间新导入的模块数，mark() 记录从启动到某个时刻的时间。
+    用 --profile-startup 参数或环境变量 WECHAT_STARTUP_PROFILE=1 启动时，report() 打印类似
+    -X importtime 的分阶段耗时表；需要逐个模块的导入耗时时用 python -X importtime main.py。
+    """
+
+    def __init__(self, enabled=None):
+        self.t0 = time.perf_counter()
+        if enabled is None:
+            enabled = PROFILE_ARG in sys.argv or os.environ.get(PROFILE_ENV, '') not in ('', '0')
+        self.enabled = enabled
+        self.stages = []
+        self.marks = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages.append((name, start - self.t0, elapsed, len(sys.modules) - modules_before))
+            if self.enabled and self.marks:
+                # 启动完成后才构建的部分（例如首次打开的标签页）单独打印
+                print(f"[启动分析] {name}: {elapsed * 1000:.1f} ms")
+
+    def mark(self, name):
+        """记录从启动到现在的时间，返回秒数"""
+        elapsed = time.perf_counter() - self.t0
+        with self._lock:
+            self.marks.append((name, elapsed))
+        return elapsed
+
+    def elapsed(self, name):
+        for stage in self.stages:
+            if stage[0] == name:
+                return stage[2]
+        return None
+
+    def report(self, force=False):
+        if not (self.enabled or force):
+            return ''
+        lines = ["[启动分析] 阶段                              开始(ms)    耗时(ms)  新导入模块"]
+        for name, start, elapsed, modules in self.stages:
+            lines.append(f"[启动分析] {name:<30}{start * 1000:>10.1f}{elapsed * 1000:>12.1f}{modules:>11}")
+        for name, elapsed in self.marks:
+            lines.append(f"[启动分析] {name:<30}{elapsed * 1000:>10.1f}")
+        text = "\n".join(lines)
+        print(text)
+        return text
+
+
+_startup_profile = None
+
+
+def get_startup_profile():
+    """进程内共享的启动分析记录（第一次调用的时刻作为起点）"""
+    global _startup_profile
+    if _startup_profile is None:
+        _startup_profile = StartupProfile()
+    return _startup_profile
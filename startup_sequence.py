@@ -0,0 +1,96 @@
+import threading
+
+from startup_profile import get_startup_profile
+
+
+class StartupSequence:
+    """按依赖关系执行启动阶段：一个阶段在它依赖的阶段全部完成后立即开始，不再按固定延时排队。
+
+    每个阶段的耗时记入启动分析（startup_profile），完成时刻记为“就绪: 阶段名”。
+    background=True 的阶段在后台线程中执行（读取进程内存、启动 Hook 等耗时操作），
+    on_done 回调和后续阶段的启动通过 dispatch 回到调用方线程（界面传入 Qt 信号的 emit）。
+    某个阶段失败时只打印错误，依赖它的阶段照常执行（例如规则读取失败时仍然启动监听）。
+    """
+
+    def __init__(self, dispatch=None, profile=None):
+        self.dispatch = dispatch or (lambda callback: callback())
+        self.profile = profile or get_startup_profile()
+        self._stages = {}
+        self._order = []
+        self._started = set()
+        self._done = {}
+        self._waiters = []
+        self._lock = threading.RLock()
+
+    def add(self, name, func, after=(), background=False, on_done=None):
+        """登记一个阶段；on_done(result) 在阶段完成后于 dispatch 线程中调用"""
+        with self._lock:
+            self._stages[name] = {
+                'func': func,
+                'after': tuple(after),
+                'background': background,
+                'on_done': on_done
+            }
+            self._order.append(name)
+        return self
+
+    def start(self):
+        self._launch_ready()
+
+    def is_done(self, name):
+        with self._lock:
+            return name in self._done
+
+    def result(self, name):
+        with self._lock:
+            return self._done.get(name)
+
+    def when_done(self, names, callback):
+        """names 中的阶段都完成后调用 callback（已完成时立即调用）；names 为 None 表示全部阶段"""
+        with self._lock:
+            names = tuple(self._order) if names is None else tuple(names)
+            if not all(name in self._done for name in names):
+                self._waiters.append((names, callback))
+                return False
+        self._call(callback)
+        return True
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"启动回调执行失败: {e}")
+
+    def _launch_ready(self):
+        with self._lock:
+            ready = [name for name in self._order
+                     if name not in self._started
+                     and all(dep in self._done for dep in self._stages[name]['after'])]
+            self._started.update(ready)
+        for name in ready:
+            if self._stages[name]['background']:
+                threading.Thread(target=self._run, args=(name,), daemon=True).start()
+            else:
+                self._run(name)
+
+    def _run(self, name):
+        result = None
+        try:
+            with self.profile.stage(f"启动: {name}"):
+                result = self._stages[name]['func']()
+        except Exception as e:
+            print(f"启动阶段 {name} 失败: {e}")
+        self.dispatch(lambda: self._finish(name, result))
+
+    def _finish(self, name, result):
+        on_done = self._stages[name]['on_done']
+        if on_done is not None:
+            self._call(on_done, result)
+        with self._lock:
+            self._done[name] = result
+            ready_waiters = [w for w in self._waiters if all(n in self._done for n in w[0])]
+            self._waiters = [w for w in self._waiters if w not in ready_waiters]
+        self.profile.mark(f"就绪: {name}")
+        self._launch_ready()
+        for _, callback in ready_waiters:
+            self._call(callback)
@@ -0,0 +1,87 @@
+import heapq
+import itertools
+import threading
+
+
+class TaskScheduler:
+    """按下次触发时间排序的定时任务队列（最小堆）。
+
+    schedule() 新增或改期、cancel() 取消都是 O(log n)：改期/取消只把旧堆项标记失效，
+    出堆时跳过，失效项超过一半时整体重建。调用方只需要按 next_fire_time() 设一个定时器，
+    到点后用 pop_due() 取出所有已到期的任务，空闲时没有任何轮询开销。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, task_id):
+        return task_id in self._entries
+
+    def schedule(self, task_id, fire_time):
+        """安排（或改期）task_id 在 fire_time（时间戳，秒）触发"""
+        with self._lock:
+            self._invalidate(task_id)
+            entry = [fire_time, next(self._counter), task_id, True]
+            self._entries[task_id] = entry
+            heapq.heappush(self._heap, entry)
+
+    def cancel(self, task_id):
+        with self._lock:
+            return self._invalidate(task_id)
+
+    def fire_time(self, task_id):
+        entry = self._entries.get(task_id)
+        return entry[0] if entry else None
+
+    def next_fire_time(self):
+        """最早的触发时间，队列为空时返回 None"""
+        with self._lock:
+            self._drop_stale_head()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """取出所有触发时间不晚于 now 的任务 id（按触发时间、加入顺序排列）"""
+        due = []
+        with self._lock:
+            while self._heap:
+                entry = self._heap[0]
+                if not entry[3]:
+                    heapq.heappop(self._heap)
+                    self._stale -= 1
+                    continue
+                if entry[0] > now:
+                    break
+                heapq.heappop(self._heap)
+                del self._entries[entry[2]]
+                due.append(entry[2])
+        return due
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+            self._stale = 0
+
+    def _invalidate(self, task_id):
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return False
+        entry[3] = False
+        self._stale += 1
+        if self._stale > 64 and self._stale * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if e[3]]
+            heapq.heapify(self._heap)
+            self._stale = 0
+        return True
+
+    def _drop_stale_head(self):
+        while self._heap and not self._heap[0][3]:
+            heapq.heappop(self._heap)
+            self._stale -= 1
@@ -0,0 +1,328 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+TASKS_DB = os.path.join("config", "scheduled_tasks.db")
+
+# 错过发送时间的任务如何处理：window 超时不超过 catch_up_minutes 分钟则补发，run 一律补发，skip 一律跳过
+CATCH_UP_POLICIES = ('window', 'run', 'skip')
+DEFAULT_TASK_SETTINGS = {'catch_up_policy': 'window', 'catch_up_minutes': '30'}
+
+_TASK_FIELDS = ('name', 'schedule_time', 'message_text', 'image_path', 'min_delay', 'max_delay', 'status', 'pid',
+                'accounts', 'repeat')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    schedule_time INTEGER NOT NULL,
+    message_text TEXT NOT NULL DEFAULT '',
+    image_path TEXT NOT NULL DEFAULT '',
+    min_delay INTEGER NOT NULL DEFAULT 1,
+    max_delay INTEGER NOT NULL DEFAULT 3,
+    status TEXT NOT NULL DEFAULT '等待中',
+    pid INTEGER,
+    accounts TEXT NOT NULL DEFAULT '[]',
+    repeat TEXT NOT NULL DEFAULT '',
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS task_contacts (
+    task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    wxid TEXT NOT NULL,
+    contact TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    error TEXT NOT NULL DEFAULT '',
+    updated_at INTEGER,
+    latency_ms REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (task_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_task_contacts_state ON task_contacts(task_id, state);
+CREATE TABLE IF NOT EXISTS task_settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class TaskStore:
+    """定时群发任务的本地持久化（SQLite）。
+
+    每个任务的联系人按顺序编号，逐个记录发送状态：pending 待发送、sending 正在发送、
+    sent 已发送、failed 失败。发送前先把联系人标记为 sending 并提交，发送后再标记为 sent，
+    因此程序崩溃或重启后可以从第一个未发送的联系人继续；崩溃时停在 sending 的联系人无法确认
+    是否送达，recover() 会把它标为失败而不是重发，避免对方收到重复消息。
+    发送结果（状态、错误、耗时）由 record_result() 暂存，和下一个联系人的 mark_sending() 在同一个事务中
+    提交，每个联系人只需一次提交；发送间隔等待前和任务结束时调用 flush_results() 单独写入，
+    所以任何时刻最多只有一个已发出的联系人停在 sending。
+    """
+
+    def __init__(self, path=TASKS_DB):
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if 'accounts' not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN accounts TEXT NOT NULL DEFAULT '[]'")
+        if 'repeat' not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN repeat TEXT NOT NULL DEFAULT ''")
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(task_contacts)")}
+        if 'latency_ms' not in columns:
+            self._conn.execute("ALTER TABLE task_contacts ADD COLUMN latency_ms REAL")
+        if 'attempts' not in columns:
+            self._conn.execute("ALTER TABLE task_contacts ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self._results = []
+        self._results_lock = threading.Lock()
+
+    def _transaction(self, statements):
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        cur.executemany(sql, params)
+                    else:
+                        cur.execute(sql, params)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _task_values(task):
+        """accounts（多账号分摊发送使用的账号 wxid 列表）以 JSON 保存，repeat（重复规则）为空表示只发送一次"""
+        values = []
+        for f in _TASK_FIELDS:
+            if f == 'accounts':
+                values.append(json.dumps(task.get(f) or [], ensure_ascii=False))
+            elif f == 'repeat':
+                values.append(task.get(f) or '')
+            else:
+                values.append(task.get(f))
+        return tuple(values)
+
+    # 任务
+    def add_task(self, task):
+        """保存新任务及其联系人列表（一次事务）"""
+        now = int(time.time())
+        contacts = [(task['id'], seq, c.get('wxid', ''), json.dumps(c, ensure_ascii=False), now)
+                    for seq, c in enumerate(task.get('contacts') or ()) if c.get('wxid')]
+        self._transaction([
+            ("INSERT INTO tasks (id, name, schedule_time, message_text, image_path, min_delay, max_delay, "
+             "status, pid, accounts, repeat, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+             (task['id'],) + self._task_values(task) + (now, now)),
+            ("INSERT INTO task_contacts (task_id, seq, wxid, contact, updated_at) VALUES (?, ?, ?, ?, ?)",
+             contacts),
+        ])
+
+    def update_task(self, task):
+        """保存任务本身的字段（名称、时间、内容、间隔、状态），不改动联系人发送记录"""
+        assignments = ", ".join(f"{f} = ?" for f in _TASK_FIELDS)
+        self._transaction([(f"UPDATE tasks SET {assignments}, updated_at = ? WHERE id = ?",
+                            self._task_values(task) + (int(time.time()), task['id']))])
+
+    def set_status(self, task_id, status):
+        self._transaction([("UPDATE tasks SET status = ?, updated_at = ? WHERE id = ?",
+                            (status, int(time.time()), task_id))])
+
+    def claim(self, task_id, status, expected='等待中'):
+        """只有任务当前仍是 expected 状态时才改为 status，返回是否改成功。
+        界面和无界面进程共用同一个任务库时，到点的任务只会被其中一个执行"""
+        with self._lock:
+            cur = self._conn.execute("UPDATE tasks SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                                     (status, int(time.time()), task_id, expected))
+            return cur.rowcount == 1
+
+    def delete_tasks(self, task_ids):
+        ids = [(task_id,) for task_id in task_ids]
+        self._transaction([("DELETE FROM task_contacts WHERE task_id = ?", ids),
+                           ("DELETE FROM tasks WHERE id = ?", ids)])
+
+    def load_tasks(self):
+        """按创建顺序读取全部任务，contacts 为完整联系人列表，progress 为 {状态: 数量}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tasks ORDER BY created_at, id").fetchall()
+            contact_rows = self._conn.execute(
+                "SELECT task_id, contact, state FROM task_contacts ORDER BY task_id, seq").fetchall()
+        tasks = {}
+        for row in rows:
+            task = {f: row[f] for f in _TASK_FIELDS}
+            try:
+                task['accounts'] = json.loads(row['accounts'] or '[]')
+            except ValueError:
+                task['accounts'] = []
+            task.update(id=row['id'], contacts=[], progress={})
+            tasks[row['id']] = task
+        for row in contact_rows:
+            task = tasks.get(row['task_id'])
+            if task is None:
+                continue
+            task['contacts'].append(json.loads(row['contact']))
+            task['progress'][row['state']] = task['progress'].get(row['state'], 0) + 1
+        return list(tasks.values())
+
+    # 联系人发送进度
+    def pending_contacts(self, task_id):
+        """尚未发送的联系人（按原顺序），每个联系人带上 _seq 供 mark_* 使用"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, contact FROM task_contacts WHERE task_id = ? AND state = 'pending' ORDER BY seq",
+                (task_id,)).fetchall()
+        contacts = []
+        for row in rows:
+            contact = json.loads(row['contact'])
+            contact['_seq'] = row['seq']
+            contacts.append(contact)
+        return contacts
+
+    def _mark(self, task_id, seq, state, error=''):
+        self._transaction([("UPDATE task_contacts SET state = ?, error = ?, updated_at = ? "
+                            "WHERE task_id = ? AND seq = ?", (state, error, int(time.time()), task_id, seq))])
+
+    def _take_results(self):
+        with self._results_lock:
+            results, self._results = self._results, []
+        return results
+
+    def _restore_results(self, results):
+        with self._results_lock:
+            self._results[:0] = results
+
+    def _result_statement(self, results):
+        return ("UPDATE task_contacts SET state = ?, error = ?, updated_at = ?, latency_ms = ? "
+                "WHERE task_id = ? AND seq = ?", results)
+
+    def mark_sending(self, task_id, seq):
+        """标记为正在发送，暂存的上一个发送结果在同一事务中写入"""
+        results = self._take_results()
+        statements = [self._result_statement(results)] if results else []
+        statements.append(("UPDATE task_contacts SET state = 'sending', attempts = attempts + 1, updated_at = ? "
+                           "WHERE task_id = ? AND seq = ?", (int(time.time()), task_id, seq)))
+        try:
+            self._transaction(statements)
+        except Exception:
+            self._restore_results(results)
+            raise
+
+    def mark_sent(self, task_id, seq):
+        self._mark(task_id, seq, 'sent')
+
+    def mark_failed(self, task_id, seq, error=''):
+        self._mark(task_id, seq, 'failed', error)
+
+    def record_result(self, task_id, seq, state, error='', latency_ms=None):
+        """暂存一条发送结果（sent / failed），随下一次 mark_sending() 或 flush_results() 写入"""
+        with self._results_lock:
+            self._results.append((state, error or '', int(time.time()), latency_ms, task_id, seq))
+
+    def flush_results(self):
+        results = self._take_results()
+        if results:
+            try:
+                self._transaction([self._result_statement(results)])
+            except Exception:
+                self._restore_results(results)
+                raise
+        return len(results)
+
+    def progress(self, task_id):
+        """{状态: 数量}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) AS n FROM task_contacts WHERE task_id = ? "
+                                      "GROUP BY state", (task_id,)).fetchall()
+        return {row['state']: row['n'] for row in rows}
+
+    def requeue_failed(self, task_id):
+        """把发送失败的联系人重新放回待发送，返回数量"""
+        self.flush_results()
+        with self._lock:
+            cur = self._conn.execute("UPDATE task_contacts SET state = 'pending', error = '' "
+                                     "WHERE task_id = ? AND state = 'failed'", (task_id,))
+            return cur.rowcount
+
+    def reset_contacts(self, task_id):
+        """重复任务进入下一轮前调用：全部联系人恢复为待发送，返回数量"""
+        self.flush_results()
+        with self._lock:
+            cur = self._conn.execute("UPDATE task_contacts SET state = 'pending', error = '', latency_ms = NULL, "
+                                     "attempts = 0, updated_at = ? WHERE task_id = ?", (int(time.time()), task_id))
+            return cur.rowcount
+
+    def delivery_log(self, task_id):
+        """逐个联系人的发送记录（按原顺序）"""
+        self.flush_results()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, wxid, contact, state, error, updated_at, latency_ms, attempts FROM task_contacts "
+                "WHERE task_id = ? ORDER BY seq", (task_id,)).fetchall()
+        log = []
+        for row in rows:
+            entry = dict(row)
+            entry['nickname'] = json.loads(row['contact']).get('nickname', '')
+            del entry['contact']
+            log.append(entry)
+        return log
+
+    def recover(self):
+        """启动时调用：上次停在“正在发送”的联系人标为失败，返回被中断（状态仍为执行中）的任务 id"""
+        with self._lock:
+            interrupted = [row['id'] for row in
+                           self._conn.execute("SELECT id FROM tasks WHERE status = '执行中'").fetchall()]
+        self._transaction([("UPDATE task_contacts SET state = 'failed', error = ?, updated_at = ? "
+                            "WHERE state = 'sending'", ('程序中断，未确认是否送达', int(time.time())))])
+        return interrupted
+
+    # 设置
+    def get_settings(self):
+        settings = dict(DEFAULT_TASK_SETTINGS)
+        with self._lock:
+            for row in self._conn.execute("SELECT key, value FROM task_settings").fetchall():
+                settings[row['key']] = row['value']
+        return settings
+
+    def update_settings(self, updates):
+        self._transaction([("INSERT OR REPLACE INTO task_settings (key, value) VALUES (?, ?)",
+                            [(k, str(v)) for k, v in (updates or {}).items()])])
+
+    def close(self):
+        self.flush_results()
+        with self._lock:
+            self._conn.close()
+
+
+def is_missed(schedule_time, now, policy, window_minutes):
+    """按补发策略判断一个已过发送时间的任务是否应跳过"""
+    if policy == 'skip':
+        return now - schedule_time > 60
+    if policy == 'run':
+        return False
+    try:
+        window = max(1, int(window_minutes)) * 60
+    except (TypeError, ValueError):
+        window = 30 * 60
+    return now - schedule_time > window
+
+
+_task_store = None
+_task_store_lock = threading.Lock()
+
+
+def get_task_store():
+    """获取全局共享的定时任务存储"""
+    global _task_store
+    with _task_store_lock:
+        if _task_store is None:
+            _task_store = TaskStore()
+        return _task_store
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import config_store
+import send_pacing
+import task_store
+import account_registry
+from wechat_backend import set_wechat_backend
+from fake_wechat import FakeWeChatBackend
+
+
+class FakeWeChatTestCase(unittest.TestCase):
+    """在临时工作目录中运行、使用假微信的测试基类：config/ 下的文件写到临时目录，
+    规则库、任务库、发送节奏、账号注册表等全局单例每个测试重新创建"""
+
+    backend_options = {'contact_count': 50}
+
+    def setUp(self):
+        self._old_cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp(prefix="wechat_test_")
+        os.chdir(self.workdir)
+        self._reset_singletons()
+        self.backend = FakeWeChatBackend(**self.backend_options)
+        self._old_backend = set_wechat_backend(self.backend)
+
+    def tearDown(self):
+        set_wechat_backend(self._old_backend)
+        # 延时写盘的定时器在切回原目录前处理掉，否则会把文件写进仓库
+        for store in (config_store._rules_store, send_pacing._send_pacer):
+            if store is not None:
+                store.flush()
+        if task_store._task_store is not None:
+            task_store._task_store.close()
+        self._reset_singletons()
+        os.chdir(self._old_cwd)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    @staticmethod
+    def _reset_singletons():
+        config_store._rules_store = None
+        send_pacing._send_pacer = None
+        task_store._task_store = None
+        account_registry._account_registry = None
+
+
+class ManualScheduler:
+    """记录 schedule(delay, callback) 调用，由测试决定何时执行，代替定时器"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, delay, callback):
+        self.calls.append((delay, callback))
+
+    def run_all(self):
+        while self.calls:
+            _, callback = self.calls.pop(0)
+            callback()
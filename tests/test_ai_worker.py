@@ -0,0 +1,185 @@
+import time
+import asyncio
+import threading
+import unittest
+import concurrent.futures
+
+from ai_stub_server import StubAIServer
+from ai_worker import AIReplyWorker, ChatCompletionClient
+from reply_cache import ReplyCache
+
+TIMEOUT_ERRORS = (asyncio.TimeoutError, concurrent.futures.TimeoutError)
+STREAM_SENTENCES = ["您好，欢迎光临本店。", "这款商品目前有现货！", "请问您需要几件？", "我们今天下单包邮。"]
+STREAM_REPLY = "".join(STREAM_SENTENCES)
+NATIVE_PROVIDER = {'name': 'Claude', 'type': 'anthropic', 'base_url': 'https://api.anthropic.com/v1', 'model': 'claude'}
+
+
+class _Signal:
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def disconnect(self, slot):
+        self.slots.remove(slot)
+
+    def emit(self, value):
+        for slot in list(self.slots):
+            slot(value)
+
+
+class _FakeAIManager:
+    """只通过 response_ready 信号给出回复的 AIManager；returns=True 时改为直接返回回复"""
+
+    instances = []
+
+    def __init__(self, delay=0.01, returns=False):
+        self.auto_reply_settings = {}
+        self.response_ready = _Signal()
+        self.calls = []
+        self.delay = delay
+        self.returns = returns
+        _FakeAIManager.instances.append(self)
+
+    async def _async_ai_reply(self, sender_wxid, prompt):
+        self.calls.append((sender_wxid, prompt))
+        await asyncio.sleep(self.delay)
+        if self.returns:
+            return f"AIManager：{prompt}"
+        self.response_ready.emit(f"AIManager：{prompt}")
+
+
+class AIReplyWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubAIServer().start()
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.shutdown()
+        self.server.stop()
+
+    def make_worker(self, **kwargs):
+        kwargs.setdefault('provider', self.server.provider())
+        worker = AIReplyWorker(cache=ReplyCache(cache_file=None), **kwargs)
+        self.workers.append(worker)
+        return worker
+
+    def test_sequential_requests_reuse_one_connection(self):
+        worker = self.make_worker()
+        replies = [worker.submit("wxid_a", f"问题{i}").result(5) for i in range(5)]
+        self.assertEqual(replies, [f"收到：问题{i}" for i in range(5)])
+        self.assertEqual(self.server.request_count, 5)
+        self.assertEqual(self.server.connection_count, 1)
+
+    def test_cached_reply_skips_request(self):
+        worker = self.make_worker()
+        self.assertEqual(worker.submit("wxid_a", "多少钱？").result(5), "收到：多少钱？")
+        self.assertEqual(worker.submit("wxid_b", "多少钱").result(5), "收到：多少钱？")
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_request_timeout(self):
+        self.server.delay = 1.0
+        worker = self.make_worker()
+        future = worker.submit("wxid_a", "慢问题", timeout=0.2)
+        with self.assertRaises(TIMEOUT_ERRORS):
+            future.result(5)
+
+    def test_concurrency_limit(self):
+        state = {'active': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def slow_reply(messages):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.2)
+            with lock:
+                state['active'] -= 1
+            return "好的"
+
+        self.server.reply_func = slow_reply
+        worker = self.make_worker(max_concurrency=2)
+        futures = [worker.submit("wxid_a", f"问题{i}") for i in range(6)]
+        self.assertEqual([f.result(10) for f in futures], ["好的"] * 6)
+        self.assertEqual(state['peak'], 2)
+
+    def make_manager_worker(self, **manager_options):
+        _FakeAIManager.instances = []
+        return self.make_worker(provider=NATIVE_PROVIDER, max_concurrency=4,
+                                ai_manager_factory=lambda: _FakeAIManager(**manager_options))
+
+    def test_native_provider_falls_back_to_ai_manager(self):
+        worker = self.make_manager_worker()
+        self.assertEqual(worker.submit("wxid_a", "你好").result(5), "AIManager：你好")
+        self.assertEqual(worker.submit("wxid_b", "在吗").result(5), "AIManager：在吗")
+        request_managers = [m for m in _FakeAIManager.instances if m.calls]
+        # 先后两次请求复用同一个空闲实例，信号连接已断开
+        self.assertEqual(len(request_managers), 1)
+        self.assertEqual(request_managers[0].calls, [("wxid_a", "你好"), ("wxid_b", "在吗")])
+        self.assertEqual(request_managers[0].response_ready.slots, [])
+        self.assertEqual(self.server.request_count, 0)
+
+    def test_concurrent_manager_requests_get_their_own_replies(self):
+        worker = self.make_manager_worker(delay=0.3)
+        start = time.monotonic()
+        futures = [worker.submit(f"wxid_{i}", f"问题{i}") for i in range(3)]
+        replies = [f.result(5) for f in futures]
+        self.assertEqual(replies, [f"AIManager：问题{i}" for i in range(3)])
+        # 三个请求同时进行，而不是排队各等 0.3 秒
+        self.assertLess(time.monotonic() - start, 0.8)
+
+    def test_manager_return_value_is_used_without_waiting_for_signal(self):
+        worker = self.make_manager_worker(returns=True)
+        start = time.monotonic()
+        self.assertEqual(worker.submit("wxid_a", "你好").result(5), "AIManager：你好")
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def stream(self, worker, prompt, max_chunks=None):
+        chunks = []
+        future = worker.submit_stream("wxid_a", prompt, lambda chunk: chunks.append((chunk, threading.current_thread())),
+                                      max_chunks=max_chunks)
+        return future.result(10), chunks
+
+    def test_stream_cuts_at_sentence_ends(self):
+        self.server.reply_func = lambda messages: STREAM_REPLY
+        self.server.token_delay = 0.01
+        worker = self.make_worker()
+        reply, chunks = self.stream(worker, "有货吗")
+        self.assertEqual(reply, STREAM_REPLY)
+        self.assertEqual([chunk for chunk, _ in chunks], STREAM_SENTENCES)
+        self.assertTrue(all(thread is worker._thread for _, thread in chunks))
+        self.assertEqual(self.server.requests[0].get('stream'), True)
+
+    def test_stream_max_chunks_merges_the_rest(self):
+        self.server.reply_func = lambda messages: STREAM_REPLY
+        self.server.token_delay = 0.01
+        worker = self.make_worker()
+        _, chunks = self.stream(worker, "有货吗", max_chunks=2)
+        self.assertEqual([chunk for chunk, _ in chunks], [STREAM_SENTENCES[0], "".join(STREAM_SENTENCES[1:])])
+
+    def test_cached_stream_replays_on_loop_thread(self):
+        self.server.reply_func = lambda messages: STREAM_REPLY
+        self.server.token_delay = 0
+        worker = self.make_worker()
+        self.stream(worker, "有货吗")
+        reply, chunks = self.stream(worker, "有货吗？", max_chunks=3)
+        self.assertEqual(self.server.request_count, 1)
+        self.assertEqual(reply, STREAM_REPLY)
+        self.assertEqual([chunk for chunk, _ in chunks], STREAM_SENTENCES[:2] + ["".join(STREAM_SENTENCES[2:])])
+        self.assertTrue(all(thread is worker._thread for _, thread in chunks))
+
+    def test_supported_providers(self):
+        self.assertTrue(ChatCompletionClient.supports(self.server.provider()))
+        self.assertTrue(ChatCompletionClient.supports({'base_url': 'https://api.siliconflow.cn/v1'}))
+        self.assertTrue(ChatCompletionClient.supports(
+            {'base_url': 'https://generativelanguage.googleapis.com/v1beta/openai'}))
+        self.assertFalse(ChatCompletionClient.supports({'base_url': 'https://generativelanguage.googleapis.com/v1beta'}))
+        self.assertFalse(ChatCompletionClient.supports({'name': 'Claude', 'base_url': 'https://example.com/v1'}))
+        self.assertFalse(ChatCompletionClient.supports({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
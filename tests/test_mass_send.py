@@ -0,0 +1,105 @@
+import time
+import unittest
+
+from engine import send_messages, send_messages_sharded
+from task_store import get_task_store
+from support import FakeWeChatTestCase
+
+PID = 4242
+
+
+class MassSendTest(FakeWeChatTestCase):
+    """send_messages / send_messages_sharded 在假微信随机失败时的发送记录与失败重发"""
+
+    backend_options = {'contact_count': 40, 'account_count': 2, 'failure_rate': 0.3, 'seed': 7}
+
+    def setUp(self):
+        super().setUp()
+        self.store = get_task_store()
+        self.contacts = [c for c in self.backend.contacts if c.get('wxid')][:20]
+
+    def add_task(self, contacts):
+        task = {
+            'id': int(time.time()), 'name': '群发', 'schedule_time': int(time.time()), 'contacts': contacts,
+            'message_text': '你好{昵称}', 'image_path': '', 'min_delay': 0, 'max_delay': 0,
+            'status': '执行中', 'pid': PID, 'accounts': [], 'repeat': '',
+        }
+        self.store.add_task(task)
+        return task['id']
+
+    def delivered(self):
+        """发送记录中已送达的 wxid（假微信的 sent 也包含失败的尝试）"""
+        return [entry['wxid'] for entry in self.store.delivery_log(self.task_id) if entry['state'] == 'sent']
+
+    def assert_log_matches_progress(self, states):
+        log = self.store.delivery_log(self.task_id)
+        self.assertEqual(len(log), len(self.contacts))
+        self.assertLessEqual({e['state'] for e in log}, set(states))
+        for entry in log:
+            if entry['state'] == 'failed':
+                self.assertTrue(entry['error'])
+            else:
+                self.assertEqual(entry['error'], '')
+            self.assertIsNotNone(entry['latency_ms'])
+
+    def test_failures_are_logged_and_requeued_without_resending_delivered(self):
+        self.task_id = self.add_task(self.contacts)
+        progress_calls = []
+        sent = send_messages(PID, self.store.pending_contacts(self.task_id), '你好{昵称}', '', 0, 0,
+                             task_id=self.task_id, on_progress=lambda task_id, state: progress_calls.append(state))
+
+        progress = self.store.progress(self.task_id)
+        self.assertEqual(progress.get('sent', 0), sent)
+        self.assertGreater(progress.get('failed', 0), 0)
+        self.assertEqual(progress.get('sent', 0) + progress['failed'], len(self.contacts))
+        self.assertEqual(progress_calls.count('failed'), progress['failed'])
+        self.assert_log_matches_progress(('sent', 'failed'))
+        first_round = set(self.delivered())
+
+        self.assertEqual(self.store.requeue_failed(self.task_id), progress['failed'])
+        retry = self.store.pending_contacts(self.task_id)
+        self.assertEqual({c['wxid'] for c in retry}, {c['wxid'] for c in self.contacts} - first_round)
+
+        self.backend.failure_rate = 0.0
+        attempts_before = len(self.backend.sent)
+        send_messages(PID, retry, '你好{昵称}', '', 0, 0, task_id=self.task_id)
+        self.assertEqual(len(self.backend.sent) - attempts_before, len(retry))
+        self.assertEqual(self.store.progress(self.task_id), {'sent': len(self.contacts)})
+        self.assertEqual(sorted(self.delivered()), sorted(c['wxid'] for c in self.contacts))
+
+    def test_sharded_send_splits_accounts_and_fails_unreachable(self):
+        self.backend.failure_rate = 0.0
+        stranger = {'wxid': 'wxid_not_a_friend', 'nickname': '陌生人'}
+        self.contacts = self.contacts + [stranger]
+        self.task_id = self.add_task(self.contacts)
+        accounts = [a['wxid'] for a in self.backend.accounts]
+
+        sent = send_messages_sharded(accounts, self.store.pending_contacts(self.task_id), '你好', '', 0, 0,
+                                     task_id=self.task_id)
+
+        self.assertEqual(sent, len(self.contacts) - 1)
+        self.assertEqual(self.store.progress(self.task_id), {'sent': sent, 'failed': 1})
+        pids = {pid for pid, wxid, content in self.backend.sent}
+        self.assertEqual(pids, {a['pid'] for a in self.backend.accounts})
+        failed = [e for e in self.store.delivery_log(self.task_id) if e['state'] == 'failed']
+        self.assertEqual([e['wxid'] for e in failed], [stranger['wxid']])
+        self.assertIn('没有该对象', failed[0]['error'])
+
+    def test_sharded_send_with_failures_can_be_retried(self):
+        self.task_id = self.add_task(self.contacts)
+        accounts = [a['wxid'] for a in self.backend.accounts]
+        send_messages_sharded(accounts, self.store.pending_contacts(self.task_id), '你好', '', 0, 0,
+                              task_id=self.task_id)
+        failed = self.store.progress(self.task_id).get('failed', 0)
+        self.assertGreater(failed, 0)
+        self.assert_log_matches_progress(('sent', 'failed'))
+
+        self.backend.failure_rate = 0.0
+        self.assertEqual(self.store.requeue_failed(self.task_id), failed)
+        send_messages_sharded(accounts, self.store.pending_contacts(self.task_id), '你好', '', 0, 0,
+                              task_id=self.task_id)
+        self.assertEqual(self.store.progress(self.task_id), {'sent': len(self.contacts)})
+
+
+if __name__ == '__main__':
+    unittest.main()
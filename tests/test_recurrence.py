@@ -0,0 +1,91 @@
+import os
+import time
+import unittest
+from datetime import datetime
+
+from recurrence import parse_recurrence, next_fire_time
+
+# 美东时区（POSIX 写法，不依赖系统时区数据）：2026-03-08 02:00 拨快到 03:00，2026-11-01 02:00 拨回 01:00
+US_EASTERN = 'EST5EDT,M3.2.0,M11.1.0'
+
+
+def local(*args):
+    return int(datetime(*args).timestamp())
+
+
+@unittest.skipUnless(hasattr(time, 'tzset'), "需要 time.tzset 切换本地时区")
+class CronBoundaryTest(unittest.TestCase):
+    """cron 规则的 first_at_or_after / next_after 在月末、闰年和夏令时切换前后的结果"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._old_tz = os.environ.get('TZ')
+        os.environ['TZ'] = US_EASTERN
+        time.tzset()
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = cls._old_tz
+        time.tzset()
+
+    def fire_times(self, spec, start, count):
+        return parse_recurrence(spec).preview(start, count)
+
+    def test_first_at_or_after_includes_an_exact_fire_time(self):
+        rule = parse_recurrence('0 9 * * *')
+        self.assertEqual(rule.first_at_or_after(local(2026, 5, 4, 9, 0)), local(2026, 5, 4, 9, 0))
+        self.assertEqual(rule.first_at_or_after(local(2026, 5, 4, 9, 0, 1)), local(2026, 5, 5, 9, 0))
+
+    def test_day_31_skips_short_months(self):
+        times = self.fire_times('0 9 31 * *', local(2026, 1, 31, 10, 0), 3)
+        self.assertEqual(times, [local(2026, 3, 31, 9, 0), local(2026, 5, 31, 9, 0), local(2026, 7, 31, 9, 0)])
+
+    def test_month_and_year_rollover(self):
+        rule = parse_recurrence('@monthly')
+        self.assertEqual(rule.first_at_or_after(local(2026, 12, 31, 23, 59)), local(2027, 1, 1, 0, 0))
+        self.assertEqual(rule.first_at_or_after(local(2026, 1, 31, 12, 0)), local(2026, 2, 1, 0, 0))
+
+    def test_february_29_waits_for_the_next_leap_year(self):
+        self.assertEqual(parse_recurrence('0 0 29 2 *').first_at_or_after(local(2026, 3, 1)), local(2028, 2, 29))
+
+    def test_day_or_weekday_like_cron(self):
+        # 同时限定日期和星期时满足其一即可：2026-06 的 1 日是周一，之后的周一为 8、15 日
+        times = self.fire_times('0 9 1 * 1', local(2026, 5, 30), 4)
+        self.assertEqual(times, [local(2026, 6, 1, 9, 0), local(2026, 6, 8, 9, 0),
+                                 local(2026, 6, 15, 9, 0), local(2026, 6, 22, 9, 0)])
+
+    def test_daily_time_inside_the_spring_gap_still_fires_once_that_day(self):
+        # 2026-03-08 没有 02:30，按拨快前的时差换算为 03:30 发送，前后两天照常
+        times = self.fire_times('30 2 * * *', local(2026, 3, 7), 3)
+        self.assertEqual([time.strftime('%m-%d %H:%M', time.localtime(t)) for t in times],
+                         ['03-07 02:30', '03-08 03:30', '03-09 02:30'])
+
+    def test_hourly_across_spring_forward_has_no_gap_or_repeat(self):
+        times = self.fire_times('0 * * * *', local(2026, 3, 8), 5)
+        self.assertEqual([b - a for a, b in zip(times, times[1:])], [3600] * 4)
+        self.assertEqual([time.localtime(t).tm_hour for t in times], [0, 1, 3, 4, 5])
+
+    def test_daily_time_inside_the_repeated_fall_hour_fires_once(self):
+        times = self.fire_times('30 1 * * *', local(2026, 10, 31), 3)
+        self.assertEqual(len(set(time.strftime('%m-%d', time.localtime(t)) for t in times)), 3)
+        # 01:30 出现两次时只在第一次（夏令时）发送，下一次是次日 01:30（标准时间），相隔 25 小时
+        self.assertEqual(times[2] - times[1], 25 * 3600)
+        self.assertEqual(next_fire_time('30 1 * * *', after=times[1]), times[2])
+
+    def test_hourly_across_fall_back_is_strictly_increasing(self):
+        times = self.fire_times('0 * * * *', local(2026, 11, 1), 4)
+        self.assertEqual(times, sorted(set(times)))
+        self.assertEqual([time.localtime(t).tm_hour for t in times], [0, 1, 2, 3])
+
+    def test_interval_is_anchored_in_absolute_seconds_across_dst(self):
+        anchor = local(2026, 3, 7, 12, 0)
+        rule = parse_recurrence('@every 1d')
+        self.assertEqual(rule.next_after(anchor + 1, anchor=anchor), anchor + 86400)
+        self.assertEqual(next_fire_time('@every 1d', after=anchor + 86400, anchor=anchor), anchor + 2 * 86400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import time
+import threading
+import unittest
+
+from engine import ReplyEngine, YUANBAO_WXID
+from config_store import get_rules_store
+from support import FakeWeChatTestCase, ManualScheduler
+
+PID = 4242
+ACCOUNT = {'pid': PID, 'wxid': 'wxid_fake_self_0', 'nickname': '测试号1'}
+
+
+def quick_settings(**overrides):
+    settings = {
+        'rule_reply_enabled': True, 'reply_friend_enabled': True, 'reply_group_enabled': True,
+        'fuzzy_match_enabled': True, 'exact_match_enabled': True,
+        'min_interval': '0', 'max_interval': '0', 'coalesce_window': '0'
+    }
+    settings.update(overrides)
+    return settings
+
+
+class StreamedChunkDeliveryTest(FakeWeChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.scheduler = ManualScheduler()
+        self.sent = []
+        self.engine = ReplyEngine(settings=quick_settings, schedule=self.scheduler,
+                                  sender=lambda pid, wxid, text, kind: self.sent.append((wxid, text)))
+
+    def test_chunks_are_paced_in_order_off_the_caller_thread(self):
+        worker = threading.Thread(target=lambda: [
+            self.engine.deliver_ai_chunk("wxid_a", text, PID, i) for i, text in enumerate(["一。", "二。", "三。"])])
+        worker.start()
+        worker.join()
+        self.assertEqual(self.sent, [])
+        # 同一接收人同时只排一个定时发送，前一段发出后才安排下一段
+        self.assertEqual(len(self.scheduler.calls), 1)
+        self.scheduler.run_all()
+        self.assertEqual(self.sent, [("wxid_a", "一。"), ("wxid_a", "二。"), ("wxid_a", "三。")])
+        self.assertEqual(self.engine._chunk_queues, {})
+
+    def test_receivers_are_queued_separately(self):
+        self.engine.deliver_ai_chunk("wxid_a", "甲一", PID, 0)
+        self.engine.deliver_ai_chunk("wxid_b", "乙一", PID, 0)
+        self.engine.deliver_ai_chunk("wxid_a", "甲二", PID, 1)
+        self.assertEqual(len(self.scheduler.calls), 2)
+        self.scheduler.run_all()
+        self.assertEqual([text for wxid, text in self.sent if wxid == "wxid_a"], ["甲一", "甲二"])
+        self.assertEqual([text for wxid, text in self.sent if wxid == "wxid_b"], ["乙一"])
+
+
+class ReplyEngineProcessTest(FakeWeChatTestCase):
+    """ReplyEngine 收到假微信消息后的规则回复、范围限定、消息合并与元宝客服转发"""
+
+    backend_options = {'contact_count': 200}
+
+    def setUp(self):
+        super().setUp()
+        self.scheduler = ManualScheduler()
+        self.overrides = {}
+        contacts = {c['wxid']: c for c in self.backend.contacts}
+        self.engine = ReplyEngine(settings=lambda: quick_settings(**self.overrides), schedule=self.scheduler,
+                                  find_contact=contacts.get)
+        self.friends = [c for c in self.backend.contacts if '@chatroom' not in c['wxid']]
+        self.group = next(c for c in self.backend.contacts if '@chatroom' in c['wxid'])
+        self.store = get_rules_store()
+
+    def receive(self, wxid, content, **extra):
+        message = {'wxid': wxid, 'content': content, 'timestamp': int(time.time()), 'account': dict(ACCOUNT)}
+        message.update(extra)
+        self.engine.handle_message(message)
+        self.scheduler.run_all()
+
+    def replies(self):
+        return [(wxid, content) for pid, wxid, content in self.backend.sent]
+
+    def test_matched_rule_is_rendered_and_sent_to_the_sender(self):
+        friend = next(c for c in self.friends if not c['remarks'])
+        self.store.set_rules([{'keyword': '价格', 'reply': '{昵称}您好，价格见图', 'enabled': True}])
+        self.receive(friend['wxid'], '请问价格多少')
+        self.assertEqual(self.replies(), [(friend['wxid'], f"{friend['nickname']}您好，价格见图")])
+
+    def test_exact_and_fuzzy_switches(self):
+        friend = self.friends[0]['wxid']
+        self.store.set_rules([{'keyword': '你好', 'reply': '在的', 'enabled': True}])
+        self.overrides['fuzzy_match_enabled'] = False
+        self.receive(friend, '你好呀')
+        self.assertEqual(self.replies(), [])
+        self.receive(friend, '你好')
+        self.assertEqual(self.replies(), [(friend, '在的')])
+        self.overrides.update(fuzzy_match_enabled=True, exact_match_enabled=False)
+        self.receive(friend, '你好呀')
+        self.assertEqual(len(self.replies()), 2)
+
+    def test_scoped_rules_only_reply_in_their_chats_and_accounts(self):
+        first, second = self.friends[0]['wxid'], self.friends[1]['wxid']
+        self.store.set_rules([
+            {'keyword': '地址', 'reply': '甲的地址', 'enabled': True, 'chats': [first]},
+            {'keyword': '地址', 'reply': '别的账号', 'enabled': True, 'accounts': ['wxid_fake_self_1']},
+        ])
+        self.receive(first, '地址')
+        self.receive(second, '地址')
+        self.assertEqual(self.replies(), [(first, '甲的地址')])
+
+    def test_group_messages_need_an_at(self):
+        self.store.set_rules([{'keyword': '价格', 'reply': '私聊', 'enabled': True}])
+        member = self.friends[2]['wxid']
+        self.receive(self.group['wxid'], '价格', member_id=member)
+        self.assertEqual(self.replies(), [])
+        self.receive(self.group['wxid'], f"@{ACCOUNT['nickname']} 价格", member_id=member)
+        self.assertEqual(self.replies(), [(self.group['wxid'], '私聊')])
+
+    def test_unmatched_fragments_are_coalesced_into_one_yuanbao_question(self):
+        self.overrides.update(ai_reply_enabled=True, yuanbao_reply_enabled=True, coalesce_window='2')
+        friend = self.friends[0]['wxid']
+        for text in ('在吗', '想问一下', '发货时间'):
+            self.engine.handle_message({'wxid': friend, 'content': text, 'timestamp': int(time.time()),
+                                        'account': dict(ACCOUNT)})
+        self.assertEqual(self.backend.sent, [])
+        self.scheduler.run_all()
+        self.assertEqual(self.replies(), [(YUANBAO_WXID, '在吗\n想问一下\n发货时间')])
+
+    def test_yuanbao_answers_go_back_to_the_askers_in_order(self):
+        self.overrides.update(ai_reply_enabled=True, yuanbao_reply_enabled=True)
+        self.engine.yuanbao_routes.segment_gap = 0
+        first, second = self.friends[0]['wxid'], self.friends[1]['wxid']
+        self.receive(first, '问题一')
+        self.receive(second, '问题二')
+        self.receive(YUANBAO_WXID, '回答一')
+        self.receive(YUANBAO_WXID, '回答二')
+        self.assertEqual(self.replies(), [(YUANBAO_WXID, '问题一'), (YUANBAO_WXID, '问题二'),
+                                          (first, '回答一'), (second, '回答二')])
+
+    def test_answer_segments_follow_the_first_segment(self):
+        self.overrides.update(ai_reply_enabled=True, yuanbao_reply_enabled=True)
+        first, second = self.friends[0]['wxid'], self.friends[1]['wxid']
+        self.receive(first, '问题一')
+        self.receive(second, '问题二')
+        self.receive(YUANBAO_WXID, '回答一上半')
+        self.receive(YUANBAO_WXID, '回答一下半')
+        self.assertEqual(self.replies()[2:], [(first, '回答一上半'), (first, '回答一下半')])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import random
+import time
+import unittest
+
+from reply_pipeline import ReplyChunker
+
+
+class _SliceStripChunker(ReplyChunker):
+    """逐字对前缀切片再 strip 计算长度的原始写法，作为对照"""
+
+    def _find_cut(self):
+        buffer = self._buffer
+        for i, ch in enumerate(buffer):
+            if ch in self.SENTENCE_ENDS and len(buffer[:i + 1].strip()) >= self.min_chars:
+                end = i + 1
+                while end < len(buffer) and buffer[end] in self.SENTENCE_ENDS:
+                    end += 1
+                if end == len(buffer) and ch != "\n":
+                    return 0
+                return end
+            if i + 1 >= self.max_chars:
+                return i + 1
+        return 0
+
+
+def run_chunker(chunker, pieces):
+    chunks = []
+    for piece in pieces:
+        chunks.extend(chunker.feed(piece))
+    chunks.extend(chunker.finish())
+    return chunks
+
+
+class ReplyChunkerTest(unittest.TestCase):
+    """增量计算 strip 长度的切段结果与逐字切片 strip 的写法一致"""
+
+    ALPHABET = "好的您ab1 \t　\n。！？!?；;…，"
+
+    def random_pieces(self, rng):
+        text = "".join(rng.choice(self.ALPHABET) for _ in range(rng.randint(0, 400)))
+        pieces, start = [], 0
+        while start < len(text):
+            end = start + rng.randint(1, 12)
+            pieces.append(text[start:end])
+            start = end
+        return pieces
+
+    def test_matches_slice_and_strip_on_random_streams(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            options = {'min_chars': rng.randint(0, 12), 'max_chars': rng.randint(1, 60),
+                       'max_chunks': rng.randint(1, 8)}
+            pieces = self.random_pieces(rng)
+            with self.subTest(options=options, text="".join(pieces)):
+                self.assertEqual(run_chunker(ReplyChunker(**options), pieces),
+                                 run_chunker(_SliceStripChunker(**options), pieces))
+
+    def test_leading_whitespace_does_not_count_towards_min_chars(self):
+        chunker = ReplyChunker(min_chars=4)
+        self.assertEqual(chunker.feed("  \n好的。您好呀。再见"), ["好的。您好呀。"])
+        self.assertEqual(chunker.finish(), ["再见"])
+
+    def test_long_buffer_is_scanned_in_linear_time(self):
+        # 换行既是句末又是空白，凑不满 min_chars 时每个换行都要算一次 strip 长度
+        text = "\n" * 100000 + "好。"
+        started = time.perf_counter()
+        chunker = ReplyChunker(min_chars=8, max_chars=10 ** 6)
+        self.assertEqual(chunker.feed(text), [])
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertEqual(chunker.finish(), ["好。"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from rule_import import read_rules_file
+
+
+class CsvEncodingTest(unittest.TestCase):
+    """CSV 规则文件按整个文件判断 UTF-8 / GBK 编码"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="rule_import_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def write_csv(self, name, rows, encoding):
+        path = os.path.join(self.workdir, name)
+        with open(path, 'w', encoding=encoding, newline='') as f:
+            f.write("keyword,reply\r\n")
+            for keyword, reply in rows:
+                f.write(f"{keyword},{reply}\r\n")
+        return path
+
+    def test_gbk_file_with_a_long_ascii_head(self):
+        # 前 64KiB 以上都是 ASCII，中文行在文件末尾
+        rows = [(f"kw{i:05d}", f"reply number {i}") for i in range(5000)]
+        rows += [("价格", "请看商品详情"), ("发货", "48小时内发货")]
+        path = self.write_csv("gbk.csv", rows, 'gbk')
+        self.assertGreater(os.path.getsize(path), 65536 * 2)
+
+        rules, stats = read_rules_file(path)
+        self.assertEqual(stats['total'], len(rows))
+        self.assertEqual([(r['keyword'], r['reply']) for r in rules[-2:]], rows[-2:])
+
+    def test_utf8_with_bom(self):
+        rows = [("你好", "在的"), ("价格", "请看商品详情")]
+        rules, _ = read_rules_file(self.write_csv("utf8.csv", rows, 'utf-8-sig'))
+        self.assertEqual([(r['keyword'], r['reply']) for r in rules], rows)
+
+    def test_undecodable_file_raises_value_error(self):
+        path = os.path.join(self.workdir, "broken.csv")
+        with open(path, 'wb') as f:
+            f.write(b"keyword,reply\r\n" + b"a" * 70000 + b",ok\r\n\xff\xff,\x81\r\n")
+        with self.assertRaisesRegex(ValueError, "编码") as caught:
+            read_rules_file(path)
+        self.assertNotIsInstance(caught.exception, UnicodeDecodeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,309 @@
+import os
+import re
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from benchmarks.corpus import make_contacts, make_rules, make_messages
+from config_store import RulesConfigStore
+from rule_engine import (RuleMatcher, ScopedRuleMatcher, compile_rule_pattern, diff_rules, rule_key,
+                         MAX_PATTERN_INPUT, PATTERN_TYPES)
+
+ACCOUNTS = ['wxid_acc_a', 'wxid_acc_b', 'wxid_acc_c']
+
+
+def dedupe(rules):
+    """与 RulesConfigStore 一致：同一规则标识后者覆盖并移到末尾"""
+    unique = OrderedDict()
+    for rule in rules:
+        unique.pop(rule_key(rule), None)
+        unique[rule_key(rule)] = rule
+    return list(unique.values())
+
+
+def scoped_corpus(seed, rule_count=300, message_count=500):
+    """benchmarks.corpus 生成的规则加上随机的账号/聊天/分组范围、优先级和停用状态，
+    消息来自不同账号和聊天，其中一部分与关键词完全相同"""
+    rng = random.Random(seed)
+    contacts = make_contacts(200, seed=seed)
+    chats = [c['wxid'] for c in contacts]
+    chat_sets = {f"分组{i}": rng.sample(chats, 15) for i in range(4)}
+    rules = make_rules(rule_count, seed=seed, pattern_ratio=0.15)
+    for rule in rules:
+        roll = rng.random()
+        if roll < 0.15:
+            rule['accounts'] = [rng.choice(ACCOUNTS)]
+        elif roll < 0.3:
+            rule['chats'] = rng.sample(chats, 2)
+        elif roll < 0.4:
+            rule['chat_sets'] = [rng.choice(list(chat_sets))]
+        elif roll < 0.45:
+            rule['accounts'] = [rng.choice(ACCOUNTS)]
+            rule['chat_sets'] = [rng.choice(list(chat_sets))]
+        if rng.random() < 0.25:
+            rule['priority'] = rng.randint(-2, 5)
+        if rng.random() < 0.1:
+            rule['enabled'] = False
+    # 同一关键词在不同范围各有一条规则
+    for rule in rng.sample(rules, 20):
+        rules.append(dict(rule, chats=[rng.choice(chats)], reply=rule['reply'] + "（限定）"))
+    rules = dedupe(rules)
+
+    messages = make_messages(message_count, contacts, rules, seed=seed, hit_ratio=0.5)
+    for rule in rng.sample(rules, 40):
+        messages.append(dict(rng.choice(messages), content=rule['keyword']))
+    for message in messages:
+        message['account'] = {'wxid': rng.choice(ACCOUNTS + [''])}
+    return rules, chat_sets, messages
+
+
+_compiled = {}
+
+
+def brute_force_match(rules, content, exact=True, fuzzy=True, account='', chat='', chat_sets=None,
+                      mode='all', patterns=True, skip=()):
+    """逐条检查全部规则的参考实现，语义与 ScopedRuleMatcher.match 相同"""
+    content = (content or '').strip()
+    applicable = []
+    for order, rule in enumerate(rules):
+        if not rule.get('enabled', True):
+            continue
+        if rule.get('accounts') and account not in rule['accounts']:
+            continue
+        if rule.get('chats') or rule.get('chat_sets'):
+            members = set(rule.get('chats') or ())
+            for name in rule.get('chat_sets') or ():
+                members.update((chat_sets or {}).get(name, ()))
+            if chat not in members:
+                continue
+        applicable.append((order, rule))
+
+    keyword_rules = [(order, rule) for order, rule in applicable if rule.get('match_type') not in PATTERN_TYPES]
+    matched = []
+    if exact:
+        matched = [(order, rule) for order, rule in keyword_rules if rule['keyword'].strip() == content]
+    if not matched and fuzzy and content:
+        low = content.lower()
+        matched = [(order, rule) for order, rule in keyword_rules
+                   if rule['keyword'].strip() and rule['keyword'].strip().lower() in low]
+    if patterns and content:
+        for order, rule in applicable:
+            if rule.get('match_type') not in PATTERN_TYPES or rule_key(rule) in skip:
+                continue
+            key = (rule['match_type'], rule['keyword'])
+            if key not in _compiled:
+                try:
+                    _compiled[key] = compile_rule_pattern(rule)[0]
+                except re.error:
+                    _compiled[key] = None
+            if _compiled[key] is not None and _compiled[key].search(content[:MAX_PATTERN_INPUT]):
+                matched.append((order, rule))
+    matched.sort(key=lambda item: (-int(item[1].get('priority') or 0), item[0]))
+    result = [rule for _, rule in matched]
+    return result[:1] if mode == 'first' else result
+
+
+def summary(rules):
+    return [(rule['keyword'], rule['reply']) for rule in rules]
+
+
+def reordered_after_diff(old_rules, new_rules):
+    """增量更新后的规则顺序：保留下来的（含修改的）规则维持原位置，新增的排在后面"""
+    new_by_key = OrderedDict((rule_key(rule), rule) for rule in new_rules)
+    kept = [new_by_key[rule_key(rule)] for rule in old_rules if rule_key(rule) in new_by_key]
+    old_keys = {rule_key(rule) for rule in old_rules}
+    return kept + [rule for key, rule in new_by_key.items() if key not in old_keys]
+
+
+def edited_rules(rules, seed):
+    """随机删除、修改（回复、优先级、启用状态）和新增规则"""
+    rng = random.Random(seed)
+    edited = []
+    for rule in rules:
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        if roll < 0.25:
+            rule = dict(rule, reply=rule['reply'] + "（改）", priority=rng.randint(-3, 6),
+                        enabled=rng.random() < 0.8)
+        edited.append(rule)
+    extra = make_rules(40, seed=seed + 100, pattern_ratio=0.2)
+    for rule in extra:
+        rule['reply'] += "（新）"
+    return dedupe(edited + extra)
+
+
+class ScopedMatcherEquivalenceTest(unittest.TestCase):
+    """索引匹配（精准字典、双字分桶、范围分区、分组展开、增量更新）与逐条检查的结果完全一致"""
+
+    def setUp(self):
+        self.rules, self.chat_sets, self.messages = scoped_corpus(seed=5)
+        self.matcher = ScopedRuleMatcher(self.rules, chat_sets=self.chat_sets)
+
+    def assert_equivalent(self, matcher, rules, chat_sets, **options):
+        hits = 0
+        for message in self.messages:
+            query = dict(content=message['content'], account=message['account']['wxid'], chat=message['wxid'])
+            query.update(options)
+            expected = brute_force_match(rules, chat_sets=chat_sets, **query)
+            self.assertEqual(summary(matcher.match(**query)), summary(expected), query)
+            hits += bool(expected)
+        # 语料中需要有足够多的命中，比较才有意义（只做精准匹配时命中最少）
+        self.assertGreater(hits, 10)
+
+    def test_exact_and_bigram_fuzzy(self):
+        for exact, fuzzy in ((True, True), (True, False), (False, True)):
+            with self.subTest(exact=exact, fuzzy=fuzzy):
+                self.assert_equivalent(self.matcher, self.rules, self.chat_sets, exact=exact, fuzzy=fuzzy)
+
+    def test_priority_and_first_mode(self):
+        self.assert_equivalent(self.matcher, self.rules, self.chat_sets, mode='first')
+
+    def test_scope_lookups_for_other_accounts_and_chats(self):
+        for message in self.messages:
+            message['account'] = {'wxid': 'wxid_unknown_account'}
+        self.assert_equivalent(self.matcher, self.rules, self.chat_sets)
+        chats = sorted({chat for members in self.chat_sets.values() for chat in members})
+        for i, message in enumerate(self.messages):
+            message['wxid'] = chats[i % len(chats)]
+            message['account'] = {'wxid': ACCOUNTS[i % len(ACCOUNTS)]}
+        self.assert_equivalent(self.matcher, self.rules, self.chat_sets)
+
+    def test_chat_set_changes_reindex_referencing_rules(self):
+        rng = random.Random(9)
+        chats = sorted({chat for members in self.chat_sets.values() for chat in members})
+        changed = dict(self.chat_sets)
+        changed['分组0'] = rng.sample(chats, 5)
+        del changed['分组1']
+        changed['分组新'] = rng.sample(chats, 5)
+        self.matcher.set_chat_sets(changed)
+        for i, message in enumerate(self.messages):
+            message['wxid'] = chats[i % len(chats)]
+        self.assert_equivalent(self.matcher, self.rules, changed)
+
+    def test_incremental_diff_matches_brute_force(self):
+        new_rules = edited_rules(self.rules, seed=21)
+        added, removed, modified = diff_rules(OrderedDict((rule_key(r), r) for r in self.rules),
+                                              OrderedDict((rule_key(r), r) for r in new_rules))
+        self.assertTrue(added and removed and modified)
+        self.matcher.apply_diff(added, removed, modified)
+        self.assert_equivalent(self.matcher, reordered_after_diff(self.rules, new_rules), self.chat_sets)
+
+    def test_exhausted_budget_skips_pattern_rules_only(self):
+        # 预算耗尽时正则/通配符规则全部跳过，关键词规则照常匹配
+        for message in self.messages:
+            query = dict(content=message['content'], account=message['account']['wxid'], chat=message['wxid'])
+            expected = brute_force_match(self.rules, chat_sets=self.chat_sets, patterns=False, **query)
+            self.assertEqual(summary(self.matcher.match(budget_ms=1e-6, **query)), summary(expected))
+        self.assertEqual(self.matcher.budget_overruns, len(self.messages))
+
+
+class QuarantineTest(unittest.TestCase):
+    """多次匹配超时的正则/通配符规则被隔离后不再参与匹配，其它规则不受影响"""
+
+    def test_slow_pattern_is_quarantined(self):
+        rules = [
+            {'keyword': '订单\\d+', 'reply': '正则', 'match_type': 'regex'},
+            {'keyword': '订单', 'reply': '关键词'},
+        ]
+        matcher = RuleMatcher(rules, slow_ms=-1, quarantine_after=2)
+        for _ in range(2):
+            self.assertEqual(summary(matcher.match("订单123")), summary(brute_force_match(rules, "订单123")))
+        self.assertEqual(summary(matcher.match("订单123")),
+                         summary(brute_force_match(rules, "订单123", skip={rule_key(rules[0])})))
+        issue, = matcher.pattern_issues()
+        self.assertTrue(issue['quarantined'])
+        self.assertEqual(issue['slow_count'], 2)
+
+    def test_invalid_pattern_is_skipped_and_reported(self):
+        rules = [{'keyword': '价格(', 'reply': '坏正则', 'match_type': 'regex'}, {'keyword': '价格', 'reply': '好'}]
+        matcher = RuleMatcher(rules)
+        self.assertEqual(summary(matcher.match("价格(多少")), summary(brute_force_match(rules, "价格(多少")))
+        self.assertTrue(matcher.pattern_issues()[0]['error'])
+
+
+class HotReloadDiffTest(unittest.TestCase):
+    """规则文件被外部修改后增量重新加载：差异通知、匹配结果，以及尚未写盘的脏字段以内存为准"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="rules_reload_test_")
+        self.path = os.path.join(self.workdir, "auto_reply_rules.json")
+        self.rules, self.chat_sets, self.messages = scoped_corpus(seed=13, rule_count=150, message_count=200)
+        self.write_file(self.rules, {'min_interval': '1'}, self.chat_sets)
+        self.store = RulesConfigStore(self.path, save_delay=3600)
+        self.store.load()
+        self.diffs = []
+        self.store.add_listener(lambda *diff: self.diffs.append(diff))
+
+    def tearDown(self):
+        if self.store._save_timer is not None:
+            self.store._save_timer.cancel()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def write_file(self, rules, settings, chat_sets):
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'rules': rules, 'settings': settings, 'chat_sets': chat_sets}, f, ensure_ascii=False)
+        if mtime is not None:
+            # 保证 mtime 变化，不依赖文件系统的时间精度
+            os.utime(self.path, (mtime + 5, mtime + 5))
+
+    def assert_store_matches(self, rules, chat_sets):
+        for message in self.messages:
+            query = dict(content=message['content'], account=message['account']['wxid'], chat=message['wxid'])
+            self.assertEqual(summary(self.store.match(**query)),
+                             summary(brute_force_match(rules, chat_sets=chat_sets, **query)))
+
+    def stored(self, rules):
+        return [self.store._dedupe([rule])[rule_key(rule)] for rule in rules]
+
+    def test_external_edit_is_applied_as_a_diff(self):
+        new_rules = edited_rules(self.rules, seed=31)
+        self.write_file(new_rules, {'min_interval': '2'}, self.chat_sets)
+        self.assertTrue(self.store.reload_if_changed())
+
+        (added, removed, modified), = self.diffs
+        expected = diff_rules(OrderedDict((rule_key(r), r) for r in self.stored(self.rules)),
+                              OrderedDict((rule_key(r), r) for r in self.stored(new_rules)))
+        self.assertEqual((len(added), len(removed), len(modified)), tuple(len(part) for part in expected))
+        self.assertEqual(self.store.get_settings()['min_interval'], '2')
+        self.assertEqual(self.store.reload_stats['count'], 1)
+        self.assert_store_matches(reordered_after_diff(self.rules, new_rules), self.chat_sets)
+
+    def test_unchanged_file_is_not_reloaded(self):
+        self.assertFalse(self.store.reload_if_changed())
+        self.assertEqual(self.diffs, [])
+
+    def test_dirty_settings_survive_an_external_rules_edit(self):
+        self.store.update_settings({'min_interval': '9'})
+        new_rules = edited_rules(self.rules, seed=32)
+        self.write_file(new_rules, {'min_interval': '2'}, self.chat_sets)
+        self.store.reload_if_changed()
+        self.assertEqual(self.store.get_settings()['min_interval'], '9')
+        self.assertEqual(len(self.diffs), 1)
+        self.assert_store_matches(reordered_after_diff(self.rules, new_rules), self.chat_sets)
+
+    def test_dirty_rules_and_chat_sets_win_over_the_file(self):
+        memory_rules = edited_rules(self.rules, seed=33)
+        memory_sets = {name: members[:3] for name, members in self.chat_sets.items()}
+        self.store.set_rules(memory_rules)
+        self.store.set_chat_sets(memory_sets)
+        self.write_file(edited_rules(self.rules, seed=34), {'min_interval': '2'}, {})
+        self.store.reload_if_changed()
+
+        self.assertEqual(self.diffs, [])
+        self.assertEqual(self.store.get_settings()['min_interval'], '2')
+        self.assertEqual(self.store.get_chat_sets(), memory_sets)
+        self.assert_store_matches(reordered_after_diff(self.rules, memory_rules), memory_sets)
+
+        self.store.flush()
+        with open(self.path, encoding='utf-8') as f:
+            saved = json.load(f)
+        self.assertEqual(summary(saved['rules']), summary(self.stored(memory_rules)))
+
+
+if __name__ == '__main__':
+    unittest.main()
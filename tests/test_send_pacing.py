@@ -0,0 +1,110 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from send_pacing import SendPacer
+
+PID = 4242
+
+
+class SendPacerBoundsTest(unittest.TestCase):
+    """AIMD 调整后的等待时间始终在 [min_delay, max_delay × BACKOFF_CEILING] 内，成功时收敛到下限"""
+
+    MIN, MAX = 2.0, 6.0
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="send_pacing_test_")
+        self.pacer = SendPacer(os.path.join(self.workdir, "send_pacing.json"))
+        self.rng = random.Random(3)
+        self.ceiling = self.MAX * SendPacer.BACKOFF_CEILING
+
+    def tearDown(self):
+        self.pacer.flush()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def next_delay(self, channel='mass'):
+        delay = self.pacer.next_delay(PID, channel, self.MIN, self.MAX, rng=self.rng)
+        self.assertGreaterEqual(delay, self.MIN)
+        self.assertLessEqual(delay, self.ceiling)
+        return delay
+
+    def current(self, channel='mass'):
+        return self.pacer.snapshot(PID)['channels'][channel]['delay']
+
+    def test_starts_between_the_limits(self):
+        self.next_delay()
+        self.assertEqual(self.current(), (self.MIN + self.MAX) / 2)
+
+    def test_fast_successes_reach_the_lower_limit_and_stay_there(self):
+        self.next_delay()
+        for _ in range(SendPacer.SPEEDUP_STEPS):
+            self.pacer.record_success(PID, 'mass', latency_ms=100)
+            self.next_delay()
+        self.assertEqual(self.current(), self.MIN)
+        # 抖动不会低于下限
+        self.assertEqual(min(self.next_delay() for _ in range(200)), self.MIN)
+
+    def test_failures_multiply_up_to_the_ceiling(self):
+        self.next_delay()
+        previous = self.current()
+        for _ in range(20):
+            self.pacer.record_failure(PID, 'mass')
+            self.next_delay()
+            self.assertGreaterEqual(self.current(), previous)
+            previous = self.current()
+        self.assertEqual(self.current(), self.ceiling)
+
+    def test_slow_sends_back_off_linearly(self):
+        self.next_delay()
+        before = self.current()
+        self.pacer.record_success(PID, 'mass', latency_ms=SendPacer.SLOW_LATENCY_MS + 1)
+        _, _, _, step = SendPacer._bounds({'min': self.MIN, 'max': self.MAX})
+        self.assertAlmostEqual(self.current(), before + step)
+
+    def test_rate_limit_slows_every_channel_and_blocks_speedups(self):
+        self.next_delay('mass')
+        self.next_delay('reply')
+        self.pacer.record_rate_limit(PID)
+        for channel in ('mass', 'reply'):
+            self.assertGreaterEqual(self.current(channel), self.MAX)
+            self.assertLessEqual(self.current(channel), self.ceiling)
+        slowed = self.current()
+        self.pacer.record_success(PID, 'mass', latency_ms=100)
+        self.assertEqual(self.current(), slowed)
+
+        # 冷却期结束后恢复提速
+        self.pacer._account_state(PID)['cooldown_until'] = 0
+        self.pacer.record_success(PID, 'mass', latency_ms=100)
+        self.assertLess(self.current(), slowed)
+
+    def test_random_feedback_never_leaves_the_bounds(self):
+        events = random.Random(11)
+        self.next_delay()
+        for _ in range(2000):
+            roll = events.random()
+            if roll < 0.6:
+                self.pacer.record_success(PID, 'mass', latency_ms=events.uniform(50, 5000))
+            elif roll < 0.95:
+                self.pacer.record_failure(PID, 'mass')
+            else:
+                self.pacer._account_state(PID)['last_rate_limit'] = 0
+                self.pacer.record_rate_limit(PID)
+            if events.random() < 0.05:
+                self.pacer._account_state(PID)['cooldown_until'] = 0
+            self.next_delay()
+            self.assertGreaterEqual(self.current(), self.MIN)
+            self.assertLessEqual(self.current(), self.ceiling)
+
+    def test_changed_limits_clamp_a_learned_delay(self):
+        self.next_delay()
+        for _ in range(10):
+            self.pacer.record_failure(PID, 'mass')
+        delay = self.pacer.next_delay(PID, 'mass', 0.5, 1.0, rng=self.rng)
+        self.assertLessEqual(delay, 1.0 * SendPacer.BACKOFF_CEILING)
+        self.assertEqual(self.pacer.next_delay(PID, 'mass', 0, 0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
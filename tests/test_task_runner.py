@@ -0,0 +1,105 @@
+import time
+import threading
+import unittest
+
+from engine import TaskRunner
+from task_store import get_task_store
+from support import FakeWeChatTestCase
+
+
+def make_task(task_id, contacts, schedule_time, **overrides):
+    task = {
+        'id': task_id, 'name': f"任务{task_id}", 'schedule_time': schedule_time, 'contacts': contacts,
+        'message_text': '你好{昵称}', 'image_path': '', 'min_delay': 0, 'max_delay': 0,
+        'status': '等待中', 'pid': 4242, 'accounts': [], 'repeat': '',
+    }
+    task.update(overrides)
+    return task
+
+
+class TaskRunnerTest(FakeWeChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = get_task_store()
+        self.contacts = [c for c in self.backend.contacts if c.get('wxid')][:3]
+
+    def wait_until(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if predicate():
+                return True
+            time.sleep(0.02)
+        return predicate()
+
+    def test_two_runners_on_one_store_fire_a_due_task_once(self):
+        changed = []
+        finished = threading.Event()
+
+        def on_changed(task):
+            changed.append(task['status'])
+            if task['status'] == '已完成':
+                finished.set()
+
+        gui = TaskRunner(self.store, on_task_changed=on_changed)
+        headless = TaskRunner(self.store)
+        gui.add_task(make_task(gui.new_task_id(), self.contacts, int(time.time())))
+        headless.reload()
+
+        gui.check_due()
+        headless.check_due()
+        self.assertTrue(finished.wait(5))
+        self.assertTrue(self.wait_until(lambda: not gui._running_ids and not headless._running_ids))
+
+        self.assertEqual(len(self.backend.sent), len(self.contacts))
+        self.assertEqual(changed, ['执行中', '已完成'])
+
+    def test_progress_callbacks_reach_the_caller(self):
+        progress = []
+        runner = TaskRunner(self.store, on_progress=lambda task_id, state: progress.append(state))
+        task = make_task(runner.new_task_id(), self.contacts, int(time.time()))
+        runner.add_task(task)
+        runner.execute_task(task)
+
+        self.assertEqual(progress, ['sent'] * len(self.contacts))
+        self.assertEqual(self.store.progress(task['id']), {'sent': len(self.contacts)})
+
+    def test_final_status_follows_delivery_results(self):
+        runner = TaskRunner(self.store)
+        for options, expected in (({'failure_rate': 0.0, 'fail_every': 0}, '已完成'),
+                                  ({'failure_rate': 0.0, 'fail_every': 2}, '部分失败'),
+                                  ({'failure_rate': 1.0, 'fail_every': 0}, '失败')):
+            with self.subTest(expected=expected):
+                for name, value in options.items():
+                    setattr(self.backend, name, value)
+                task = make_task(runner.new_task_id(), self.contacts, int(time.time()))
+                runner.add_task(task)
+                runner.execute_task(task)
+                self.assertEqual(task['status'], expected)
+                self.assertEqual(self.store.load_tasks()[-1]['status'], expected)
+
+    def test_reload_updates_tasks_in_place_and_reports_additions(self):
+        reloads = []
+        changed = []
+        runner = TaskRunner(self.store, on_reload=lambda: reloads.append(1), on_task_changed=changed.append)
+        task = make_task(runner.new_task_id(), self.contacts, int(time.time()) + 3600)
+        runner.add_task(task)
+
+        other = TaskRunner(self.store)
+        other.reload()
+        edited = dict(other.tasks[task['id']], name='改名')
+        other.update_task(edited)
+        runner.reload()
+        self.assertIs(runner.get_tasks()[0], task)
+        self.assertEqual(task['name'], '改名')
+        self.assertEqual(changed, [task])
+        self.assertEqual(reloads, [])
+
+        other.add_task(make_task(other.new_task_id() + 1, self.contacts, int(time.time()) + 7200))
+        runner.reload()
+        self.assertEqual(len(runner.get_tasks()), 2)
+        self.assertEqual(reloads, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
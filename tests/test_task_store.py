@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from task_store import TaskStore, is_missed
+
+
+def make_task(task_id, count=3, status='等待中'):
+    return {
+        'id': task_id, 'name': f"任务{task_id}", 'schedule_time': 1_800_000_000,
+        'contacts': [{'wxid': f"wxid_{task_id}_{i}", 'nickname': f"好友{i}"} for i in range(count)],
+        'message_text': '你好', 'image_path': '', 'min_delay': 0, 'max_delay': 0,
+        'status': status, 'pid': 4242, 'accounts': [], 'repeat': '',
+    }
+
+
+class TaskStoreRecoveryTest(unittest.TestCase):
+    """进程在发送途中退出后，重新打开任务库时 recover() 的处理"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="task_store_test_")
+        self.path = os.path.join(self.workdir, "scheduled_tasks.db")
+        self.store = TaskStore(self.path)
+        self.reopened = None
+
+    def tearDown(self):
+        for store in (self.store, self.reopened):
+            if store is not None:
+                try:
+                    store.close()
+                except Exception:
+                    pass
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def crash_and_reopen(self):
+        """不调用 close()（暂存的发送结果也不写入），直接用新连接打开同一个任务库"""
+        self.store._results = []
+        self.reopened = TaskStore(self.path)
+        return self.reopened
+
+    def test_recover_marks_the_in_flight_contact_failed_and_keeps_the_rest(self):
+        self.store.add_task(make_task(1, count=4))
+        self.store.set_status(1, '执行中')
+        self.store.mark_sending(1, 0)
+        self.store.record_result(1, 0, 'sent', latency_ms=12.0)
+        self.store.mark_sending(1, 1)
+
+        store = self.crash_and_reopen()
+        self.assertEqual(store.recover(), [1])
+        log = {entry['seq']: entry for entry in store.delivery_log(1)}
+        self.assertEqual(log[0]['state'], 'sent')
+        self.assertEqual(log[1]['state'], 'failed')
+        self.assertIn('中断', log[1]['error'])
+        self.assertEqual([c['_seq'] for c in store.pending_contacts(1)], [2, 3])
+        self.assertEqual(store.progress(1), {'sent': 1, 'failed': 1, 'pending': 2})
+
+    def test_unflushed_result_is_lost_but_only_one_contact_is_ever_in_flight(self):
+        self.store.add_task(make_task(1, count=3))
+        self.store.set_status(1, '执行中')
+        for seq in range(3):
+            self.store.mark_sending(1, seq)
+            self.store.record_result(1, seq, 'sent')
+
+        store = self.crash_and_reopen()
+        self.assertEqual(store.progress(1), {'sent': 2, 'sending': 1})
+        store.recover()
+        self.assertEqual(store.progress(1), {'sent': 2, 'failed': 1})
+
+    def test_recover_only_reports_running_tasks(self):
+        self.store.add_task(make_task(1))
+        self.store.add_task(make_task(2))
+        self.store.add_task(make_task(3))
+        self.store.set_status(2, '执行中')
+        self.store.set_status(3, '已完成')
+        self.assertEqual(self.crash_and_reopen().recover(), [2])
+
+    def test_requeued_contacts_resume_in_original_order(self):
+        self.store.add_task(make_task(1, count=4))
+        for seq, state in enumerate(('failed', 'sent', 'failed', 'pending')):
+            self.store.record_result(1, seq, state, error='发送失败' if state == 'failed' else '')
+        self.store.flush_results()
+        self.assertEqual(self.store.requeue_failed(1), 2)
+        self.assertEqual([c['_seq'] for c in self.store.pending_contacts(1)], [0, 2, 3])
+
+    def test_claim_succeeds_only_once(self):
+        self.store.add_task(make_task(1))
+        other = self.crash_and_reopen()
+        self.assertTrue(self.store.claim(1, '执行中'))
+        self.assertFalse(other.claim(1, '执行中'))
+        self.assertEqual(other.load_tasks()[0]['status'], '执行中')
+
+
+class IsMissedTest(unittest.TestCase):
+    """补发策略：window 超时不超过设定分钟数则补发，run 一律补发，skip 一律跳过（允许 60 秒误差）"""
+
+    SCHEDULED = 1_800_000_000
+
+    def test_skip_policy_tolerates_one_minute(self):
+        self.assertFalse(is_missed(self.SCHEDULED, self.SCHEDULED + 60, 'skip', '30'))
+        self.assertTrue(is_missed(self.SCHEDULED, self.SCHEDULED + 61, 'skip', '30'))
+
+    def test_run_policy_never_misses(self):
+        self.assertFalse(is_missed(self.SCHEDULED, self.SCHEDULED + 30 * 86400, 'run', '1'))
+
+    def test_window_policy_uses_the_configured_minutes(self):
+        self.assertFalse(is_missed(self.SCHEDULED, self.SCHEDULED + 10 * 60, 'window', '10'))
+        self.assertTrue(is_missed(self.SCHEDULED, self.SCHEDULED + 10 * 60 + 1, 'window', '10'))
+        self.assertTrue(is_missed(self.SCHEDULED, self.SCHEDULED + 10 * 60 + 1, 'window', 10))
+
+    def test_window_policy_falls_back_on_bad_minutes(self):
+        self.assertFalse(is_missed(self.SCHEDULED, self.SCHEDULED + 30 * 60, 'window', 'abc'))
+        self.assertTrue(is_missed(self.SCHEDULED, self.SCHEDULED + 30 * 60 + 1, None, None))
+        # 小于 1 分钟按 1 分钟计算
+        self.assertFalse(is_missed(self.SCHEDULED, self.SCHEDULED + 60, 'window', '0'))
+        self.assertTrue(is_missed(self.SCHEDULED, self.SCHEDULED + 61, 'window', '-5'))
+
+
+if __name__ == '__main__':
+    unittest.main()
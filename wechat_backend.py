@@ -0,0 +1,202 @@
+import os
+import threading
+import importlib
+
+
+# 设为 fake 时使用内存中的假微信（Linux/无微信客户端时运行、测试与基准测试）
+BACKEND_ENV = "WECHAT_BACKEND"
+
+
+class WeChatBackend:
+    """微信操作接口。程序中所有对微信客户端的访问都经过这里，按功能分为：
+
+    - 发现：list_accounts / find_processes / start_client
+    - 联系人：get_resources / get_group_members / get_all_group_members
+    - 发送：send_message_simple / send_image_simple（批量群发用）、send_message_to_wxid / send_image_to_wxid
+    - 监听：create_message_monitor / create_contact_monitor，返回带 set_callback / start / stop 的监听器
+    - 加好友：add_friend / open_process / close_process / get_base_address / add_friend_by_phone
+    - 备注：modify_remark
+    - 消息解析：parse_special_message
+
+    账号为 {'pid', 'wxid', 'nickname', 'phone', ...} 字典；发送接口返回 False 表示失败。
+    """
+
+    name = 'base'
+
+    # 发现
+    def list_accounts(self, force_refresh=False):
+        raise NotImplementedError
+
+    def find_processes(self):
+        raise NotImplementedError
+
+    def start_client(self):
+        raise NotImplementedError
+
+    # 联系人
+    def get_resources(self, pid, progress_callback=None):
+        """{'contacts': [...], 'friends': [...], 'groups': [...]}"""
+        raise NotImplementedError
+
+    def get_group_members(self, pid, group_id, progress_callback=None):
+        raise NotImplementedError
+
+    def get_all_group_members(self, pid, groups):
+        raise NotImplementedError
+
+    # 发送
+    def send_message_simple(self, pid, wxid, content):
+        raise NotImplementedError
+
+    def send_image_simple(self, pid, wxid, path):
+        raise NotImplementedError
+
+    def send_message_to_wxid(self, pid, wxid, content):
+        raise NotImplementedError
+
+    def send_image_to_wxid(self, pid, wxid, path):
+        raise NotImplementedError
+
+    # 监听
+    def create_message_monitor(self, pid):
+        raise NotImplementedError
+
+    def create_contact_monitor(self, pid):
+        raise NotImplementedError
+
+    # 加好友
+    def add_friend(self, pid, friend_id, greeting, scene=None):
+        raise NotImplementedError
+
+    def open_process(self, pid):
+        raise NotImplementedError
+
+    def close_process(self, handle):
+        raise NotImplementedError
+
+    def get_base_address(self, pid):
+        raise NotImplementedError
+
+    def add_friend_by_phone(self, handle, base_address, phone):
+        raise NotImplementedError
+
+    # 备注
+    def modify_remark(self, pid, wxid, remark):
+        raise NotImplementedError
+
+    # 消息解析
+    def parse_special_message(self, content):
+        raise NotImplementedError
+
+
+class RealWeChatBackend(WeChatBackend):
+    """Windows 微信客户端：各方法直接转调 wechat 模块（首次使用时才导入）"""
+
+    name = 'wechat'
+    PROCESS_ALL_ACCESS = 0x1F0FFF
+
+    def __init__(self, module=None):
+        self._wechat = module
+        self._info = None
+        self._lock = threading.Lock()
+
+    @property
+    def wechat(self):
+        if self._wechat is None:
+            with self._lock:
+                if self._wechat is None:
+                    self._wechat = importlib.import_module('wechat')
+        return self._wechat
+
+    def _wechat_info(self):
+        if self._info is None:
+            self._info = self.wechat.SimpleWeChatInfo()
+        return self._info
+
+    def list_accounts(self, force_refresh=False):
+        if force_refresh:
+            return self.wechat.get_wechat_service().get_all_accounts(force_refresh=True)
+        return self.wechat.SimpleWeChatInfo().run()
+
+    def find_processes(self):
+        return self._wechat_info().find_all_wechat_processes()
+
+    def start_client(self):
+        return self.wechat.start_new_wechat()
+
+    def get_resources(self, pid, progress_callback=None):
+        if progress_callback is None:
+            return self.wechat.get_wechat_resources(pid)
+        return self.wechat.get_wechat_resources(pid, progress_callback)
+
+    def get_group_members(self, pid, group_id, progress_callback=None):
+        return self.wechat.get_group_members(pid, group_id, progress_callback)
+
+    def get_all_group_members(self, pid, groups):
+        return self.wechat.get_all_group_members(pid, groups)
+
+    def send_message_simple(self, pid, wxid, content):
+        return self.wechat.send_message_simple(pid, wxid, content)
+
+    def send_image_simple(self, pid, wxid, path):
+        return self.wechat.send_image_simple(pid, wxid, path)
+
+    def send_message_to_wxid(self, pid, wxid, content):
+        return self.wechat.send_message_to_wxid(pid, wxid, content)
+
+    def send_image_to_wxid(self, pid, wxid, path):
+        return self.wechat.send_image_to_wxid(pid, wxid, path)
+
+    def create_message_monitor(self, pid):
+        return self.wechat.WeChatMessageMonitor(pid)
+
+    def create_contact_monitor(self, pid):
+        return self.wechat.ContactInfoMonitor(pid)
+
+    def add_friend(self, pid, friend_id, greeting, scene=None):
+        if scene is None:
+            return self.wechat.add_wechat_friend(pid, friend_id, greeting)
+        return self.wechat.add_wechat_friend(pid, friend_id, greeting, scene)
+
+    def open_process(self, pid):
+        return self.wechat.OpenProcess(self.PROCESS_ALL_ACCESS, False, pid)
+
+    def close_process(self, handle):
+        return self.wechat.CloseHandle(handle)
+
+    def get_base_address(self, pid):
+        return self.wechat.get_wechat_base(pid)
+
+    def add_friend_by_phone(self, handle, base_address, phone):
+        return self.wechat.add_friend_by_phone(handle, base_address, phone)
+
+    def modify_remark(self, pid, wxid, remark):
+        return self.wechat.RemarkModifier().modify_remark(pid, wxid, remark)
+
+    def parse_special_message(self, content):
+        return self.wechat.parse_special_message(content)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_wechat_backend():
+    """获取全局微信接口：环境变量 WECHAT_BACKEND=fake 时使用假微信，否则使用真实客户端"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if os.environ.get(BACKEND_ENV, '').lower() == 'fake':
+                from fake_wechat import FakeWeChatBackend
+                _backend = FakeWeChatBackend()
+            else:
+                _backend = RealWeChatBackend()
+        return _backend
+
+
+def set_wechat_backend(backend):
+    """替换全局微信接口（测试、基准测试或无界面运行时注入假微信），返回原来的接口"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+        return previous